@@ -1,47 +1,304 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import (Flask, render_template, request, redirect, url_for, flash, jsonify, session,
+                   Response, stream_with_context, g, has_request_context)
 from flask_cors import CORS
+from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.http import generate_etag
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 import oracledb
 import os
+import base64
+import csv
+import io
+import json
+import time
+import queue
+import atexit
+import threading
+import bisect
+import re
+import functools
+import hmac
+import zlib
+import gzip
+import hashlib
+import math
+import unicodedata
+import click
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Fechas ---
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 # --- MongoDB ---
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+from bson import ObjectId, json_util
+
+# --- Exportación columnar (opcional) ---
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# --- Estadísticas vectorizadas de inventario (opcional) ---
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- Compresión brotli / optimización de imágenes (opcionales) ---
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 # -------------------------------
 #  CONEXIÓN A MONGO (OFICIAL)
 # -------------------------------
-MONGO_URI = "mongodb://localhost:27017"
-MONGO_DB = "historial_ideam"
+MONGO_URI = os.getenv('MONGO_URI', "mongodb://localhost:27017")
+MONGO_DB = os.getenv('MONGO_DB', "historial_ideam")
+
+# El cliente se crea en el primer uso (no en el import): así el import no
+# depende de que Mongo esté arriba y cada worker tiene su propio cliente.
+# Si Mongo no respondía al crear los índices se reintenta cada
+# MONGO_REINTENTO_INDICES_S segundos en las siguientes llamadas.
+MONGO_REINTENTO_INDICES_S = float(os.getenv('MONGO_REINTENTO_INDICES_S', '30'))
+_mongo = {"client": None, "db": None, "indices": False, "reintento": 0.0}
+_mongo_lock = threading.Lock()
+
+
+def obtener_mongo():
+    """Base de datos del historial; crea el MongoClient la primera vez y los índices hasta lograrlo."""
+    if _mongo["db"] is None or not _mongo["indices"]:
+        with _mongo_lock:
+            if _mongo["db"] is None:
+                client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
+                _mongo["client"] = client
+                _mongo["db"] = client[MONGO_DB]
+            if not _mongo["indices"] and time.monotonic() >= _mongo["reintento"]:
+                _mongo["indices"] = asegurar_indices_historial(_mongo["db"])
+                _mongo["reintento"] = time.monotonic() + MONGO_REINTENTO_INDICES_S
+    return _mongo["db"]
+
+
+# Días que se guarda cada evento antes de que Mongo lo borre (índice TTL sobre ts).
+# 0 = sin vencimiento. Para conservarlos, `flask archivar-historial` antes del vencimiento.
+HISTORIAL_TTL_DIAS = int(os.getenv('HISTORIAL_TTL_DIAS', '0'))
+
+
+def asegurar_indices_historial(db):
+    """
+    Índices de /api/historial: (user, ts) y (action, ts) para los filtros más
+    comunes y ts solo (con TTL si HISTORIAL_TTL_DIAS > 0) para rangos de fecha.
+    create_index no hace nada si ya existen; si sólo cambió el TTL se ajusta
+    con collMod. Un Mongo caído no impide arrancar: se registra, se sigue y
+    devuelve False para que obtener_mongo lo reintente.
+    """
+    coleccion = db.historial
+    try:
+        coleccion.create_index([("user", ASCENDING), ("ts", DESCENDING)], name="user_ts")
+        coleccion.create_index([("action", ASCENDING), ("ts", DESCENDING)], name="action_ts")
+        opciones = {"expireAfterSeconds": HISTORIAL_TTL_DIAS * 86400} if HISTORIAL_TTL_DIAS > 0 else {}
+        try:
+            coleccion.create_index([("ts", DESCENDING)], name="ts", **opciones)
+        except OperationFailure:
+            # El índice ya existe con otro TTL: se ajusta. Quitar el TTL requiere borrar el índice a mano.
+            if opciones:
+                db.command("collMod", "historial",
+                           index={"name": "ts", "expireAfterSeconds": opciones["expireAfterSeconds"]})
+            else:
+                print("⚠ El índice ts del historial tiene TTL pero HISTORIAL_TTL_DIAS=0; "
+                      "bórralo con db.historial.dropIndex('ts') para desactivarlo")
+    except PyMongoError as e:
+        print("⚠ No se pudieron crear los índices del historial:", e)
+        return False
+    return True
+
+# -------------------------------
+#  HISTORIAL ASÍNCRONO (cola + hilo escritor)
+# -------------------------------
+# El request sólo encola el evento; un hilo lo escribe en lotes con insert_many.
+HISTORIAL_COLA_MAX = int(os.getenv('HISTORIAL_COLA_MAX', '10000'))
+HISTORIAL_LOTE = int(os.getenv('HISTORIAL_LOTE', '200'))
+HISTORIAL_INTERVALO = float(os.getenv('HISTORIAL_INTERVALO', '1.0'))  # segundos
+# Qué hacer si la cola está llena: descartar | bloquear | archivo
+HISTORIAL_DESBORDE = os.getenv('HISTORIAL_DESBORDE', 'descartar')
+HISTORIAL_ARCHIVO = os.getenv('HISTORIAL_ARCHIVO', 'historial_pendiente.jsonl')
+
+
+class HistorialWriter:
+    """
+    Escritor en segundo plano para la colección historial.
+
+    - Cola acotada (HISTORIAL_COLA_MAX) que el hilo vacía con insert_many
+      cada HISTORIAL_LOTE eventos o cada HISTORIAL_INTERVALO segundos.
+    - Política de desborde: 'descartar' (cuenta el evento como perdido),
+      'bloquear' (espera lugar en la cola) o 'archivo' (lo agrega a un JSONL local).
+    - Si Mongo falla, el lote va al archivo con política 'archivo'; si no, se descarta.
+    """
+
+    def __init__(self, coleccion, maxsize, lote, intervalo, desborde, archivo):
+        self._coleccion = coleccion
+        self._cola = queue.Queue(maxsize=maxsize)
+        self._lote = lote
+        self._intervalo = intervalo
+        self._desborde = desborde
+        self._archivo = archivo
+        self._lock = threading.Lock()
+        self._lock_archivo = threading.Lock()
+        self._hilo = None
+        self._cerrado = False
+        self.contadores = {
+            "encolados": 0,
+            "escritos": 0,
+            "descartados": 0,
+            "archivados": 0,
+            "errores": 0,
+        }
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self.contadores[clave] += n
+
+    def _iniciar(self):
+        # El hilo arranca con el primer evento (no en el import)
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name="historial-writer", daemon=True)
+                self._hilo.start()
+
+    def encolar(self, doc):
+        if self._cerrado:
+            self._contar("descartados")
+            return
+        if self._hilo is None or not self._hilo.is_alive():
+            self._iniciar()
+
+        try:
+            if self._desborde == "bloquear":
+                self._cola.put(doc)
+            else:
+                self._cola.put_nowait(doc)
+            self._contar("encolados")
+        except queue.Full:
+            if self._desborde == "archivo":
+                self._archivar([doc])
+            else:
+                self._contar("descartados")
+
+    def _archivar(self, docs):
+        try:
+            with self._lock_archivo, open(self._archivo, "a", encoding="utf-8") as f:
+                for d in docs:
+                    f.write(json.dumps(d, default=str, ensure_ascii=False) + "\n")
+            self._contar("archivados", len(docs))
+        except OSError as e:
+            print("❌ Error archivando historial:", e)
+            self._contar("descartados", len(docs))
+
+    def _escribir(self, docs):
+        try:
+            self._coleccion().insert_many(docs, ordered=False)
+            self._contar("escritos", len(docs))
+        except Exception as e:
+            print("❌ Error guardando historial:", e)
+            self._contar("errores")
+            if self._desborde == "archivo":
+                self._archivar(docs)
+            else:
+                self._contar("descartados", len(docs))
+
+    def _trabajar(self):
+        pendientes = []
+        limite = time.monotonic() + self._intervalo
+        while True:
+            espera = max(0.0, limite - time.monotonic())
+            try:
+                doc = self._cola.get(timeout=espera)
+                if doc is None:  # señal de cierre
+                    break
+                pendientes.append(doc)
+            except queue.Empty:
+                pass
+
+            if len(pendientes) >= self._lote or (pendientes and time.monotonic() >= limite):
+                self._escribir(pendientes)
+                pendientes = []
+            if time.monotonic() >= limite:
+                limite = time.monotonic() + self._intervalo
+
+        # Vaciar lo que quede al cerrar
+        while True:
+            try:
+                doc = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if doc is not None:
+                pendientes.append(doc)
+        for i in range(0, len(pendientes), self._lote):
+            self._escribir(pendientes[i:i + self._lote])
+
+    def cerrar(self, timeout=5.0):
+        """Escribe lo pendiente y detiene el hilo (se llama en atexit)."""
+        self._cerrado = True
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def reiniciar(self):
+        """Tras un fork: cola y locks nuevos; el hilo del padre no existe en el hijo."""
+        self._cola = queue.Queue(maxsize=self._cola.maxsize)
+        self._lock = threading.Lock()
+        self._lock_archivo = threading.Lock()
+        self._hilo = None
 
-mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-mongo_db = mongo_client[MONGO_DB]
+    def estadisticas(self):
+        with self._lock:
+            datos = dict(self.contadores)
+        datos["profundidad"] = self._cola.qsize()
+        datos["capacidad"] = self._cola.maxsize
+        datos["politica_desborde"] = self._desborde
+        return datos
+
+
+historial_writer = HistorialWriter(
+    coleccion=lambda: obtener_mongo().historial,
+    maxsize=HISTORIAL_COLA_MAX,
+    lote=HISTORIAL_LOTE,
+    intervalo=HISTORIAL_INTERVALO,
+    desborde=HISTORIAL_DESBORDE,
+    archivo=HISTORIAL_ARCHIVO,
+)
+atexit.register(historial_writer.cerrar)
 
-print("Mongo conectado correctamente")
 
 # -------------------------------
 #  FUNCIÓN PARA GUARDAR HISTORIAL
 # -------------------------------
 def log_action(user: str, action: str, details: dict | None = None):
-    try:
-        doc = {
-            "user": user or "anon",
-            "action": action,
-            "details": details or {},
-            "ts": datetime.now(timezone.utc)
-        }
-        mongo_db.historial.insert_one(doc)
-        print("✔ Historial guardado")
-    except Exception as e:
-        print("❌ Error guardando historial:", e)
+    """Encola el evento; no toca Mongo dentro del request."""
+    historial_writer.encolar({
+        "user": user or "anon",
+        "action": action,
+        "details": details or {},
+        "ts": datetime.now(timezone.utc)
+    })
 
 
 
-# --- Configuración Oracle Instant Client (Thick) ---
-# Ajusta la ruta según tu instalación de Instant Client en Windows
-oracledb.init_oracle_client(lib_dir=r"C:\oraclexe\instantclient_23_9")
+# --- Oracle: modo thin por defecto ---
+# Para usar el Instant Client (modo thick) define ORACLE_CLIENT_LIB con su ruta,
+# p. ej. ORACLE_CLIENT_LIB=C:\oraclexe\instantclient_23_9 en Windows.
+ORACLE_CLIENT_LIB = os.getenv('ORACLE_CLIENT_LIB')
 
 # --- Credenciales / DSN (puedes usar variables de entorno) ---
 DB_USER = os.getenv('DB_USER', 'userideam')
@@ -53,545 +310,4105 @@ app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET', 'clave-secreta-dev')
 CORS(app)  # permite peticiones desde otros orígenes (ajusta en producción)
 
-# --- Pool de conexiones Oracle ---
-pool = oracledb.create_pool(
-    user=DB_USER,
-    password=DB_PASS,
-    dsn=DB_DSN,
-    min=1,
-    max=4,
-    increment=1
-)
+# --- Pool de conexiones Oracle (configurable por variables de entorno) ---
+_GETMODES = {
+    "wait": oracledb.POOL_GETMODE_WAIT,
+    "timedwait": oracledb.POOL_GETMODE_TIMEDWAIT,
+    "nowait": oracledb.POOL_GETMODE_NOWAIT,
+    "forceget": oracledb.POOL_GETMODE_FORCEGET,
+}
 
-# -------------------------
-# RUTAS WEB (tu UI)
-# -------------------------
-@app.route('/')
-def home():
-    return redirect(url_for('login'))
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '4'))
+DB_POOL_INCREMENT = int(os.getenv('DB_POOL_INCREMENT', '1'))
+DB_POOL_GETMODE = os.getenv('DB_POOL_GETMODE', 'timedwait').lower()
+DB_POOL_WAIT_TIMEOUT = int(os.getenv('DB_POOL_WAIT_TIMEOUT', '5000'))    # ms (sólo timedwait)
+DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', '60'))    # s
+# Debe alcanzar para el registro de sentencias (ver /api/metricas/sentencias)
+DB_STMT_CACHE = int(os.getenv('DB_STMT_CACHE', '100'))
+# Sentencias que se ejecutan una vez por sesión nueva, separadas por ';'
+# p. ej. "ALTER SESSION SET TIME_ZONE = '-05:00'"
+DB_SESSION_SQL = [x.strip() for x in os.getenv('DB_SESSION_SQL', '').split(';') if x.strip()]
+# Parsear las sentencias calientes del registro al abrir cada sesión del pool
+DB_PRECALENTAR = os.getenv('DB_PRECALENTAR', '1') == '1'
+# MODULE de V$SESSION para reconocer las sesiones de la app (vacío: no se fija)
+DB_MODULO = os.getenv('DB_MODULO', 'ideam-app')
+# Instrumentación (latencias y aciertos del caché de sentencias); ver INSTRUMENTACIÓN
+METRICAS_HABILITADAS = os.getenv('METRICAS', '0') == '1'
 
-@app.route('/logout')
-def logout():
-    session.clear()
-    return redirect(url_for('login'))
+# Buckets (ms) del histograma de espera en pool.acquire()
+_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
 
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    departamentos = [
-        "Amazonas", "Antioquia", "Arauca", "Atlántico", "Bolívar", "Boyacá", "Caldas", "Caquetá",
-        "Casanare", "Cauca", "Cesar", "Chocó", "Córdoba", "Cundinamarca", "Guainía", "Guaviare",
-        "Huila", "La Guajira", "Magdalena", "Meta", "Nariño", "Norte de Santander", "Putumayo",
-        "Quindío", "Risaralda", "San Andrés y Providencia", "Santander", "Sucre", "Tolima",
-        "Valle del Cauca", "Vaupés", "Vichada"
-    ]
 
-    if request.method == 'POST':
-        nro_documento = request.form['nro_documento']
-        nombre = request.form['nombre']
-        apellido = request.form['apellido']
-        contrasena = request.form['contrasena']
-        departamento = request.form['departamento']
+class Histograma:
+    """Histograma acumulado con buckets fijos (en ms), seguro entre hilos."""
 
-        try:
-            with pool.acquire() as connection:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO usuario (nro_documento, nombre, apellido, contrasena, departamento)
-                        VALUES (:1, :2, :3, :4, :5)
-                    """, (nro_documento, nombre, apellido, contrasena, departamento))
-                    connection.commit()
+    def __init__(self, buckets=_BUCKETS_MS):
+        self.buckets = buckets
+        self._conteos = [0] * (len(buckets) + 1)   # el último es +Inf
+        self._suma = 0.0
+        self._n = 0
+        self._lock = threading.Lock()
 
-            flash("✅ Usuario registrado exitosamente")
-            return redirect(url_for('register'))
+    def observar(self, valor_ms):
+        i = bisect.bisect_left(self.buckets, valor_ms)
+        with self._lock:
+            self._conteos[i] += 1
+            self._suma += valor_ms
+            self._n += 1
 
-        except Exception as e:
-            flash(f"⚠️ Error al registrar: {str(e)}")
+    def resumen(self):
+        with self._lock:
+            conteos = list(self._conteos)
+            suma, n = self._suma, self._n
+        etiquetas = [f"<={b}" for b in self.buckets] + ["+Inf"]
+        return {
+            "n": n,
+            "promedio_ms": round(suma / n, 3) if n else None,
+            "buckets_ms": dict(zip(etiquetas, conteos)),
+        }
 
-    return render_template('register.html', departamentos=departamentos)
 
+class RegistroSentencias:
+    """
+    Textos únicos de las sentencias de la app, por nombre. Cada texto se
+    normaliza (un espacio entre palabras) y es siempre el mismo objeto, así que
+    el caché de sentencias de oracledb y el shared pool de Oracle lo reconocen.
 
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        nro_documento = request.form['nro_documento']
-        contrasena = request.form['contrasena']
+    Cuenta aciertos/fallos del caché por sesión: la primera ejecución de un
+    texto en una sesión es un fallo (parse) y las siguientes son aciertos. Las
+    marcadas como calientes se parsean en el session_callback, de modo que la
+    primera petición en una conexión nueva ya encuentra el cursor preparado.
+    Con contar=False (METRICAS=0) ejecutar() no toma el lock ni cuenta.
+    """
 
-        try:
-            with pool.acquire() as connection:
-                with connection.cursor() as cursor:
-                    p_valido = cursor.var(int)
+    def __init__(self, max_sesiones=1024, contar=True):
+        self._textos = {}            # nombre -> texto
+        self._nombres = {}           # texto -> nombre
+        self._calientes = []
+        self._vistas = OrderedDict()  # (session_id, serial_num) -> {texto, ...}
+        self._max_sesiones = max_sesiones
+        self._por_nombre = {}        # nombre -> [aciertos, fallos]
+        self._lock = threading.Lock()
+        self.contar = contar
+        self.sesiones_precalentadas = 0
+        self.precalentamiento_ms = 0.0
 
-                    cursor.callproc("SP_LOGIN_USUARIO", [nro_documento, contrasena, p_valido])
+    def registrar(self, nombre, texto, caliente=False):
+        """Devuelve el texto normalizado; registrar de nuevo el mismo nombre y texto no cambia nada."""
+        texto = " ".join(texto.split())
+        with self._lock:
+            if self._textos.get(nombre, texto) != texto:
+                raise ValueError(f"Sentencia '{nombre}' registrada con dos textos distintos")
+            self._textos[nombre] = texto
+            self._nombres[texto] = nombre
+            self._por_nombre.setdefault(nombre, [0, 0])
+            if caliente and texto not in self._calientes:
+                self._calientes.append(texto)
+        return texto
 
-                    if p_valido.getvalue() == 1:
-                        # Obtiene el nombre del usuario
-                        cursor.execute("""
-                            SELECT NOMBRE 
-                            FROM USUARIO 
-                            WHERE NRO_DOCUMENTO = :nro
-                        """, {"nro": nro_documento})
-                        result = cursor.fetchone()
-                        nombre = result[0].lower() if result else ""
+    def __getitem__(self, nombre):
+        return self._textos[nombre]
 
-                        # Guarda la sesión
-                        session['usuario'] = nro_documento
-                        session['nombre'] = nombre
+    @staticmethod
+    def _sesion(connection):
+        clave = (getattr(connection, "session_id", None), getattr(connection, "serial_num", None))
+        return None if clave == (None, None) else clave
 
-                        # 🔥🔥 AGREGAR ESTO: GUARDAR LOGIN EN EL HISTORIAL
-                        log_action(
-                            user=nro_documento,
-                            action="login",
-                            details={"nombre": nombre}
-                        )
-                        # 🔥🔥 FIN
+    def _vistas_de(self, clave):
+        vistas = self._vistas.get(clave)
+        if vistas is None:
+            vistas = self._vistas[clave] = set()
+            while len(self._vistas) > self._max_sesiones:
+                self._vistas.popitem(last=False)
+        else:
+            self._vistas.move_to_end(clave)
+        return vistas
 
-                        # Redirección
-                        if nombre == "admin":
-                            return redirect(url_for('index2'))
-                        else:
-                            return redirect(url_for('main_index'))
-                    else:
-                        flash("⚠️ Credenciales incorrectas")
+    def _contar(self, cursor, texto):
+        nombre = self._nombres.get(texto)
+        clave = self._sesion(getattr(cursor, "connection", None))
+        if nombre is None or clave is None:
+            return
+        with self._lock:
+            vistas = self._vistas_de(clave)
+            contador = self._por_nombre[nombre]
+            if texto in vistas:
+                contador[0] += 1
+            else:
+                contador[1] += 1
+                vistas.add(texto)
 
-        except Exception as e:
-            flash(f"⚠️ Error de base de datos: {str(e)}")
+    def ejecutar(self, cursor, texto, parametros=None, **kwargs):
+        """cursor.execute con un texto del registro, contando acierto/fallo."""
+        if self.contar:
+            self._contar(cursor, texto)
+        if parametros is None:
+            return cursor.execute(texto, **kwargs)
+        return cursor.execute(texto, parametros, **kwargs)
 
-    return render_template('login.html')
+    def ejecutar_muchos(self, cursor, texto, filas, **kwargs):
+        if self.contar:
+            self._contar(cursor, texto)
+        return cursor.executemany(texto, filas, **kwargs)
 
+    def precalentar(self, connection):
+        """Parsea las sentencias calientes en una sesión nueva (un viaje por sentencia)."""
+        inicio = time.perf_counter()
+        parseadas = set()
+        for texto in self._calientes:
+            try:
+                # Un cursor por sentencia: al cerrarlo el statement queda en el caché
+                with connection.cursor() as cursor:
+                    cursor.parse(texto)
+                parseadas.add(texto)
+            except oracledb.Error as e:
+                # Una sentencia inválida no debe impedir que la sesión se use
+                print(f"⚠ No se pudo precalentar '{self._nombres[texto]}':", e)
+        ms = (time.perf_counter() - inicio) * 1000
+        clave = self._sesion(connection)
+        with self._lock:
+            if clave is not None:
+                self._vistas_de(clave).update(parseadas)
+            self.sesiones_precalentadas += 1
+            self.precalentamiento_ms += ms
 
+    def estadisticas(self):
+        with self._lock:
+            aciertos = sum(a for a, _ in self._por_nombre.values())
+            fallos = sum(f for _, f in self._por_nombre.values())
+            return {
+                "registradas": len(self._textos),
+                "contando": self.contar,
+                "calientes": [self._nombres[t] for t in self._calientes],
+                "stmtcachesize": DB_STMT_CACHE,
+                "precalentar": DB_PRECALENTAR,
+                "sesiones_precalentadas": self.sesiones_precalentadas,
+                "precalentamiento_ms_promedio": (round(self.precalentamiento_ms / self.sesiones_precalentadas, 2)
+                                                 if self.sesiones_precalentadas else None),
+                "aciertos": aciertos,
+                "fallos": fallos,
+                "tasa_aciertos": round(aciertos / (aciertos + fallos), 4) if aciertos + fallos else None,
+                "por_sentencia": {n: {"aciertos": a, "fallos": f} for n, (a, f) in sorted(self._por_nombre.items())},
+            }
 
-from datetime import datetime
 
-from datetime import date
+sentencias = RegistroSentencias(contar=METRICAS_HABILITADAS)
 
-@app.route('/index')
-def main_index():
-    nro_doc = session.get('usuario')
 
-    brigada = None
-    if nro_doc:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT r.MUNICIPIO,
-                           TO_CHAR(r.FECHA_INICIO, 'DD/MM/YYYY'),
-                           TO_CHAR(r.FECHA_FIN, 'DD/MM/YYYY'),
-                           r.LATITUD, r.LONGITUD
-                    FROM reserva_evento r
-                    JOIN reserva_participante p ON r.ID_RESERVA = p.ID_RESERVA
-                    WHERE p.NRO_DOCUMENTO_USUARIO = :doc
-                      AND TRUNC(SYSDATE) BETWEEN TRUNC(r.FECHA_INICIO) AND TRUNC(r.FECHA_FIN)
-                """, {'doc': nro_doc})
-
-                row = cursor.fetchone()
-
-                if row:
-                    brigada = {
-                        'municipio': row[0],
-                        'fecha_inicio': row[1],
-                        'fecha_fin': row[2],
-                        'latitud': row[3],
-                        'longitud': row[4]
-                    }
+def _configurar_sesion(connection, requested_tag):
+    """
+    session_callback del pool (sólo en sesiones nuevas): nombre de módulo para
+    V$SESSION, DB_SESSION_SQL y el precalentamiento de las sentencias calientes.
+    """
+    if DB_MODULO:
+        connection.module = DB_MODULO   # viaja con la siguiente llamada, sin viaje propio
+    if DB_SESSION_SQL:
+        with connection.cursor() as cursor:
+            for sql in DB_SESSION_SQL:
+                cursor.execute(sql)
+    if DB_PRECALENTAR:
+        sentencias.precalentar(connection)
 
-    return render_template('index.html', brigada=brigada)
 
+class PoolInstrumentado:
+    """
+    Envuelve el pool de oracledb midiendo cuánto espera cada acquire()
+    y cuántas veces se agota el tiempo (DPY-4005). El resto de atributos
+    (busy, opened, max, ...) se delega al pool real.
+    """
 
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._real = None
+        self._lock_creacion = threading.Lock()
+        self.espera = Histograma()
+        self.adquisiciones = 0
+        self.timeouts = 0
+        self.errores = 0
+        self._lock = threading.Lock()
 
+    @property
+    def _pool(self):
+        # El pool real se crea con la primera conexión pedida
+        if self._real is None:
+            with self._lock_creacion:
+                if self._real is None:
+                    self._real = self._fabrica()
+        return self._real
 
+    @property
+    def creado(self):
+        return self._real is not None
 
-@app.route('/index2')
-def index2():
-    if 'usuario' not in session:
-        return redirect(url_for('login'))
-    return render_template('index2.html')
+    def descartar(self):
+        """Olvida el pool sin cerrarlo (en un hijo de fork el pool es del padre)."""
+        self._real = None
 
+    def acquire(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            connection = self._pool.acquire(*args, **kwargs)
+        except oracledb.Error as e:
+            codigo = getattr(e.args[0], "full_code", "") if e.args else ""
+            with self._lock:
+                if codigo == "DPY-4005":
+                    self.timeouts += 1
+                else:
+                    self.errores += 1
+            raise
+        self.espera.observar((time.perf_counter() - inicio) * 1000)
+        with self._lock:
+            self.adquisiciones += 1
+        if METRICAS_HABILITADAS:
+            return ConexionInstrumentada(connection)
+        return connection
 
-# Rutas de ejemplo que tenías
-from flask import session as flask_session  # usado sólo para comprobar existencia
-@app.route('/registrar_arbol', methods=['GET', 'POST'])
-def registrar_arbol():
-    if 'usuario' not in session:
-        return redirect(url_for('login'))
+    def __getattr__(self, nombre):
+        return getattr(self._pool, nombre)
 
-    nro_documento = session['usuario']
+    def estadisticas(self):
+        if not self.creado:
+            return {"creado": False, "adquisiciones": 0, "timeouts": self.timeouts, "errores": self.errores}
+        return {
+            "creado": True,
+            "ocupadas": self._pool.busy,
+            "abiertas": self._pool.opened,
+            "min": self._pool.min,
+            "max": self._pool.max,
+            "incremento": self._pool.increment,
+            "getmode": DB_POOL_GETMODE,
+            "wait_timeout_ms": DB_POOL_WAIT_TIMEOUT,
+            "ping_interval_s": DB_POOL_PING_INTERVAL,
+            "stmtcachesize": self._pool.stmtcachesize,
+            "adquisiciones": self.adquisiciones,
+            "timeouts": self.timeouts,
+            "errores": self.errores,
+            "espera_acquire": self.espera.resumen(),
+        }
 
-    with pool.acquire() as connection:
-        with connection.cursor() as cursor:
-            # Buscar reserva asociada al usuario
-            cursor.execute("""
-                SELECT re.ID_RESERVA, re.MUNICIPIO, re.LATITUD, re.LONGITUD
-                FROM RESERVA_PARTICIPANTE rp
-                JOIN RESERVA_EVENTO re ON rp.ID_RESERVA = re.ID_RESERVA
-                WHERE rp.NRO_DOCUMENTO_USUARIO = :nro_documento
-            """, {'nro_documento': nro_documento})
-            reserva = cursor.fetchone()
 
-            if not reserva:
-                return render_template(
-                    'registro_arbol.html',
-                    advertencia="⚠ No tienes ninguna reserva asignada.",
-                    subparcelas=[],
-                    mensaje=None
-                )
+_thick_iniciado = False
 
-            # Subparcelas predefinidas
-            subparcelas = [
-                {'id': 1, 'direccion': 'Norte', 'distancia': 80},
-                {'id': 2, 'direccion': 'Sur', 'distancia': 80},
-                {'id': 3, 'direccion': 'Este', 'distancia': 80},
-                {'id': 4, 'direccion': 'Oeste', 'distancia': 80},
-            ]
-
-            mensaje = None
-            advertencia = None
-
-            if request.method == 'POST':
-                altura = request.form['altura']
-                dano = request.form['dano']
-                diametro = request.form['diametro']
-                formafuste = request.form['formafuste']
-                observaciones = request.form['observaciones']
-                nsubparcela = request.form['nsubparcela']
-                id_reserva = reserva[0]
 
-                try:
-                    cursor.execute("""
-                        INSERT INTO ARBOL (ALTURA, DANO, DIAMETRO, FORMAFUSTE, OBSERVACIONES,
-                                           NSUBPARCELA, NRO_DOCUMENTO, ID_RESERVA)
-                        VALUES (:altura, :dano, :diametro, :formafuste, :observaciones,
-                                :nsubparcela, :nro_doc, :id_reserva)
-                    """, {
-                        'altura': altura,
-                        'dano': dano,
-                        'diametro': diametro,
-                        'formafuste': formafuste,
-                        'observaciones': observaciones,
-                        'nsubparcela': nsubparcela,
-                        'nro_doc': nro_documento,
-                        'id_reserva': id_reserva
-                    })
-                    connection.commit()
-                    mensaje = "✅ Árbol registrado exitosamente."
-                except Exception as e:
-                    connection.rollback()
-                    import traceback
-                    print("❌ Error al registrar el árbol:", traceback.format_exc())
-                    advertencia = f"❌ Error al registrar el árbol: {str(e)}"
+def _crear_pool_oracle():
+    """Crea el pool real (y activa el modo thick si ORACLE_CLIENT_LIB está definido)."""
+    global _thick_iniciado
+    if ORACLE_CLIENT_LIB and not _thick_iniciado:
+        oracledb.init_oracle_client(lib_dir=ORACLE_CLIENT_LIB)
+        _thick_iniciado = True
 
-    # Renderizar la misma página sin redirección
-    return render_template(
-        'registro_arbol.html',
-        reserva=reserva,
-        subparcelas=subparcelas,
-        mensaje=mensaje,
-        advertencia=advertencia
+    return oracledb.create_pool(
+        user=DB_USER,
+        password=DB_PASS,
+        dsn=DB_DSN,
+        min=DB_POOL_MIN,
+        max=DB_POOL_MAX,
+        increment=DB_POOL_INCREMENT,
+        getmode=_GETMODES.get(DB_POOL_GETMODE, oracledb.POOL_GETMODE_TIMEDWAIT),
+        wait_timeout=DB_POOL_WAIT_TIMEOUT,
+        ping_interval=DB_POOL_PING_INTERVAL,
+        stmtcachesize=DB_STMT_CACHE,
+        session_callback=_configurar_sesion
     )
 
 
+pool = PoolInstrumentado(_crear_pool_oracle)
 
 
+def reiniciar_recursos():
+    """
+    Suelta lo heredado del proceso padre (pool Oracle, cliente Mongo e hilo del
+    historial) para que el worker cree los suyos en el primer uso. Se ejecuta
+    solo después de cada fork; también sirve como hook post_fork de gunicorn.
+    """
+    pool.descartar()
+    indice_reservas.descartar()
+    _mongo["client"] = None
+    _mongo["db"] = None
+    _mongo["indices"] = False
+    _mongo["reintento"] = 0.0
+    historial_writer.reiniciar()
 
 
-@app.route('/registrar_planta', methods=['GET', 'POST'])
-def registrar_planta():
-    if 'usuario' not in session:
-        return redirect(url_for('login'))
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reiniciar_recursos)
 
-    nro_documento = session['usuario']
+# -------------------------
+# INSTRUMENTACIÓN (latencia por endpoint y por sentencia SQL)
+# -------------------------
+# Apagada por defecto: si METRICAS=0 (METRICAS_HABILITADAS) no se registran
+# hooks ni se envuelven cursores.
+METRICAS_VENTANA = int(os.getenv('METRICAS_VENTANA', '1000'))   # muestras por clave
+SQL_LENTO_MS = float(os.getenv('SQL_LENTO_MS', '500'))
 
-    with pool.acquire() as connection:
-        with connection.cursor() as cursor:
-            # 🔹 Buscar SOLO la reserva vigente del usuario
-            cursor.execute("""
-                SELECT re.ID_RESERVA, re.MUNICIPIO, re.LATITUD, re.LONGITUD,
-                       re.FECHA_INICIO, re.FECHA_FIN
-                FROM RESERVA_PARTICIPANTE rp
-                JOIN RESERVA_EVENTO re ON rp.ID_RESERVA = re.ID_RESERVA
-                WHERE rp.NRO_DOCUMENTO_USUARIO = :nro_documento
-                ORDER BY re.FECHA_INICIO DESC
-            """, {'nro_documento': nro_documento})
-
-            reservas = cursor.fetchall()
-
-            if not reservas:
-                return render_template(
-                    'registroplantas.html',
-                    advertencia="⚠ No tienes ninguna reserva asignada.",
-                    subparcelas=[]
-                )
 
-            # 🔹 Buscar la reserva activa (entre fecha_inicio y fecha_fin)
-            fecha_actual = datetime.now().date()
-            reserva_activa = None
+class VentanaLatencias:
+    """Últimas N muestras por clave (ventana móvil) para calcular percentiles."""
 
-            for r in reservas:
-                fecha_inicio = r[4]
-                fecha_fin = r[5]
+    def __init__(self, maxlen):
+        self._maxlen = maxlen
+        self._muestras = {}
+        self._totales = {}
+        self._lock = threading.Lock()
 
-                # Convertir a date si son datetime
-                if isinstance(fecha_inicio, datetime):
-                    fecha_inicio = fecha_inicio.date()
-                if isinstance(fecha_fin, datetime):
-                    fecha_fin = fecha_fin.date()
+    def observar(self, clave, valor):
+        with self._lock:
+            ventana = self._muestras.get(clave)
+            if ventana is None:
+                ventana = self._muestras[clave] = deque(maxlen=self._maxlen)
+                self._totales[clave] = 0
+            ventana.append(valor)
+            self._totales[clave] += 1
 
-                if fecha_inicio <= fecha_actual <= fecha_fin:
-                    reserva_activa = r
-                    break
+    def resumen(self):
+        with self._lock:
+            copia = {k: sorted(v) for k, v in self._muestras.items()}
+            totales = dict(self._totales)
+        out = {}
+        for clave, valores in copia.items():
+            n = len(valores)
+            out[clave] = {
+                "total": totales[clave],
+                "ventana": n,
+                "p50": round(valores[int(n * 0.50)], 3),
+                "p90": round(valores[min(n - 1, int(n * 0.90))], 3),
+                "p99": round(valores[min(n - 1, int(n * 0.99))], 3),
+                "max": round(valores[-1], 3),
+            }
+        return out
 
-            if not reserva_activa:
-                return render_template(
-                    'registroplantas.html',
-                    advertencia="⚠ No tienes ninguna reserva activa en este momento.",
-                    subparcelas=[]
-                )
 
-            # 🔹 Subparcelas predefinidas
-            subparcelas = [
-                {'id': 1, 'direccion': 'Norte', 'distancia': 80},
-                {'id': 2, 'direccion': 'Sur', 'distancia': 80},
-                {'id': 3, 'direccion': 'Este', 'distancia': 80},
-                {'id': 4, 'direccion': 'Oeste', 'distancia': 80},
-            ]
-
-            # 🔹 Procesar formulario si es método POST
-            if request.method == 'POST':
-                tamano = request.form['tamano']
-                nombre_comun = request.form['nombre_comun']
-                observaciones = request.form['observaciones']
-                nsubparcela = request.form['nsubparcela']
-                id_reserva = reserva_activa[0]
-                id_brigada = 1  # Temporal
+_latencia_endpoints = VentanaLatencias(METRICAS_VENTANA)
+_viajes_endpoints = VentanaLatencias(METRICAS_VENTANA)
+_latencia_sql = VentanaLatencias(METRICAS_VENTANA)
 
-                try:
-                    cursor.execute("""
-                        INSERT INTO PLANTA (TAMANO, NOMBRE_COMUN, OBSERVACIONES,
-                                            NSUBPARCELA, ID_RESERVA, NRO_DOCUMENTO_USUARIO, ID_BRIGADA)
-                        VALUES (:tamano, :nombre_comun, :observaciones,
-                                :nsubparcela, :id_reserva, :nro_doc, :id_brigada)
-                    """, {
-                        'tamano': tamano,
-                        'nombre_comun': nombre_comun,
-                        'observaciones': observaciones,
-                        'nsubparcela': nsubparcela,
-                        'id_reserva': id_reserva,
-                        'nro_doc': nro_documento,
-                        'id_brigada': id_brigada
-                    })
-                    connection.commit()
-                    flash("✅ Planta registrada exitosamente.")
-                except Exception as e:
-                    connection.rollback()
-                    import traceback
-                    print("❌ Error al registrar la planta:", traceback.format_exc())
-                    flash(f"❌ Error al registrar la planta: {str(e)}")
+_RE_ETIQUETA = re.compile(r"^\s*(\w+).*?\b(?:FROM|INTO|UPDATE|MERGE\s+INTO)\s+([\w.$]+)",
+                          re.IGNORECASE | re.DOTALL)
 
-    return render_template(
-        'registroplantas.html',
-        reserva=reserva_activa,
-        subparcelas=subparcelas,
-        advertencia=None
-    )
-@app.route('/registro_brigada')
-def registro_brigada():
-    if 'usuario' not in session:
-        return redirect(url_for('login'))
-    return render_template('registro_brigadas.html')
 
+@functools.lru_cache(maxsize=512)
+def _etiqueta_sql(sql):
+    """'SELECT ... FROM arbol ...' -> 'SELECT ARBOL' (agrupa las métricas por sentencia)."""
+    m = _RE_ETIQUETA.match(sql)
+    if m:
+        return f"{m.group(1).upper()} {m.group(2).upper()}"
+    return " ".join(sql.split()[:2]).upper()
 
-# ---------------------------
-# API para frontend (HTML)
-# ---------------------------
 
-@app.route('/api/usuarios', methods=['GET'])
-def api_usuarios():
-    """
-    Devuelve la lista de usuarios en formato JSON.
-    Si se pasa ?departamento=<nombre> devuelve sólo los usuarios de ese departamento.
-    """
-    departamento = request.args.get('departamento', None)
-    try:
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                if departamento:
-                    # Buscar case-insensitive
-                    cursor.execute("""
-                        SELECT NRO_DOCUMENTO, NOMBRE, APELLIDO, DEPARTAMENTO
-                        FROM USUARIO
-                        WHERE UPPER(DEPARTAMENTO) = UPPER(:dep)
-                        ORDER BY NOMBRE, APELLIDO
-                    """, {"dep": departamento})
-                else:
-                    cursor.execute("""
-                        SELECT NRO_DOCUMENTO, NOMBRE, APELLIDO, DEPARTAMENTO
-                        FROM USUARIO
-                        ORDER BY DEPARTAMENTO, NOMBRE, APELLIDO
-                    """)
-                usuarios = []
-                for nro, nombre, apellido, departamento_row in cursor:
-                    usuarios.append({
-                        "NRO_DOCUMENTO": str(nro),
-                        "NOMBRE": nombre,
-                        "APELLIDO": apellido,
-                        "DEPARTAMENTO": departamento_row
-                    })
-        return jsonify(usuarios), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+def _medir_sql(etiqueta, inicio, sql):
+    ms = (time.perf_counter() - inicio) * 1000
+    _latencia_sql.observar(etiqueta, ms)
+    if has_request_context():
+        g.viajes_db = g.get('viajes_db', 0) + 1
+    if ms >= SQL_LENTO_MS:
+        print(f"🐢 SQL lento ({ms:.0f} ms) [{etiqueta}]:", " ".join(sql.split())[:300])
 
 
+class CursorInstrumentado:
+    """Cursor que mide execute/executemany/callproc; lo demás se delega."""
 
-@app.route('/api/municipios', methods=['GET'])
-def api_municipios():
-    """
-    Devuelve la lista de departamentos para que aparezcan en el select.
-    """
-    departamentos = [
-        "Amazonas", "Antioquia", "Arauca", "Atlántico", "Bolívar", "Boyacá", "Caldas", "Caquetá",
-        "Casanare", "Cauca", "Cesar", "Chocó", "Córdoba", "Cundinamarca", "Guainía", "Guaviare",
-        "Huila", "La Guajira", "Magdalena", "Meta", "Nariño", "Norte de Santander", "Putumayo",
-        "Quindío", "Risaralda", "San Andrés y Providencia", "Santander", "Sucre", "Tolima",
-        "Valle del Cauca", "Vaupés", "Vichada"
-    ]
-    # Devolver en formato { "id": <index>, "nombre": <departamento> } por compatibilidad con frontend
-    out = [{"id": i+1, "nombre": d} for i, d in enumerate(departamentos)]
-    return jsonify(out), 200
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
 
+    def execute(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, *args, **kwargs)
+        finally:
+            _medir_sql(_etiqueta_sql(sql), inicio, sql)
 
-@app.route('/api/crear_reserva', methods=['POST'])
-def api_crear_reserva():
-    """
-    Recibe JSON con:
-    {
-      "fechainicio":"YYYY-MM-DD",
-      "fechafin":"YYYY-MM-DD",
-      "municipio":"Nombre",
-      "lat":"4.123456",
-      "lng":"-74.123456",
-      "participantes":["111","222","333","444"]
-    }
-    Valida y crea una reserva + registros de participantes.
-    """
-    try:
-        data = request.get_json(force=True)
-        fechainicio = data.get('fechainicio')
-        fechafin = data.get('fechafin')
-        participantes = data.get('participantes', [])
-        municipio = data.get('municipio')
-        lat = data.get('lat')
-        lng = data.get('lng')
-
-        # Campos obligatorios
-        if not (fechainicio and fechafin and municipio and lat and lng):
-            return jsonify({"error":"Faltan campos obligatorios"}), 400
-
-        # Parsear fechas
+    def executemany(self, sql, *args, **kwargs):
+        inicio = time.perf_counter()
         try:
-            dt_inicio = datetime.strptime(fechainicio, "%Y-%m-%d")
-            dt_fin = datetime.strptime(fechafin, "%Y-%m-%d")
-        except ValueError:
-            return jsonify({"error":"Formato de fecha inválido (usar YYYY-MM-DD)"}), 400
+            return self._cursor.executemany(sql, *args, **kwargs)
+        finally:
+            _medir_sql(_etiqueta_sql(sql), inicio, sql)
 
-        if dt_fin < dt_inicio:
-            return jsonify({"error":"La fecha fin no puede ser anterior a la fecha inicio"}), 400
+    def callproc(self, nombre, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.callproc(nombre, *args, **kwargs)
+        finally:
+            _medir_sql(f"CALL {nombre.upper()}", inicio, nombre)
 
-        # Validar exactamente 4 participantes
-        if not isinstance(participantes, list) or len(participantes) != 4:
-            return jsonify({"error":"Debe seleccionar exactamente 4 participantes"}), 400
+    def __iter__(self):
+        return iter(self._cursor)
 
-        # Validar que cada participante exista en la tabla USUARIO
-        with pool.acquire() as connection:
-            with connection.cursor() as cursor:
-                for nro in participantes:
-                    cursor.execute("SELECT COUNT(1) FROM USUARIO WHERE NRO_DOCUMENTO = :nro", {"nro": nro})
-                    count = cursor.fetchone()[0]
-                    if count == 0:
-                        return jsonify({"error": f"El participante {nro} no existe en USUARIO"}), 400
-
-                # Obtener un nuevo ID usando la secuencia SEQ_RESERVA_ID
-                cursor.execute("SELECT SEQ_RESERVA_ID.NEXTVAL FROM DUAL")
-                id_reserva = cursor.fetchone()[0]
-
-                # Insertar en RESERVA_EVENTO
-                cursor.execute("""
-                    INSERT INTO RESERVA_EVENTO (
-                        ID_RESERVA, FECHA_INICIO, FECHA_FIN, MUNICIPIO, LATITUD, LONGITUD, CREADO_EN
-                    ) VALUES (
-                        :idr, TO_DATE(:fi,'YYYY-MM-DD'), TO_DATE(:ff,'YYYY-MM-DD'), :mun, :lat, :lng, SYSDATE
-                    )
-                """, {
-                    "idr": id_reserva,
-                    "fi": fechainicio,
-                    "ff": fechafin,
-                    "mun": municipio,
-                    "lat": lat,
-                    "lng": lng
-                })
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
 
-                # Insertar participantes en RESERVA_PARTICIPANTE
-                for nro in participantes:
-                    cursor.execute("""
-                        INSERT INTO RESERVA_PARTICIPANTE (ID_RESERVA, NRO_DOCUMENTO_USUARIO)
-                        VALUES (:idr, :nro)
-                    """, {"idr": id_reserva, "nro": nro})
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
 
-                connection.commit()
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
 
-        return jsonify({"ok":True, "id_reserva": int(id_reserva)}), 201
+    def __setattr__(self, nombre, valor):
+        # arraysize, prefetchrows, etc. van al cursor real
+        setattr(self._cursor, nombre, valor)
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
 
-@app.route("/api/reportes", methods=["GET"])
-def api_reportes():
-    tipo = request.args.get("tipo")
-    fecha_inicio = request.args.get("fechaInicio")
-    fecha_fin = request.args.get("fechaFin")
+class ConexionInstrumentada:
+    """Conexión cuyos cursores quedan instrumentados; commit cuenta como viaje."""
 
-    if tipo != "Arbol":
-        return jsonify({"error": "Tipo de reporte no soportado"}), 400
-
-    query = """
-        SELECT 
-            ID_ARBOL,
-            NOMBRE_CIENTIFICO,
-            NOMBRE_COMUN,
-            ALTURA,
-            DIAMETRO,
-            DANO,
-            FORMAFUSTE,
-            OBSERVACIONES,
-            NSUBPARCELA,
-            NRO_DOCUMENTO,
-            ID_RESERVA,
-            FECHA_REGISTRO
-        FROM arbol
-        WHERE (:ini IS NULL OR FECHA_REGISTRO >= TO_DATE(:ini, 'YYYY-MM-DD'))
-          AND (:fin IS NULL OR FECHA_REGISTRO <= TO_DATE(:fin, 'YYYY-MM-DD'))
-        ORDER BY FECHA_REGISTRO DESC
-    """
+    def __init__(self, connection):
+        self._connection = connection
 
-    with pool.acquire() as conn:
-        cur = conn.cursor()
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self._connection.cursor(*args, **kwargs))
 
-        cur.execute(
-            query,
-            {
-                "ini": fecha_inicio,
-                "fin": fecha_fin
-            }
-        )
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return self._connection.commit()
+        finally:
+            _medir_sql("COMMIT", inicio, "COMMIT")
 
-        columnas = [col[0] for col in cur.description]
-        rows = cur.fetchall()
+    def __enter__(self):
+        self._connection.__enter__()
+        return self
 
-        data = [dict(zip(columnas, fila)) for fila in rows]
+    def __exit__(self, *exc):
+        return self._connection.__exit__(*exc)
 
-    return jsonify({
-        "tabla": data
-    })
+    def __getattr__(self, nombre):
+        return getattr(self._connection, nombre)
+
+
+if METRICAS_HABILITADAS:
+    @app.before_request
+    def _iniciar_medicion():
+        g.inicio_request = time.perf_counter()
+        g.viajes_db = 0
+
+    @app.after_request
+    def _registrar_medicion(response):
+        inicio = g.get('inicio_request')
+        if inicio is not None:
+            clave = f"{request.method} {request.endpoint or request.path}"
+            _latencia_endpoints.observar(clave, (time.perf_counter() - inicio) * 1000)
+            _viajes_endpoints.observar(clave, g.get('viajes_db', 0))
+        return response
+
+
+# -------------------------
+# CACHÉS EN MEMORIA (TTL + LRU)
+# -------------------------
+_FALTA = object()
+
+
+class CacheTTL:
+    """
+    Caché por proceso con expiración (ttl en segundos) y desalojo LRU al
+    superar maxsize. Guarda también resultados None (p. ej. "sin reserva").
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, default=_FALTA):
+        ahora = time.monotonic()
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is not None and item[0] > ahora:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return item[1]
+            if item is not None:
+                del self._datos[clave]
+            self.fallos += 1
+            return default
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, *claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {"tamano": len(self._datos), "maximo": self.maxsize, "ttl": self.ttl,
+                    "aciertos": self.aciertos, "fallos": self.fallos}
+
+
+# -------------------------
+# RESERVA ACTIVA DEL USUARIO (compartida por index y formularios)
+# -------------------------
+# La caché es por proceso: invalidar_reserva_activa sólo limpia la del worker
+# que atendió la escritura. Con varios workers de gunicorn los demás pueden
+# seguir mostrando la reserva anterior (o ninguna) hasta RESERVAS_CACHE_TTL
+# segundos; el default es corto porque basta para que el index y los POST de
+# una captura seguida no vayan a la base en cada request.
+_reservas_activas = CacheTTL(
+    maxsize=int(os.getenv('RESERVAS_CACHE_MAX', '2048')),
+    ttl=float(os.getenv('RESERVAS_CACHE_TTL', '60'))
+)
+
+
+_SQL_RESERVA_ACTIVA = sentencias.registrar("reserva_activa", """
+    SELECT re.ID_RESERVA, re.MUNICIPIO, re.LATITUD, re.LONGITUD,
+           re.FECHA_INICIO, re.FECHA_FIN
+    FROM RESERVA_PARTICIPANTE rp
+    JOIN RESERVA_EVENTO re ON rp.ID_RESERVA = re.ID_RESERVA
+    WHERE rp.NRO_DOCUMENTO_USUARIO = :nro_documento
+      AND TRUNC(SYSDATE) BETWEEN TRUNC(re.FECHA_INICIO) AND TRUNC(re.FECHA_FIN)
+    ORDER BY re.FECHA_INICIO DESC, re.ID_RESERVA DESC
+    FETCH FIRST 1 ROWS ONLY
+""", caliente=True)
+
+
+def obtener_reserva_activa(nro_documento):
+    """
+    Reserva vigente hoy para el usuario como tupla
+    (ID_RESERVA, MUNICIPIO, LATITUD, LONGITUD, FECHA_INICIO, FECHA_FIN) o None.
+    El filtro de fechas se hace en SQL y el resultado queda en caché;
+    api_crear_reserva invalida a los participantes que inserta.
+    """
+    reserva = _reservas_activas.obtener(nro_documento)
+    if reserva is not _FALTA:
+        return reserva
+
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            sentencias.ejecutar(cursor, _SQL_RESERVA_ACTIVA, {'nro_documento': nro_documento})
+            reserva = cursor.fetchone()
+
+    _reservas_activas.guardar(nro_documento, reserva)
+    return reserva
+
+
+def invalidar_reserva_activa(*documentos):
+    """Se llama al agregar participantes a una reserva."""
+    _reservas_activas.invalidar(*documentos)
+
+
+# Subparcelas predefinidas
+SUBPARCELAS = (
+    {'id': 1, 'direccion': 'Norte', 'distancia': 80},
+    {'id': 2, 'direccion': 'Sur', 'distancia': 80},
+    {'id': 3, 'direccion': 'Este', 'distancia': 80},
+    {'id': 4, 'direccion': 'Oeste', 'distancia': 80},
+)
+
+
+# -------------------------
+# CACHÉ HTTP Y COMPRESIÓN (ETag/304, Cache-Control, gzip/brotli, estáticos con huella)
+# -------------------------
+COMPRESION_MIN_BYTES = int(os.getenv('COMPRESION_MIN_BYTES', '1024'))
+COMPRESION_NIVEL_GZIP = int(os.getenv('COMPRESION_NIVEL_GZIP', '6'))
+COMPRESION_NIVEL_BROTLI = int(os.getenv('COMPRESION_NIVEL_BROTLI', '5'))
+ESTATICOS_MAX_AGE = int(os.getenv('ESTATICOS_MAX_AGE', str(365 * 24 * 3600)))
+# Variantes redimensionadas/WebP que genera `flask optimizar-imagenes`
+DIR_IMAGENES_OPT = "img/opt"
+
+_TIPOS_COMPRIMIBLES = ("application/json", "application/javascript", "application/x-ndjson",
+                       "text/", "image/svg+xml")
+
+
+def cache_http(max_age, publica=True):
+    """Cache-Control explícito para una vista (p. ej. respuestas que casi nunca cambian)."""
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            respuesta = app.make_response(vista(*args, **kwargs))
+            respuesta.cache_control.max_age = max_age
+            respuesta.cache_control.public = publica
+            respuesta.cache_control.private = not publica
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def _comprimir(respuesta):
+    """gzip o brotli según Accept-Encoding, sólo para cuerpos en memoria de tipo texto/JSON."""
+    if (respuesta.direct_passthrough or respuesta.is_streamed
+            or respuesta.status_code < 200 or respuesta.status_code in (204, 304)
+            or "Content-Encoding" in respuesta.headers
+            or not (respuesta.mimetype or "").startswith(_TIPOS_COMPRIMIBLES)):
+        return respuesta
+
+    datos = respuesta.get_data()
+    if len(datos) < COMPRESION_MIN_BYTES:
+        return respuesta
+
+    aceptadas = request.accept_encodings
+    if brotli is not None and aceptadas["br"]:
+        datos, codificacion = brotli.compress(datos, quality=COMPRESION_NIVEL_BROTLI), "br"
+    elif aceptadas["gzip"]:
+        datos, codificacion = gzip.compress(datos, COMPRESION_NIVEL_GZIP, mtime=0), "gzip"
+    else:
+        respuesta.vary.add("Accept-Encoding")
+        return respuesta
+
+    respuesta.set_data(datos)
+    respuesta.headers["Content-Encoding"] = codificacion
+    respuesta.vary.add("Accept-Encoding")
+    return respuesta
+
+
+@app.after_request
+def _cache_http(respuesta):
+    # Estáticos pedidos con ?v=<huella>: el contenido de esa URL no cambia nunca
+    if request.endpoint == "static":
+        if "v" in request.args and respuesta.status_code == 200:
+            respuesta.cache_control.no_cache = False
+            respuesta.cache_control.public = True
+            respuesta.cache_control.max_age = ESTATICOS_MAX_AGE
+            respuesta.cache_control.immutable = True
+        return respuesta
+
+    # JSON de GET: ETag débil (vale igual comprimido o no) y 304 si el cliente ya lo tiene.
+    # Las respuestas en streaming no se tocan: no hay cuerpo completo para hashear.
+    if (request.method in ("GET", "HEAD") and respuesta.status_code == 200
+            and respuesta.mimetype == "application/json" and not respuesta.is_streamed):
+        respuesta.set_etag(generate_etag(respuesta.get_data()), weak=True)
+        if not respuesta.cache_control.max_age:
+            # Datos por usuario: el navegador revalida siempre (barato gracias al 304)
+            respuesta.cache_control.private = True
+            respuesta.cache_control.no_cache = True
+        respuesta.make_conditional(request)
+
+    # La página eligió las imágenes .webp o no según Accept (_variante_imagen)
+    if g.get("varia_por_accept"):
+        respuesta.vary.add("Accept")
+
+    return _comprimir(respuesta)
+
+
+_huellas_estaticos = {}
+
+
+def _huella_estatico(ruta):
+    """Primeros 10 hex del sha1 del archivo; se recalcula sólo si cambió su mtime."""
+    try:
+        mtime = os.stat(ruta).st_mtime
+    except OSError:
+        return None
+    guardada = _huellas_estaticos.get(ruta)
+    if guardada and guardada[0] == mtime:
+        return guardada[1]
+    with open(ruta, "rb") as f:
+        huella = hashlib.sha1(f.read()).hexdigest()[:10]
+    _huellas_estaticos[ruta] = (mtime, huella)
+    return huella
+
+
+def _variante_imagen(nombre):
+    """
+    img/X.jpg -> img/opt/X.webp si el navegador acepta WebP, si no img/opt/X.jpg
+    (cuando `flask optimizar-imagenes` ya las generó); si no, el mismo nombre.
+    Si existe la variante WebP la página depende de Accept: se marca en g para
+    que _cache_http agregue Vary: Accept.
+    """
+    base, ext = os.path.splitext(nombre[len("img/"):])
+    webp = f"{DIR_IMAGENES_OPT}/{base}.webp"
+    if has_request_context() and os.path.exists(os.path.join(app.static_folder, webp)):
+        g.varia_por_accept = True
+        if "image/webp" in request.headers.get("Accept", ""):
+            return webp
+    optimizada = f"{DIR_IMAGENES_OPT}/{base}{ext}"
+    if os.path.exists(os.path.join(app.static_folder, optimizada)):
+        return optimizada
+    return nombre
+
+
+@app.url_defaults
+def _url_estatico_con_huella(endpoint, values):
+    """url_for('static', filename=...) agrega ?v=<huella> (y usa la variante optimizada de img/)."""
+    if endpoint != "static" or "filename" not in values or "v" in values:
+        return
+    nombre = values["filename"]
+    if nombre.startswith("img/") and not nombre.startswith(DIR_IMAGENES_OPT + "/"):
+        nombre = values["filename"] = _variante_imagen(nombre)
+    huella = _huella_estatico(os.path.join(app.static_folder, nombre))
+    if huella:
+        values["v"] = huella
+
+
+@app.cli.command("optimizar-imagenes")
+@click.option("--ancho", default=1600, show_default=True, help="Ancho máximo en píxeles")
+@click.option("--calidad", default=80, show_default=True, help="Calidad JPEG/WebP")
+def cli_optimizar_imagenes(ancho, calidad):
+    """Genera en static/img/opt/ versiones redimensionadas y WebP de static/img (requiere Pillow)."""
+    if Image is None:
+        raise click.ClickException("Instala Pillow para optimizar imágenes (pip install Pillow)")
+
+    origen = os.path.join(app.static_folder, "img")
+    destino = os.path.join(app.static_folder, DIR_IMAGENES_OPT)
+    os.makedirs(destino, exist_ok=True)
+    antes = despues = 0
+
+    for nombre in sorted(os.listdir(origen)):
+        base, ext = os.path.splitext(nombre)
+        if ext.lower() not in (".jpg", ".jpeg", ".png"):
+            continue
+        ruta = os.path.join(origen, nombre)
+        with Image.open(ruta) as img:
+            if img.width > ancho:
+                img = img.resize((ancho, round(img.height * ancho / img.width)), Image.LANCZOS)
+            if ext.lower() == ".png":
+                img.save(os.path.join(destino, nombre), optimize=True)
+            else:
+                img.convert("RGB").save(os.path.join(destino, nombre), quality=calidad,
+                                        optimize=True, progressive=True)
+            img.save(os.path.join(destino, base + ".webp"), "WEBP", quality=calidad, method=6)
+
+        tam = os.path.getsize(ruta)
+        tam_webp = os.path.getsize(os.path.join(destino, base + ".webp"))
+        antes += tam
+        despues += tam_webp
+        click.echo(f"{nombre:28} {tam / 1024:8.0f} KB -> webp {tam_webp / 1024:8.0f} KB")
+
+    click.echo(f"✔ Total {antes / 1e6:.1f} MB -> {despues / 1e6:.1f} MB (WebP)")
+
+
+# -------------------------
+# AUTENTICACIÓN (hash de contraseñas, rol en sesión, intentos fallidos)
+# -------------------------
+# Método de werkzeug.security con su costo, p. ej. "scrypt:16384:8:1" o
+# "pbkdf2:sha256:600000". Al cambiarlo, cada usuario se re-hashea en su próximo login.
+# El costo es casi todo el tiempo de /login y ocupa la CPU del worker: medido en
+# un núcleo, scrypt N=32768 tarda ~150 ms por verificación (y 32 MiB), N=16384
+# ~65 ms (16 MiB) y pbkdf2:sha256:600000 ~310 ms. Se usa N=16384 (2^14, el de
+# logins interactivos): la mitad de resistencia a fuerza bruta que N=32768 a
+# cambio de duplicar los logins por segundo de cada worker.
+HASH_METODO = os.getenv('HASH_METODO', 'scrypt:16384:8:1')
+LOGIN_MAX_INTENTOS = int(os.getenv('LOGIN_MAX_INTENTOS', '5'))
+LOGIN_BLOQUEO_S = float(os.getenv('LOGIN_BLOQUEO_S', '300'))
+
+ROL_ADMIN = "admin"
+
+# Fallos por documento (por proceso); se borra al entrar bien
+_intentos_fallidos = CacheTTL(maxsize=10_000, ttl=LOGIN_BLOQUEO_S)
+
+# Hash contra el que se verifica cuando el documento no existe, para que la
+# respuesta tarde lo mismo y no revele qué documentos están registrados. Se
+# calcula en el primer login con documento desconocido, no al importar app.py
+# (un hash por proceso: CLI, tests, cada worker).
+@functools.cache
+def _hash_ficticio():
+    return generate_password_hash("-", method=HASH_METODO)
+
+
+def _metodo_guardado():
+    """
+    HASH_METODO tal como queda al inicio del hash: werkzeug completa los
+    parámetros que falten ("scrypt" -> "scrypt:32768:8:1"), y comparar contra
+    el valor sin completar re-hashearía en cada login.
+    """
+    return _hash_ficticio().split("$", 1)[0]
+
+
+_SQL_LOGIN = sentencias.registrar("login", """
+    SELECT NOMBRE, CONTRASENA, ROL, DEPARTAMENTO
+    FROM USUARIO
+    WHERE NRO_DOCUMENTO = :nro
+""", caliente=True)
+
+_SQL_REHASH_CONTRASENA = sentencias.registrar(
+    "rehash_contrasena", "UPDATE USUARIO SET CONTRASENA = :h WHERE NRO_DOCUMENTO = :nro")
+
+
+def hashear_contrasena(contrasena):
+    return generate_password_hash(contrasena, method=HASH_METODO)
+
+
+def verificar_contrasena(guardada, contrasena):
+    """
+    Devuelve (valida, rehashear). Las contraseñas heredadas en texto plano se
+    comparan en tiempo constante y se marcan para guardarlas con hash, igual
+    que los hashes hechos con otro método o costo.
+    """
+    if guardada is None:
+        check_password_hash(_hash_ficticio(), contrasena)
+        return False, False
+    metodo = guardada.split("$", 1)[0]
+    if "$" not in guardada or metodo.split(":", 1)[0] not in ("scrypt", "pbkdf2"):
+        return hmac.compare_digest(guardada.encode(), contrasena.encode()), True
+    return check_password_hash(guardada, contrasena), metodo != _metodo_guardado()
+
+
+def login_bloqueado(nro_documento):
+    return _intentos_fallidos.obtener(nro_documento, 0) >= LOGIN_MAX_INTENTOS
+
+
+def registrar_intento_fallido(nro_documento):
+    _intentos_fallidos.guardar(nro_documento, _intentos_fallidos.obtener(nro_documento, 0) + 1)
+
+
+def requiere_admin(vista):
+    """Sólo deja pasar sesiones con rol admin; el rol viene de la cookie firmada, sin ir a la base."""
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if 'usuario' not in session:
+            if request.path.startswith('/api/'):
+                return jsonify({"error": "No autenticado"}), 401
+            return redirect(url_for('login'))
+        if session.get('rol') != ROL_ADMIN:
+            if request.path.startswith('/api/'):
+                return jsonify({"error": "Requiere rol administrador"}), 403
+            return redirect(url_for('main_index'))
+        return vista(*args, **kwargs)
+    return envoltura
+
+
+# -------------------------
+# DEPARTAMENTOS (select del registro, /api/municipios e importación)
+# -------------------------
+DEPARTAMENTOS = (
+    "Amazonas", "Antioquia", "Arauca", "Atlántico", "Bolívar", "Boyacá", "Caldas", "Caquetá",
+    "Casanare", "Cauca", "Cesar", "Chocó", "Córdoba", "Cundinamarca", "Guainía", "Guaviare",
+    "Huila", "La Guajira", "Magdalena", "Meta", "Nariño", "Norte de Santander", "Putumayo",
+    "Quindío", "Risaralda", "San Andrés y Providencia", "Santander", "Sucre", "Tolima",
+    "Valle del Cauca", "Vaupés", "Vichada"
+)
+
+
+def _clave_departamento(nombre):
+    """'NARINO', 'nariño' y ' Nariño ' dan la misma clave (sin tildes ni mayúsculas)."""
+    sin_tildes = unicodedata.normalize("NFKD", nombre.strip()).encode("ascii", "ignore").decode()
+    return " ".join(sin_tildes.casefold().split())
+
+
+_DEPARTAMENTOS_POR_CLAVE = {_clave_departamento(d): d for d in DEPARTAMENTOS}
+
+
+def normalizar_departamento(nombre):
+    """Nombre oficial del departamento, o None si no está en DEPARTAMENTOS."""
+    if not isinstance(nombre, str):
+        return None
+    return _DEPARTAMENTOS_POR_CLAVE.get(_clave_departamento(nombre))
+
+
+# -------------------------
+# PLANTILLAS Y FRAGMENTOS (formularios de campo e index)
+# -------------------------
+# Las partes de las páginas que sólo dependen de la reserva (formulario con sus
+# subparcelas, cuadro de la brigada) o que no cambian nunca (departamentos) se
+# renderizan una vez y se guardan como HTML ya escapado. La plantilla que las
+# contiene sólo agrega lo dinámico: navbar según la sesión, flashes y avisos.
+FRAGMENTOS_CACHE_MAX = int(os.getenv('FRAGMENTOS_CACHE_MAX', '1024'))
+FRAGMENTOS_CACHE_TTL = float(os.getenv('FRAGMENTOS_CACHE_TTL', '3600'))
+# Directorio para el bytecode de Jinja: los workers que gunicorn recicla
+# (max_requests) no vuelven a compilar las plantillas (vacío: sin caché en disco)
+JINJA_BYTECODE_DIR = os.getenv('JINJA_BYTECODE_DIR', '')
+
+# Plantillas que se compilan al importar, para que el primer request de cada
+# worker no pague el parseo
+PLANTILLAS_PRECOMPILADAS = (
+    'index.html', 'registro_arbol.html', 'RegistroPlantas.html', 'register.html',
+    'parciales/brigada.html', 'parciales/form_arbol.html', 'parciales/form_planta.html',
+    'parciales/opciones_departamento.html',
+)
+
+_fragmentos = CacheTTL(maxsize=FRAGMENTOS_CACHE_MAX, ttl=FRAGMENTOS_CACHE_TTL)
+
+if JINJA_BYTECODE_DIR:
+    os.makedirs(JINJA_BYTECODE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_BYTECODE_DIR)
+
+
+def precompilar_plantillas():
+    """Compila (y deja en el caché de Jinja) las plantillas de PLANTILLAS_PRECOMPILADAS."""
+    for nombre in PLANTILLAS_PRECOMPILADAS:
+        try:
+            app.jinja_env.get_template(nombre)
+        except Exception as e:
+            print(f"⚠️ No se pudo precompilar {nombre}: {e}")
+
+
+precompilar_plantillas()
+
+
+def _renderizar_parcial(plantilla, contexto):
+    if callable(contexto):
+        contexto = contexto()
+    return Markup(app.jinja_env.get_template(plantilla).render(contexto))
+
+
+def fragmento(plantilla, clave, contexto):
+    """
+    HTML de un parcial renderizado una vez por (plantilla, clave), listo para
+    insertarse con {{ }} sin volver a escaparse. `contexto` es un dict o una
+    función que lo arma, y sólo se evalúa cuando hay que renderizar.
+
+    Se renderiza sin los context processors de Flask: el parcial no puede
+    depender de session, request ni flashes, sólo de `contexto` (que debe
+    quedar determinado por `clave`). Con debug las plantillas se recargan al
+    editarlas, así que no se cachea.
+    """
+    if app.debug:
+        return _renderizar_parcial(plantilla, contexto)
+
+    clave = (plantilla, clave)
+    html = _fragmentos.obtener(clave)
+    if html is _FALTA:
+        html = _renderizar_parcial(plantilla, contexto)
+        _fragmentos.guardar(clave, html)
+    return html
+
+
+def _quiere_json():
+    """
+    El formulario llegó por el envío rápido (registro_rapido.js, Accept JSON)
+    o con cuerpo JSON: se responde con un estado corto en vez de la página.
+    """
+    if request.is_json:
+        return True
+    return request.accept_mimetypes.best_match(('text/html', 'application/json')) == 'application/json'
+
+
+def _datos_formulario():
+    """Campos del POST: request.form o el objeto JSON del cuerpo."""
+    if request.is_json:
+        datos = request.get_json(silent=True)
+        return datos if isinstance(datos, dict) else {}
+    return request.form
+
+
+def _faltantes(datos, campos):
+    return [c for c in campos if datos.get(c) in (None, '')]
+
+
+_CAMPOS_FORM_ARBOL = ('altura', 'dano', 'diametro', 'formafuste', 'nsubparcela')
+_CAMPOS_FORM_PLANTA = ('tamano', 'nombre_comun', 'nsubparcela')
+
+
+# -------------------------
+# RUTAS WEB (tu UI)
+# -------------------------
+@app.route('/')
+def home():
+    return redirect(url_for('login'))
+
+@app.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('login'))
+
+@app.route('/register', methods=['GET', 'POST'])
+@requiere_admin
+def register():
+    if request.method == 'POST':
+        nro_documento = request.form['nro_documento']
+        nombre = request.form['nombre']
+        apellido = request.form['apellido']
+        contrasena = request.form['contrasena']
+        departamento = normalizar_departamento(request.form['departamento'])
+
+        if departamento is None:
+            flash("⚠️ Departamento no válido")
+            return render_template('register.html', opciones_departamento=_opciones_departamento()), 400
+
+        try:
+            with pool.acquire() as connection:
+                with connection.cursor() as cursor:
+                    # Mismo INSERT que la importación por CSV
+                    sentencias.ejecutar(cursor, _SQL_INSERT_USUARIO, {
+                        "nro": nro_documento, "nombre": nombre, "apellido": apellido,
+                        "contrasena": hashear_contrasena(contrasena),
+                        "departamento": departamento, "rol": "brigadista"
+                    })
+                    connection.commit()
+
+            invalidar_usuarios()
+            flash("✅ Usuario registrado exitosamente")
+            return redirect(url_for('register'))
+
+        except Exception as e:
+            flash(f"⚠️ Error al registrar: {str(e)}")
+
+    return render_template('register.html', opciones_departamento=_opciones_departamento())
+
+
+def _opciones_departamento():
+    return fragmento('parciales/opciones_departamento.html', None, {'departamentos': DEPARTAMENTOS})
+
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        nro_documento = request.form['nro_documento']
+        contrasena = request.form['contrasena']
+
+        if login_bloqueado(nro_documento):
+            flash("⚠️ Demasiados intentos fallidos. Intenta de nuevo en unos minutos")
+            return render_template('login.html'), 429
+
+        try:
+            with pool.acquire() as connection:
+                with connection.cursor() as cursor:
+                    # Un solo viaje: credencial, nombre y rol
+                    sentencias.ejecutar(cursor, _SQL_LOGIN, {"nro": nro_documento})
+                    fila = cursor.fetchone()
+
+                    nombre, guardada, rol, departamento = fila if fila else (None, None, None, None)
+                    valida, rehashear = verificar_contrasena(guardada, contrasena)
+
+                    if valida:
+                        if rehashear:
+                            sentencias.ejecutar(cursor, _SQL_REHASH_CONTRASENA,
+                                                {"h": hashear_contrasena(contrasena), "nro": nro_documento})
+                            connection.commit()
+
+                        _intentos_fallidos.invalidar(nro_documento)
+                        nombre = (nombre or "").lower()
+
+                        # Sesión nueva (no se reutiliza la cookie previa) con el rol cacheado
+                        session.clear()
+                        session['usuario'] = nro_documento
+                        session['nombre'] = nombre
+                        session['rol'] = rol
+
+                        # 🔥🔥 AGREGAR ESTO: GUARDAR LOGIN EN EL HISTORIAL
+                        log_action(
+                            user=nro_documento,
+                            action="login",
+                            details={"nombre": nombre, "rol": rol, "departamento": departamento}
+                        )
+                        # 🔥🔥 FIN
+
+                        # Redirección
+                        if rol == ROL_ADMIN:
+                            return redirect(url_for('index2'))
+                        else:
+                            return redirect(url_for('main_index'))
+                    else:
+                        registrar_intento_fallido(nro_documento)
+                        flash("⚠️ Credenciales incorrectas")
+
+        except Exception as e:
+            flash(f"⚠️ Error de base de datos: {str(e)}")
+
+    return render_template('login.html')
+
+
+
+@app.route('/index')
+def main_index():
+    nro_doc = session.get('usuario')
+
+    row = obtener_reserva_activa(nro_doc) if nro_doc else None
+
+    def contexto():
+        brigada = None
+        if row:
+            brigada = {
+                'municipio': row[1],
+                'fecha_inicio': row[4].strftime('%d/%m/%Y'),
+                'fecha_fin': row[5].strftime('%d/%m/%Y'),
+                'latitud': row[2],
+                'longitud': row[3]
+            }
+        return {'brigada': brigada}
+
+    # El cuadro de la brigada sólo depende de la reserva: se arma una vez por reserva
+    return render_template('index.html', brigada_html=fragmento('parciales/brigada.html', row, contexto))
+
+
+
+
+
+@app.route('/index2')
+@requiere_admin
+def index2():
+    return render_template('index2.html')
+
+
+@app.route('/registrar_arbol', methods=['GET', 'POST'])
+def registrar_arbol():
+    como_json = request.method == 'POST' and _quiere_json()
+
+    if 'usuario' not in session:
+        if como_json:
+            return jsonify({"ok": False, "error": "Sesión expirada", "redirigir": url_for('login')}), 401
+        return redirect(url_for('login'))
+
+    nro_documento = session['usuario']
+
+    # Reserva vigente del usuario (desde la caché compartida)
+    reserva = obtener_reserva_activa(nro_documento)
+
+    if not reserva:
+        advertencia = "⚠ No tienes ninguna reserva activa en este momento."
+        if como_json:
+            return jsonify({"ok": False, "error": advertencia}), 409
+        return render_template(
+            'registro_arbol.html',
+            advertencia=advertencia,
+            formulario=_form_arbol(None),
+            mensaje=None
+        )
+
+    mensaje = None
+    advertencia = None
+
+    if request.method == 'POST':
+        datos = _datos_formulario()
+        if como_json:
+            faltan = _faltantes(datos, _CAMPOS_FORM_ARBOL)
+            if faltan:
+                return jsonify({"ok": False, "error": f"Faltan campos: {', '.join(faltan)}"}), 400
+
+        altura = datos['altura']
+        dano = datos['dano']
+        diametro = datos['diametro']
+        formafuste = datos['formafuste']
+        observaciones = datos.get('observaciones', '')
+        nsubparcela = datos['nsubparcela']
+        id_reserva = reserva[0]
+
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                try:
+                    fila = {
+                        'altura': altura,
+                        'dano': dano,
+                        'diametro': diametro,
+                        'formafuste': formafuste,
+                        'observaciones': observaciones,
+                        'nsubparcela': nsubparcela,
+                        'nro_doc': nro_documento,
+                        'id_reserva': id_reserva
+                    }
+                    sentencias.ejecutar(cursor, _SQL_INSERT_ARBOL, fila)
+                    sumar_a_resumen(cursor, "arbol", [fila])
+                    connection.commit()
+                    invalidar_estadisticas(id_reserva)
+                    mensaje = "✅ Árbol registrado exitosamente."
+                    log_action(nro_documento, "registrar_arbol",
+                               {"id_reserva": id_reserva, "nsubparcela": nsubparcela})
+                except Exception as e:
+                    connection.rollback()
+                    import traceback
+                    print("❌ Error al registrar el árbol:", traceback.format_exc())
+                    advertencia = f"❌ Error al registrar el árbol: {str(e)}"
+
+        # Envío rápido: sólo el estado, la página ya está en el navegador
+        if como_json:
+            if advertencia:
+                return jsonify({"ok": False, "error": advertencia}), 500
+            return jsonify({"ok": True, "mensaje": mensaje, "id_reserva": id_reserva,
+                            "nsubparcela": nsubparcela}), 201
+
+    # Renderizar la misma página sin redirección
+    return render_template(
+        'registro_arbol.html',
+        formulario=_form_arbol(reserva),
+        mensaje=mensaje,
+        advertencia=advertencia
+    )
+
+
+def _form_arbol(reserva):
+    """Reserva + formulario de árbol (con las subparcelas), cacheado por reserva."""
+    return fragmento('parciales/form_arbol.html', reserva,
+                     {'reserva': reserva, 'subparcelas': SUBPARCELAS if reserva else ()})
+
+
+
+
+
+
+@app.route('/registrar_planta', methods=['GET', 'POST'])
+def registrar_planta():
+    como_json = request.method == 'POST' and _quiere_json()
+
+    if 'usuario' not in session:
+        if como_json:
+            return jsonify({"ok": False, "error": "Sesión expirada", "redirigir": url_for('login')}), 401
+        return redirect(url_for('login'))
+
+    nro_documento = session['usuario']
+
+    # 🔹 Reserva vigente del usuario (filtrada por fecha en SQL, desde la caché)
+    reserva_activa = obtener_reserva_activa(nro_documento)
+
+    if not reserva_activa:
+        advertencia = "⚠ No tienes ninguna reserva activa en este momento."
+        if como_json:
+            return jsonify({"ok": False, "error": advertencia}), 409
+        return render_template(
+            'RegistroPlantas.html',
+            advertencia=advertencia
+        )
+
+    # 🔹 Procesar formulario si es método POST
+    if request.method == 'POST':
+        datos = _datos_formulario()
+        if como_json:
+            faltan = _faltantes(datos, _CAMPOS_FORM_PLANTA)
+            if faltan:
+                return jsonify({"ok": False, "error": f"Faltan campos: {', '.join(faltan)}"}), 400
+
+        tamano = datos['tamano']
+        nombre_comun = datos['nombre_comun']
+        observaciones = datos.get('observaciones', '')
+        nsubparcela = datos['nsubparcela']
+        id_reserva = reserva_activa[0]
+        id_brigada = 1  # Temporal
+        mensaje = None
+        error = None
+
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                try:
+                    fila = {
+                        'tamano': tamano,
+                        'nombre_comun': nombre_comun,
+                        'observaciones': observaciones,
+                        'nsubparcela': nsubparcela,
+                        'id_reserva': id_reserva,
+                        'nro_doc': nro_documento,
+                        'id_brigada': id_brigada
+                    }
+                    sentencias.ejecutar(cursor, _SQL_INSERT_PLANTA, fila)
+                    sumar_a_resumen(cursor, "planta", [fila])
+                    connection.commit()
+                    mensaje = "✅ Planta registrada exitosamente."
+                    log_action(nro_documento, "registrar_planta",
+                               {"id_reserva": id_reserva, "nsubparcela": nsubparcela})
+                except Exception as e:
+                    connection.rollback()
+                    import traceback
+                    print("❌ Error al registrar la planta:", traceback.format_exc())
+                    error = f"❌ Error al registrar la planta: {str(e)}"
+
+        # Envío rápido: sólo el estado, sin flash (no hay página que lo muestre)
+        if como_json:
+            if error:
+                return jsonify({"ok": False, "error": error}), 500
+            return jsonify({"ok": True, "mensaje": mensaje, "id_reserva": id_reserva,
+                            "nsubparcela": nsubparcela}), 201
+        flash(error or mensaje)
+
+    return render_template(
+        'RegistroPlantas.html',
+        formulario=fragmento('parciales/form_planta.html', reserva_activa,
+                             {'reserva': reserva_activa, 'subparcelas': SUBPARCELAS}),
+        advertencia=None
+    )
+@app.route('/registro_brigada')
+@requiere_admin
+def registro_brigada():
+    return render_template('registro_brigadas.html')
+
+
+# ---------------------------
+# API para frontend (HTML)
+# ---------------------------
+
+# Listas de usuarios por departamento; la versión cambia cuando se registra
+# alguien y las entradas viejas simplemente dejan de consultarse. La versión es
+# del proceso: con varios workers de gunicorn, un usuario nuevo aparece en los
+# demás recién cuando vence USUARIOS_CACHE_TTL.
+_usuarios_cache = CacheTTL(
+    maxsize=int(os.getenv('USUARIOS_CACHE_MAX', '64')),
+    ttl=float(os.getenv('USUARIOS_CACHE_TTL', '60'))
+)
+_usuarios_version = 0
+USUARIOS_LIMITE_MAX = int(os.getenv('USUARIOS_LIMITE_MAX', '500'))
+
+
+def invalidar_usuarios():
+    global _usuarios_version
+    _usuarios_version += 1
+
+
+def _fila_usuario(nro, nombre, apellido, departamento):
+    return {
+        "NRO_DOCUMENTO": str(nro),
+        "NOMBRE": nombre,
+        "APELLIDO": apellido,
+        "DEPARTAMENTO": departamento
+    }
+
+
+_SQL_USUARIOS_DEPARTAMENTO = sentencias.registrar("usuarios_departamento", """
+    SELECT NRO_DOCUMENTO, NOMBRE, APELLIDO, DEPARTAMENTO
+    FROM USUARIO
+    WHERE UPPER(DEPARTAMENTO) = UPPER(:dep)
+    ORDER BY NOMBRE, APELLIDO
+""")
+
+_SQL_USUARIOS_TODOS = sentencias.registrar("usuarios_todos", """
+    SELECT NRO_DOCUMENTO, NOMBRE, APELLIDO, DEPARTAMENTO
+    FROM USUARIO
+    ORDER BY DEPARTAMENTO, NOMBRE, APELLIDO
+""")
+
+_SQL_USUARIOS_PREFIJO = sentencias.registrar("usuarios_prefijo", """
+    SELECT NRO_DOCUMENTO, NOMBRE, APELLIDO, DEPARTAMENTO
+    FROM USUARIO
+    WHERE UPPER(NOMBRE) LIKE :q ESCAPE '\\'
+       OR UPPER(NOMBRE || ' ' || APELLIDO) LIKE :q ESCAPE '\\'
+       OR TO_CHAR(NRO_DOCUMENTO) LIKE :q ESCAPE '\\'
+    ORDER BY DEPARTAMENTO, NOMBRE, APELLIDO, NRO_DOCUMENTO
+    OFFSET :off ROWS FETCH NEXT :lim ROWS ONLY
+""", caliente=True)
+
+
+def _usuarios_por_departamento(departamento):
+    """
+    Lista completa (cacheada) de un departamento, o de todos si departamento es None.
+    El filtro UPPER(DEPARTAMENTO) se apoya en IX_USUARIO_DEP_UPPER (sql/indices.sql).
+    """
+    clave = (_usuarios_version, departamento.upper() if departamento else None)
+    usuarios = _usuarios_cache.obtener(clave)
+    if usuarios is not _FALTA:
+        return usuarios
+
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            if departamento:
+                # Buscar case-insensitive
+                sentencias.ejecutar(cursor, _SQL_USUARIOS_DEPARTAMENTO, {"dep": departamento})
+            else:
+                sentencias.ejecutar(cursor, _SQL_USUARIOS_TODOS)
+            usuarios = [_fila_usuario(*row) for row in cursor]
+
+    _usuarios_cache.guardar(clave, usuarios)
+    return usuarios
+
+
+def _coincide_prefijo(usuario, prefijo):
+    nombre = (usuario["NOMBRE"] or "").upper()
+    completo = f"{nombre} {(usuario['APELLIDO'] or '').upper()}"
+    return (nombre.startswith(prefijo) or completo.startswith(prefijo)
+            or usuario["NRO_DOCUMENTO"].startswith(prefijo))
+
+
+@app.route('/api/usuarios', methods=['GET'])
+@requiere_admin
+def api_usuarios():
+    """
+    Devuelve la lista de usuarios en formato JSON.
+    Si se pasa ?departamento=<nombre> devuelve sólo los usuarios de ese departamento.
+    Parámetros opcionales:
+      q=<prefijo>          -> nombre (o "nombre apellido") o documento que empieza por q
+      limite, desplazamiento -> paginación; la respuesta pasa a ser
+                              {"usuarios": [...], "siguiente": <desplazamiento> | null}
+      libres_desde, libres_hasta (YYYY-MM-DD) -> sólo quienes no tienen una
+                              reserva que se cruce con ese rango
+    """
+    departamento = request.args.get('departamento', None)
+    prefijo = (request.args.get('q') or '').strip().upper()
+    limite = request.args.get('limite', type=int)
+    desplazamiento = request.args.get('desplazamiento', 0, type=int)
+    libres_desde = request.args.get('libres_desde')
+    libres_hasta = request.args.get('libres_hasta')
+
+    if limite is not None and not (0 < limite <= USUARIOS_LIMITE_MAX):
+        return jsonify({"error": f"limite debe estar entre 1 y {USUARIOS_LIMITE_MAX}"}), 400
+    if desplazamiento < 0:
+        return jsonify({"error": "desplazamiento inválido"}), 400
+    if libres_desde or libres_hasta:
+        libres_desde = libres_desde or libres_hasta
+        libres_hasta = libres_hasta or libres_desde
+        error = _validar_rango(libres_desde, libres_hasta)
+        if error:
+            return jsonify({"error": error}), 400
+
+    try:
+        ocupados = _ocupados_en(libres_desde, libres_hasta) if libres_desde else None
+
+        if prefijo and not departamento:
+            # Búsqueda global para autocompletar: la hace Oracle y sólo trae una página
+            tope = limite or USUARIOS_LIMITE_MAX
+            like = prefijo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            with pool.acquire() as connection:
+                with connection.cursor() as cursor:
+                    sentencias.ejecutar(cursor, _SQL_USUARIOS_PREFIJO,
+                                        {"q": like, "off": desplazamiento, "lim": tope + 1})
+                    usuarios = [_fila_usuario(*row) for row in cursor]
+            pagina, hay_mas = usuarios[:tope], len(usuarios) > tope
+            if ocupados:
+                # Filtrar la página puede dejarla corta; "siguiente" sigue siendo válido
+                pagina = [u for u in pagina if u["NRO_DOCUMENTO"] not in ocupados]
+        else:
+            usuarios = _usuarios_por_departamento(departamento)
+            if prefijo:
+                usuarios = [u for u in usuarios if _coincide_prefijo(u, prefijo)]
+            if ocupados:
+                usuarios = [u for u in usuarios if u["NRO_DOCUMENTO"] not in ocupados]
+            if limite is None:
+                return jsonify(usuarios), 200
+            pagina = usuarios[desplazamiento:desplazamiento + limite]
+            hay_mas = len(usuarios) > desplazamiento + limite
+
+        if limite is None:
+            return jsonify(pagina), 200
+
+        return jsonify({
+            "usuarios": pagina,
+            "siguiente": desplazamiento + limite if hay_mas else None
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+
+def _validar_rango(fecha_inicio, fecha_fin):
+    """Mensaje de error si el rango YYYY-MM-DD no es válido, o None."""
+    try:
+        if datetime.strptime(fecha_fin, "%Y-%m-%d") < datetime.strptime(fecha_inicio, "%Y-%m-%d"):
+            return "La fecha fin no puede ser anterior a la fecha inicio"
+    except (TypeError, ValueError):
+        return "Formato de fecha inválido (usar YYYY-MM-DD)"
+    return None
+
+
+@app.route('/api/usuarios/disponibilidad', methods=['POST'])
+@requiere_admin
+def api_usuarios_disponibilidad():
+    """
+    ¿Cuáles de estos usuarios están libres en estas fechas? Recibe JSON:
+      {"documentos": ["111", "222", ...], "fechainicio": "YYYY-MM-DD", "fechafin": "YYYY-MM-DD"}
+    Responde {"libres": [...], "ocupados": {"222": [{"id_reserva", "fecha_inicio", "fecha_fin"}]}}
+    con una consulta por cada 1000 documentos.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    documentos = data.get('documentos')
+    fechainicio = data.get('fechainicio')
+    fechafin = data.get('fechafin')
+
+    if not isinstance(documentos, list) or not documentos:
+        return jsonify({"error": "Debe enviar una lista 'documentos' no vacía"}), 400
+    error = _validar_rango(fechainicio, fechafin)
+    if error:
+        return jsonify({"error": error}), 400
+
+    documentos = [str(d) for d in documentos]
+    try:
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                ocupados = _reservas_cruzadas(cursor, documentos, fechainicio, fechafin)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "libres": [d for d in dict.fromkeys(documentos) if d not in ocupados],
+        "ocupados": ocupados,
+    }), 200
+
+
+@app.route('/api/municipios', methods=['GET'])
+@cache_http(max_age=24 * 3600)
+def api_municipios():
+    """
+    Devuelve la lista de departamentos para que aparezcan en el select.
+    """
+    # Devolver en formato { "id": <index>, "nombre": <departamento> } por compatibilidad con frontend
+    out = [{"id": i+1, "nombre": d} for i, d in enumerate(DEPARTAMENTOS)]
+    return jsonify(out), 200
+
+
+# ---------------------------
+# IMPORTACIÓN MASIVA DE USUARIOS (CSV)
+# ---------------------------
+# CSV con encabezados nro_documento,nombre,apellido,contrasena,departamento y
+# rol opcional. Se lee en streaming y entra por lotes con executemany; el hash
+# (lo caro: ~150 ms por contraseña con scrypt) se reparte en hilos, porque
+# hashlib.scrypt/pbkdf2_hmac sueltan el GIL mientras calculan.
+IMPORT_USUARIOS_LOTE = int(os.getenv('IMPORT_USUARIOS_LOTE', '500'))
+IMPORT_HASH_HILOS = int(os.getenv('IMPORT_HASH_HILOS', str(os.cpu_count() or 4)))
+# Método para las contraseñas iniciales. Con uno más barato que HASH_METODO la
+# importación tarda mucho menos y cada usuario pasa a HASH_METODO en su primer
+# login (verificar_contrasena pide re-hashear cuando el método no coincide).
+IMPORT_HASH_METODO = os.getenv('IMPORT_HASH_METODO', HASH_METODO)
+
+_CAMPOS_USUARIO = ("nro_documento", "nombre", "apellido", "contrasena", "departamento")
+_ROLES = ("brigadista", ROL_ADMIN)
+
+_SQL_INSERT_USUARIO = sentencias.registrar("insertar_usuario", """
+    INSERT INTO USUARIO (NRO_DOCUMENTO, NOMBRE, APELLIDO, CONTRASENA, DEPARTAMENTO, ROL)
+    VALUES (:nro, :nombre, :apellido, :contrasena, :departamento, :rol)
+""")
+
+
+def _filas_csv(binario):
+    """Lee un CSV (bytes) fila a fila, con encabezados en minúscula y valores sin espacios."""
+    texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+    for fila in csv.DictReader(texto):
+        yield {(k or '').strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in fila.items()}
+
+
+def _validar_usuario_csv(fila):
+    """Devuelve (usuario, None) listo para el INSERT, o (None, motivo)."""
+    faltan = [c for c in _CAMPOS_USUARIO if not fila.get(c)]
+    if faltan:
+        return None, f"Faltan campos: {', '.join(faltan)}"
+    departamento = normalizar_departamento(fila["departamento"])
+    if departamento is None:
+        return None, f"Departamento desconocido: {fila['departamento']}"
+    rol = (fila.get("rol") or "brigadista").lower()
+    if rol not in _ROLES:
+        return None, f"Rol desconocido: {fila['rol']}"
+    return {
+        "nro": fila["nro_documento"],
+        "nombre": fila["nombre"],
+        "apellido": fila["apellido"],
+        "contrasena": fila["contrasena"],
+        "departamento": departamento,
+        "rol": rol,
+    }, None
+
+
+def _insertar_lote_usuarios(lote, hasheador, errores):
+    """
+    Hashea el lote en paralelo y lo inserta en un solo viaje. La conexión se
+    pide recién después del hash para no tenerla ociosa mientras se calcula.
+    Devuelve la cantidad insertada.
+    """
+    hashes = hasheador.map(
+        lambda u: generate_password_hash(u["contrasena"], method=IMPORT_HASH_METODO),
+        [u for _, u in lote]
+    )
+    filas = [dict(u, contrasena=h) for (_, u), h in zip(lote, hashes)]
+
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            sentencias.ejecutar_muchos(cursor, _SQL_INSERT_USUARIO, filas, batcherrors=True)
+            fallidos = cursor.getbatcherrors()
+            for err in fallidos:
+                linea, u = lote[err.offset]
+                errores.append({
+                    "fila": linea,
+                    "nro_documento": u["nro"],
+                    "error": "Documento ya registrado" if err.code == _ORA_UNICO else err.message
+                })
+            connection.commit()
+
+    return len(lote) - len(fallidos)
+
+
+def importar_usuarios(filas, lote=None, hilos=None):
+    """
+    Valida e inserta usuarios desde un iterable de dicts (p. ej. _filas_csv).
+    Cada lote se confirma por separado: una fila mala no deshace las demás.
+    "fila" en los errores es la línea del CSV (la 1 es el encabezado).
+    Devuelve {"insertados": n, "errores": [{"fila", "nro_documento", "error"}, ...]}.
+    """
+    lote = max(1, lote or IMPORT_USUARIOS_LOTE)
+    errores = []
+    insertados = 0
+    vistos = set()
+    pendientes = []
+
+    with ThreadPoolExecutor(max_workers=max(1, hilos or IMPORT_HASH_HILOS)) as hasheador:
+        for linea, fila in enumerate(filas, start=2):
+            usuario, error = _validar_usuario_csv(fila)
+            if usuario is not None and usuario["nro"] in vistos:
+                error = "Documento repetido en el archivo"
+            if error:
+                errores.append({"fila": linea, "nro_documento": fila.get("nro_documento"), "error": error})
+                continue
+
+            vistos.add(usuario["nro"])
+            pendientes.append((linea, usuario))
+            if len(pendientes) >= lote:
+                insertados += _insertar_lote_usuarios(pendientes, hasheador, errores)
+                pendientes = []
+
+        if pendientes:
+            insertados += _insertar_lote_usuarios(pendientes, hasheador, errores)
+
+    if insertados:
+        invalidar_usuarios()
+    errores.sort(key=lambda e: e["fila"])
+    return {"insertados": insertados, "errores": errores}
+
+
+@app.route('/api/usuarios/importar', methods=['POST'])
+@requiere_admin
+def api_importar_usuarios():
+    """
+    Alta masiva de brigadistas antes de una campaña.
+    Recibe multipart con archivo=<csv> (o el CSV como cuerpo, text/csv) y
+    opcionalmente ?lote=N. Responde {"ok", "insertados", "errores": [...]}.
+    """
+    if 'archivo' in request.files:
+        binario = request.files['archivo'].stream
+    elif request.mimetype == 'text/csv':
+        binario = request.stream
+    else:
+        return jsonify({"error": "Envíe el CSV en 'archivo' o con Content-Type text/csv"}), 400
+
+    try:
+        inicio = time.perf_counter()
+        resultado = importar_usuarios(_filas_csv(binario), lote=request.args.get('lote', type=int))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"CSV inválido: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    log_action(session.get('usuario'), "importar_usuarios", {
+        "insertados": resultado["insertados"],
+        "errores": len(resultado["errores"]),
+        "segundos": round(time.perf_counter() - inicio, 2)
+    })
+
+    return jsonify(dict(resultado, ok=not resultado["errores"])), 201 if resultado["insertados"] else 400
+
+
+@app.cli.command("importar-usuarios")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--lote", type=int, default=None, help=f"Filas por executemany (por defecto {IMPORT_USUARIOS_LOTE})")
+@click.option("--hilos", type=int, default=None, help=f"Hilos para el hash (por defecto {IMPORT_HASH_HILOS})")
+def cli_importar_usuarios(archivo, lote, hilos):
+    """Importa usuarios desde un CSV (nro_documento,nombre,apellido,contrasena,departamento[,rol])."""
+    inicio = time.perf_counter()
+    with open(archivo, "rb") as f:
+        resultado = importar_usuarios(_filas_csv(f), lote=lote, hilos=hilos)
+    for err in resultado["errores"]:
+        click.echo(f"  fila {err['fila']} ({err['nro_documento'] or '-'}): {err['error']}")
+    click.echo(f"✔ {resultado['insertados']} usuarios importados, {len(resultado['errores'])} con error "
+               f"en {time.perf_counter() - inicio:.1f} s")
+
+
+# ---------------------------
+# ÍNDICE ESPACIAL DE RESERVAS (parcelas cercanas)
+# ---------------------------
+# Rejilla en memoria sobre LATITUD/LONGITUD de RESERVA_EVENTO. Se carga en la
+# primera consulta y luego sólo trae las reservas con CREADO_EN desde la mayor
+# vista menos RESERVAS_INDICE_SOLAPE_S: así entran también las transacciones que
+# confirman tarde (un ID o un CREADO_EN menor que otro ya visto). Cada
+# RESERVAS_INDICE_RECARGA s se recarga entero.
+RESERVAS_CELDA_GRADOS = float(os.getenv('RESERVAS_CELDA_GRADOS', '0.1'))   # ~11 km
+RESERVAS_INDICE_REFRESCO = float(os.getenv('RESERVAS_INDICE_REFRESCO', '30'))
+RESERVAS_INDICE_RECARGA = float(os.getenv('RESERVAS_INDICE_RECARGA', '3600'))
+RESERVAS_INDICE_SOLAPE_S = float(os.getenv('RESERVAS_INDICE_SOLAPE_S', '300'))
+RESERVAS_CERCANAS_LIMITE_MAX = int(os.getenv('RESERVAS_CERCANAS_LIMITE_MAX', '1000'))
+# Centro a centro: subparcelas a 80 m del centro con radio de 15 m -> 2 x 95 m
+RESERVAS_SOLAPE_KM = float(os.getenv('RESERVAS_SOLAPE_KM', '0.19'))
+RADIO_TIERRA_KM = 6371.0088
+
+
+def distancia_km(lat1, lng1, lat2, lng2):
+    """Distancia haversine en km."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlng / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+_SQL_RESERVAS_TODAS = sentencias.registrar("reservas_todas", """
+    SELECT ID_RESERVA, LATITUD, LONGITUD, FECHA_INICIO, FECHA_FIN, MUNICIPIO, CREADO_EN
+    FROM RESERVA_EVENTO
+""")
+
+_SQL_RESERVAS_DESDE = sentencias.registrar("reservas_desde", """
+    SELECT ID_RESERVA, LATITUD, LONGITUD, FECHA_INICIO, FECHA_FIN, MUNICIPIO, CREADO_EN
+    FROM RESERVA_EVENTO
+    WHERE CREADO_EN >= :desde
+""")
+
+
+class IndiceReservas:
+    """
+    Reservas por celda de RESERVAS_CELDA_GRADOS. Una consulta revisa sólo las
+    celdas que tocan la caja pedida, así que no depende del total de reservas.
+    La consulta a Oracle se hace fuera de _lock (con _carga sólo un hilo
+    refresca); bajo _lock sólo se aplican las filas o se cambia la rejilla.
+    """
+
+    def __init__(self, celda):
+        self.celda = celda
+        self.descartar()
+
+    def descartar(self):
+        """Olvida todo; la próxima consulta vuelve a cargar desde Oracle."""
+        self._lock = threading.Lock()
+        self._carga = threading.Lock()
+        self._reservas = {}     # id -> (lat, lng, fecha_inicio, fecha_fin, municipio)
+        self._celdas = {}       # (fila, columna) -> set(id)
+        self._marca = None      # mayor CREADO_EN leído de Oracle
+        self._cargado_en = None
+        self._refrescado_en = 0.0
+
+    def _clave(self, lat, lng):
+        return int(math.floor(lat / self.celda)), int(math.floor(lng / self.celda))
+
+    def _agregar(self, reservas, celdas, id_reserva, lat, lng, fecha_inicio, fecha_fin, municipio):
+        if lat is None or lng is None:
+            return
+        lat, lng = float(lat), float(lng)
+        anterior = reservas.get(id_reserva)
+        if anterior:
+            celdas.get(self._clave(anterior[0], anterior[1]), set()).discard(id_reserva)
+        reservas[id_reserva] = (lat, lng, fecha_inicio, fecha_fin, municipio)
+        celdas.setdefault(self._clave(lat, lng), set()).add(id_reserva)
+
+    def agregar(self, id_reserva, lat, lng, fecha_inicio, fecha_fin, municipio):
+        """Registra una reserva recién creada en este proceso (sin esperar al refresco)."""
+        with self._lock:
+            if self._cargado_en is not None:
+                self._agregar(self._reservas, self._celdas, int(id_reserva),
+                              lat, lng, fecha_inicio, fecha_fin, municipio)
+
+    def _vigente(self, ahora):
+        return self._cargado_en is not None and ahora - self._refrescado_en < RESERVAS_INDICE_REFRESCO
+
+    def _asegurar(self):
+        if self._vigente(time.monotonic()):
+            return
+        # Con el índice ya cargado, mientras otro hilo refresca se responde con
+        # lo que hay; sólo la primera carga hace esperar
+        if not self._carga.acquire(blocking=self._cargado_en is None):
+            return
+        try:
+            ahora = time.monotonic()
+            if self._vigente(ahora):
+                return
+            completo = self._cargado_en is None or ahora - self._cargado_en >= RESERVAS_INDICE_RECARGA
+
+            with pool.acquire() as connection:
+                with connection.cursor() as cursor:
+                    cursor.arraysize = 5000
+                    if completo or self._marca is None:
+                        sentencias.ejecutar(cursor, _SQL_RESERVAS_TODAS)
+                    else:
+                        sentencias.ejecutar(cursor, _SQL_RESERVAS_DESDE, {
+                            "desde": self._marca - timedelta(seconds=RESERVAS_INDICE_SOLAPE_S)})
+                    filas = cursor.fetchall()
+
+            fechas = [f[6] for f in filas if f[6] is not None]
+            marca = max(fechas + ([self._marca] if self._marca else []), default=None)
+            if completo:
+                reservas, celdas = {}, {}
+                for fila in filas:
+                    self._agregar(reservas, celdas, *fila[:6])
+                with self._lock:
+                    self._reservas, self._celdas = reservas, celdas
+                    self._cargado_en = ahora
+            else:
+                with self._lock:
+                    for fila in filas:
+                        self._agregar(self._reservas, self._celdas, *fila[:6])
+            self._marca = marca
+            self._refrescado_en = ahora
+        finally:
+            self._carga.release()
+
+    def buscar(self, lat_min, lng_min, lat_max, lng_max, desde=None, hasta=None):
+        """IDs y datos de las reservas dentro de la caja (y del rango de fechas, si se da)."""
+        self._asegurar()
+        f0, c0 = self._clave(lat_min, lng_min)
+        f1, c1 = self._clave(lat_max, lng_max)
+        encontradas = []
+        with self._lock:
+            # Caja muy grande: sale más barato recorrer sólo las celdas ocupadas
+            if (f1 - f0 + 1) * (c1 - c0 + 1) > len(self._celdas):
+                claves = [k for k in self._celdas if f0 <= k[0] <= f1 and c0 <= k[1] <= c1]
+            else:
+                claves = [(f, c) for f in range(f0, f1 + 1) for c in range(c0, c1 + 1)]
+            for clave in claves:
+                for id_reserva in self._celdas.get(clave, ()):
+                    lat, lng, ini, fin, municipio = self._reservas[id_reserva]
+                    if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+                        continue
+                    # Se cruzan en el tiempo si ninguna termina antes de que empiece la otra
+                    if hasta is not None and ini is not None and ini > hasta:
+                        continue
+                    if desde is not None and fin is not None and fin < desde:
+                        continue
+                    encontradas.append((id_reserva, lat, lng, ini, fin, municipio))
+        return encontradas
+
+    def cercanas(self, lat, lng, radio_km, desde=None, hasta=None):
+        """Reservas a menos de radio_km, ordenadas por distancia: [(distancia, fila), ...]."""
+        dlat = math.degrees(radio_km / RADIO_TIERRA_KM)
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        resultado = []
+        for fila in self.buscar(lat - dlat, lng - dlng, lat + dlat, lng + dlng, desde, hasta):
+            d = distancia_km(lat, lng, fila[1], fila[2])
+            if d <= radio_km:
+                resultado.append((d, fila))
+        resultado.sort(key=lambda x: x[0])
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            return {"reservas": len(self._reservas), "celdas": len(self._celdas),
+                    "marca": str(self._marca) if self._marca else None, "celda_grados": self.celda}
+
+
+indice_reservas = IndiceReservas(RESERVAS_CELDA_GRADOS)
+
+
+def _reserva_json(fila, distancia=None):
+    id_reserva, lat, lng, ini, fin, municipio = fila
+    datos = {
+        "id_reserva": id_reserva,
+        "municipio": municipio,
+        "lat": lat,
+        "lng": lng,
+        "fecha_inicio": ini.strftime('%Y-%m-%d') if ini else None,
+        "fecha_fin": fin.strftime('%Y-%m-%d') if fin else None,
+    }
+    if distancia is not None:
+        datos["distancia_km"] = round(distancia, 3)
+    return datos
+
+
+def parcelas_solapadas(reserva, excluir=()):
+    """
+    Advertencias por parcelas a menos de RESERVAS_SOLAPE_KM de la reserva validada.
+    excluir: IDs que no cuentan (la propia reserva recién creada, que el
+    refresco del índice ya puede haber leído de Oracle).
+    """
+    cercanas = indice_reservas.cercanas(reserva["lat_num"], reserva["lng_num"], RESERVAS_SOLAPE_KM)
+    return [_reserva_json(fila, d) for d, fila in cercanas if fila[0] not in excluir]
+
+
+def _coordenada(texto):
+    """float() acepta "inf" y "nan", que el índice no sabe ubicar: se rechazan con ValueError."""
+    valor = float(texto)
+    if not math.isfinite(valor):
+        raise ValueError(texto)
+    return valor
+
+
+@app.route('/api/reservas/cercanas', methods=['GET'])
+def api_reservas_cercanas():
+    """
+    Parcelas cercanas desde el índice en memoria. Parámetros:
+      lat, lng, radio_km (por defecto 1)   -> círculo, ordenado por distancia
+      o bbox=lat_min,lng_min,lat_max,lng_max -> caja
+      desde, hasta (YYYY-MM-DD, opcionales) -> sólo reservas que se cruzan con esas fechas
+      limite (1 a RESERVAS_CERCANAS_LIMITE_MAX, por defecto 100)
+    """
+    if 'usuario' not in session:
+        return jsonify({"error": "No autenticado"}), 401
+
+    try:
+        desde = request.args.get("desde")
+        hasta = request.args.get("hasta")
+        desde = datetime.strptime(desde, "%Y-%m-%d") if desde else None
+        hasta = datetime.strptime(hasta, "%Y-%m-%d") if hasta else None
+        limite = int(request.args.get("limite", 100))
+        if not (1 <= limite <= RESERVAS_CERCANAS_LIMITE_MAX):
+            return jsonify({"error": f"limite debe estar entre 1 y {RESERVAS_CERCANAS_LIMITE_MAX}"}), 400
+
+        bbox = request.args.get("bbox")
+        if bbox:
+            lat_min, lng_min, lat_max, lng_max = (_coordenada(x) for x in bbox.split(","))
+            filas = [(None, f) for f in indice_reservas.buscar(lat_min, lng_min, lat_max, lng_max, desde, hasta)]
+        else:
+            lat = _coordenada(request.args["lat"])
+            lng = _coordenada(request.args["lng"])
+            radio_km = request.args.get("radio_km", 1.0, type=float)
+            if not (0 < radio_km <= 500):
+                return jsonify({"error": "radio_km debe estar entre 0 y 500"}), 400
+            filas = indice_reservas.cercanas(lat, lng, radio_km, desde, hasta)
+    except (KeyError, ValueError):
+        return jsonify({"error": "Use lat, lng y radio_km, o bbox=lat_min,lng_min,lat_max,lng_max "
+                                 "(fechas en YYYY-MM-DD, limite entero)"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "reservas": [_reserva_json(fila, d) for d, fila in filas[:limite]],
+        "total": len(filas),
+    })
+
+
+_SQL_INSERT_RESERVA = sentencias.registrar("insertar_reserva", """
+    INSERT INTO RESERVA_EVENTO (
+        ID_RESERVA, FECHA_INICIO, FECHA_FIN, MUNICIPIO, LATITUD, LONGITUD, CREADO_EN
+    ) VALUES (
+        SEQ_RESERVA_ID.NEXTVAL, TO_DATE(:fi,'YYYY-MM-DD'), TO_DATE(:ff,'YYYY-MM-DD'), :mun, :lat, :lng, SYSDATE
+    )
+    RETURNING ID_RESERVA INTO :idr
+""")
+
+_SQL_INSERT_PARTICIPANTE = sentencias.registrar("insertar_participante", """
+    INSERT INTO RESERVA_PARTICIPANTE (ID_RESERVA, NRO_DOCUMENTO_USUARIO)
+    VALUES (:idr, :nro)
+""")
+
+# Campañas (/api/crear_reservas): IDs de la secuencia en un viaje y eventos por executemany
+_SQL_IDS_RESERVA = sentencias.registrar(
+    "ids_reserva", "SELECT SEQ_RESERVA_ID.NEXTVAL FROM DUAL CONNECT BY LEVEL <= :n")
+
+_SQL_INSERT_RESERVA_CON_ID = sentencias.registrar("insertar_reserva_con_id", """
+    INSERT INTO RESERVA_EVENTO (
+        ID_RESERVA, FECHA_INICIO, FECHA_FIN, MUNICIPIO, LATITUD, LONGITUD, CREADO_EN
+    ) VALUES (
+        :idr, TO_DATE(:fi,'YYYY-MM-DD'), TO_DATE(:ff,'YYYY-MM-DD'), :mun, :lat, :lng, SYSDATE
+    )
+""")
+
+_SQL_BORRAR_PARTICIPANTES_RESERVA = sentencias.registrar(
+    "borrar_participantes_reserva", "DELETE FROM RESERVA_PARTICIPANTE WHERE ID_RESERVA = :idr")
+
+_SQL_BORRAR_RESERVA = sentencias.registrar(
+    "borrar_reserva", "DELETE FROM RESERVA_EVENTO WHERE ID_RESERVA = :idr")
+
+# Oracle admite como máximo 1000 expresiones en una lista IN
+_MAX_IN = 1000
+
+
+def _lista_in(valores):
+    """
+    Placeholders y binds (:d0, :d1, ...) de una lista IN. El largo se redondea
+    a la siguiente potencia de 2 repitiendo el último valor: así hay unos
+    pocos textos distintos (que el caché de sentencias reutiliza) y no uno
+    por cada cantidad de documentos.
+    """
+    n = 1
+    while n < len(valores):
+        n *= 2
+    n = min(n, _MAX_IN)
+    relleno = list(valores) + [valores[-1]] * (n - len(valores))
+    binds = {f"d{j}": v for j, v in enumerate(relleno)}
+    return ", ".join(":" + k for k in binds), binds
+
+
+def _validar_reserva(data):
+    """
+    Valida los campos de una reserva (sin tocar la base de datos).
+    Devuelve (reserva, None) con los campos normalizados o (None, mensaje de error).
+    """
+    if not isinstance(data, dict):
+        return None, "La reserva debe ser un objeto JSON"
+
+    fechainicio = data.get('fechainicio')
+    fechafin = data.get('fechafin')
+    participantes = data.get('participantes', [])
+    municipio = data.get('municipio')
+    lat = data.get('lat')
+    lng = data.get('lng')
+
+    # Campos obligatorios
+    if not (fechainicio and fechafin and municipio and lat and lng):
+        return None, "Faltan campos obligatorios"
+
+    # Parsear fechas
+    try:
+        dt_inicio = datetime.strptime(fechainicio, "%Y-%m-%d")
+        dt_fin = datetime.strptime(fechafin, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None, "Formato de fecha inválido (usar YYYY-MM-DD)"
+
+    if dt_fin < dt_inicio:
+        return None, "La fecha fin no puede ser anterior a la fecha inicio"
+
+    try:
+        lat_num, lng_num = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, "Coordenadas inválidas"
+    if not (-90 <= lat_num <= 90 and -180 <= lng_num <= 180):
+        return None, "Coordenadas fuera de rango"
+
+    # Validar exactamente 4 participantes distintos
+    if not isinstance(participantes, list) or len(participantes) != 4:
+        return None, "Debe seleccionar exactamente 4 participantes"
+    participantes = [str(p) for p in participantes]
+    if len(set(participantes)) != 4:
+        return None, "Los participantes no pueden repetirse"
+
+    return {
+        "fechainicio": fechainicio,
+        "fechafin": fechafin,
+        "municipio": municipio,
+        "lat": lat,
+        "lng": lng,
+        "lat_num": lat_num,
+        "lng_num": lng_num,
+        "fecha_inicio_dt": dt_inicio,
+        "fecha_fin_dt": dt_fin,
+        "participantes": participantes,
+    }, None
+
+
+def _solapes_sin_falla(reserva, excluir=()):
+    """parcelas_solapadas sin tumbar la creación si el índice no se pudo cargar."""
+    try:
+        return parcelas_solapadas(reserva, excluir)
+    except Exception as e:
+        print("⚠ No se pudo revisar el solapamiento de parcelas:", e)
+        return []
+
+
+def _indexar_reserva(id_reserva, reserva):
+    indice_reservas.agregar(id_reserva, reserva["lat_num"], reserva["lng_num"],
+                            reserva["fecha_inicio_dt"], reserva["fecha_fin_dt"], reserva["municipio"])
+
+
+def _documentos_inexistentes(cursor, documentos, bloquear=False):
+    """
+    Devuelve el conjunto de documentos que no existen en USUARIO (una consulta por cada 1000).
+    Con bloquear=True toma las filas con FOR UPDATE hasta el commit, para que dos
+    reservas simultáneas con la misma persona no pasen ambas la revisión de cruces.
+    """
+    documentos = sorted(set(documentos))
+    existentes = set()
+    for i in range(0, len(documentos), _MAX_IN):
+        marcas, binds = _lista_in(documentos[i:i + _MAX_IN])
+        sql = sentencias.registrar(
+            f"usuarios_existentes[{len(binds)}]" + ("_bloqueo" if bloquear else ""),
+            f"SELECT NRO_DOCUMENTO FROM USUARIO WHERE NRO_DOCUMENTO IN ({marcas})"
+            + (" FOR UPDATE" if bloquear else "")
+        )
+        sentencias.ejecutar(cursor, sql, binds)
+        existentes.update(str(row[0]) for row in cursor)
+    return set(documentos) - existentes
+
+
+def _reservas_cruzadas(cursor, documentos, fecha_inicio, fecha_fin):
+    """
+    Reservas de estos documentos que se cruzan con [fecha_inicio, fecha_fin]
+    (YYYY-MM-DD): {documento: [{"id_reserva", "fecha_inicio", "fecha_fin"}, ...]}.
+    Dos intervalos se cruzan si cada uno empieza antes de que termine el otro;
+    IX_PARTICIPANTE_USUARIO e IX_RESERVA_FECHAS (sql/indices.sql) la resuelven
+    sin recorrer las tablas.
+    """
+    documentos = sorted(set(documentos))
+    cruces = {}
+    for i in range(0, len(documentos), _MAX_IN):
+        marcas, binds = _lista_in(documentos[i:i + _MAX_IN])
+        sql = sentencias.registrar(f"reservas_cruzadas[{len(binds)}]", f"""
+            SELECT rp.NRO_DOCUMENTO_USUARIO, re.ID_RESERVA, re.FECHA_INICIO, re.FECHA_FIN
+            FROM RESERVA_PARTICIPANTE rp
+            JOIN RESERVA_EVENTO re ON rp.ID_RESERVA = re.ID_RESERVA
+            WHERE rp.NRO_DOCUMENTO_USUARIO IN ({marcas})
+              AND re.FECHA_INICIO <= TO_DATE(:ff, 'YYYY-MM-DD')
+              AND re.FECHA_FIN >= TO_DATE(:fi, 'YYYY-MM-DD')
+            ORDER BY rp.NRO_DOCUMENTO_USUARIO, re.FECHA_INICIO, re.ID_RESERVA
+        """)
+        sentencias.ejecutar(cursor, sql, {**binds, "fi": fecha_inicio, "ff": fecha_fin})
+        for nro, id_reserva, ini, fin in cursor:
+            cruces.setdefault(str(nro), []).append({
+                "id_reserva": id_reserva,
+                "fecha_inicio": ini.strftime('%Y-%m-%d'),
+                "fecha_fin": fin.strftime('%Y-%m-%d'),
+            })
+    return cruces
+
+
+_SQL_OCUPADOS_EN = sentencias.registrar("ocupados_en", """
+    SELECT DISTINCT rp.NRO_DOCUMENTO_USUARIO
+    FROM RESERVA_EVENTO re
+    JOIN RESERVA_PARTICIPANTE rp ON rp.ID_RESERVA = re.ID_RESERVA
+    WHERE re.FECHA_INICIO <= TO_DATE(:ff, 'YYYY-MM-DD')
+      AND re.FECHA_FIN >= TO_DATE(:fi, 'YYYY-MM-DD')
+""")
+
+
+def _ocupados_en(fecha_inicio, fecha_fin):
+    """Documentos con alguna reserva que se cruza con el rango (para filtrar /api/usuarios)."""
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            sentencias.ejecutar(cursor, _SQL_OCUPADOS_EN, {"fi": fecha_inicio, "ff": fecha_fin})
+            return {str(row[0]) for row in cursor}
+
+
+def _mensaje_cruces(cruces):
+    return "Participantes con otra reserva en esas fechas: " + ", ".join(
+        f"{nro} (reserva {', '.join(str(c['id_reserva']) for c in lista)})"
+        for nro, lista in sorted(cruces.items())
+    )
+
+
+@app.route('/api/crear_reserva', methods=['POST'])
+@requiere_admin
+def api_crear_reserva():
+    """
+    Recibe JSON con:
+    {
+      "fechainicio":"YYYY-MM-DD",
+      "fechafin":"YYYY-MM-DD",
+      "municipio":"Nombre",
+      "lat":"4.123456",
+      "lng":"-74.123456",
+      "participantes":["111","222","333","444"]
+    }
+    Valida y crea una reserva + registros de participantes.
+    Son cuatro viajes a la base: validación (y bloqueo) de participantes,
+    revisión de reservas cruzadas (409 si alguno ya está ocupado en esas
+    fechas), INSERT ... RETURNING y un executemany para RESERVA_PARTICIPANTE.
+    """
+    try:
+        reserva, error = _validar_reserva(request.get_json(force=True))
+        if error:
+            return jsonify({"error": error}), 400
+
+        participantes = reserva["participantes"]
+
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                # Validar en una sola consulta que todos existan en USUARIO (y bloquearlos)
+                faltantes = _documentos_inexistentes(cursor, participantes, bloquear=True)
+                if faltantes:
+                    connection.rollback()
+                    return jsonify({
+                        "error": f"Los participantes {', '.join(sorted(faltantes))} no existen en USUARIO",
+                        "faltantes": sorted(faltantes)
+                    }), 400
+
+                # Nadie puede estar en dos reservas con fechas cruzadas
+                cruces = _reservas_cruzadas(cursor, participantes, reserva["fechainicio"], reserva["fechafin"])
+                if cruces:
+                    connection.rollback()
+                    return jsonify({"error": _mensaje_cruces(cruces), "ocupados": cruces}), 409
+
+                # Insertar en RESERVA_EVENTO tomando el ID de SEQ_RESERVA_ID en el mismo INSERT
+                id_var = cursor.var(int)
+                sentencias.ejecutar(cursor, _SQL_INSERT_RESERVA, {
+                    "fi": reserva["fechainicio"],
+                    "ff": reserva["fechafin"],
+                    "mun": reserva["municipio"],
+                    "lat": reserva["lat"],
+                    "lng": reserva["lng"],
+                    "idr": id_var
+                })
+                id_reserva = id_var.getvalue()[0]
+
+                # Insertar participantes en RESERVA_PARTICIPANTE
+                sentencias.ejecutar_muchos(cursor, _SQL_INSERT_PARTICIPANTE, [
+                    {"idr": id_reserva, "nro": nro} for nro in participantes
+                ])
+
+                connection.commit()
+
+        invalidar_reserva_activa(*participantes)
+        log_action(session.get('usuario'), "crear_reserva",
+                   {"id_reserva": int(id_reserva), "municipio": reserva["municipio"], "participantes": participantes})
+
+        # Parcelas existentes que se solapan con la nueva (sólo advertencia)
+        advertencias = _solapes_sin_falla(reserva, excluir={int(id_reserva)})
+        _indexar_reserva(id_reserva, reserva)
+        return jsonify({"ok":True, "id_reserva": int(id_reserva), "solapes": advertencias}), 201
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _descartar_cruces_campana(cursor, validas, errores):
+    """
+    Quita de validas (y anota en errores) las reservas de la campaña cuyos
+    participantes ya tienen otra reserva cruzada, en la base o en la misma
+    campaña (gana la que aparece primero). Un viaje para toda la campaña.
+    """
+    if not validas:
+        return
+    desde = min(r["fechainicio"] for r in validas.values())
+    hasta = max(r["fechafin"] for r in validas.values())
+    existentes = _reservas_cruzadas(
+        cursor, [nro for r in validas.values() for nro in r["participantes"]], desde, hasta)
+
+    aceptadas = {}   # documento -> [(inicio, fin, indice)] de la campaña
+    for i, r in sorted(validas.items()):
+        ini, fin = r["fecha_inicio_dt"], r["fecha_fin_dt"]
+        cruces = {}
+        for nro in r["participantes"]:
+            lista = [c for c in existentes.get(nro, [])
+                     if c["fecha_inicio"] <= r["fechafin"] and c["fecha_fin"] >= r["fechainicio"]]
+            lista += [{"indice": j} for a, b, j in aceptadas.get(nro, []) if a <= fin and b >= ini]
+            if lista:
+                cruces[nro] = lista
+        if cruces:
+            errores[i] = "Participantes con otra reserva en esas fechas: " + ", ".join(sorted(cruces))
+            del validas[i]
+            continue
+        for nro in r["participantes"]:
+            aceptadas.setdefault(nro, []).append((ini, fin, i))
+
+
+@app.route('/api/crear_reservas', methods=['POST'])
+@requiere_admin
+def api_crear_reservas():
+    """
+    Variante masiva para una campaña completa. Recibe JSON con:
+    {
+      "reservas": [ {<mismo formato que /api/crear_reserva>}, ... ],
+      "atomico": false
+    }
+    Todo se hace en una transacción: validación de participantes en bloque,
+    IDs de la secuencia en una consulta y executemany para eventos y participantes.
+    Con "atomico": true cualquier error cancela toda la campaña; si no,
+    se crean las reservas válidas y se reportan los errores por índice.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        items = data.get('reservas')
+        atomico = bool(data.get('atomico', False))
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Debe enviar una lista 'reservas' no vacía"}), 400
+
+        errores = {}
+        validas = {}
+        for i, item in enumerate(items):
+            reserva, error = _validar_reserva(item)
+            if error:
+                errores[i] = error
+            else:
+                validas[i] = reserva
+
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                faltantes = _documentos_inexistentes(
+                    cursor, [nro for r in validas.values() for nro in r["participantes"]], bloquear=True
+                )
+                for i, r in list(validas.items()):
+                    ausentes = sorted(set(r["participantes"]) & faltantes)
+                    if ausentes:
+                        errores[i] = f"Los participantes {', '.join(ausentes)} no existen en USUARIO"
+                        del validas[i]
+
+                _descartar_cruces_campana(cursor, validas, errores)
+
+                if errores and atomico:
+                    connection.rollback()
+                    return jsonify({
+                        "error": "La campaña tiene reservas inválidas",
+                        "errores": [{"indice": i, "error": e} for i, e in sorted(errores.items())]
+                    }), 400
+
+                creadas = {}
+                if validas:
+                    indices = list(validas)
+
+                    # Todos los IDs de la secuencia en un solo viaje
+                    sentencias.ejecutar(cursor, _SQL_IDS_RESERVA, {"n": len(indices)})
+                    ids = [row[0] for row in cursor]
+                    asignados = dict(zip(indices, ids))
+
+                    sentencias.ejecutar_muchos(cursor, _SQL_INSERT_RESERVA_CON_ID, [
+                        {
+                            "idr": asignados[i],
+                            "fi": validas[i]["fechainicio"],
+                            "ff": validas[i]["fechafin"],
+                            "mun": validas[i]["municipio"],
+                            "lat": validas[i]["lat"],
+                            "lng": validas[i]["lng"],
+                        }
+                        for i in indices
+                    ], batcherrors=True)
+                    for err in cursor.getbatcherrors():
+                        errores[indices[err.offset]] = err.message
+
+                    insertadas = [i for i in indices if i not in errores]
+                    filas_part = [
+                        (i, {"idr": asignados[i], "nro": nro})
+                        for i in insertadas for nro in validas[i]["participantes"]
+                    ]
+                    if filas_part:
+                        sentencias.ejecutar_muchos(cursor, _SQL_INSERT_PARTICIPANTE,
+                                           [f for _, f in filas_part], batcherrors=True)
+                        fallidas = set()
+                        for err in cursor.getbatcherrors():
+                            i = filas_part[err.offset][0]
+                            errores[i] = err.message
+                            fallidas.add(i)
+
+                        # Una reserva con participantes incompletos no se deja a medias
+                        if fallidas and not atomico:
+                            filas = [{"idr": asignados[i]} for i in sorted(fallidas)]
+                            sentencias.ejecutar_muchos(cursor, _SQL_BORRAR_PARTICIPANTES_RESERVA, filas)
+                            sentencias.ejecutar_muchos(cursor, _SQL_BORRAR_RESERVA, filas)
+
+                    if errores and atomico:
+                        connection.rollback()
+                        return jsonify({
+                            "error": "La campaña tiene reservas inválidas",
+                            "errores": [{"indice": i, "error": e} for i, e in sorted(errores.items())]
+                        }), 400
+
+                    creadas = {i: int(asignados[i]) for i in indices if i not in errores}
+
+                connection.commit()
+
+        for i, id_reserva in creadas.items():
+            invalidar_reserva_activa(*validas[i]["participantes"])
+            log_action(session.get('usuario'), "crear_reserva", {
+                "id_reserva": id_reserva,
+                "municipio": validas[i]["municipio"],
+                "participantes": validas[i]["participantes"]
+            })
+
+        # Solapes contra las parcelas que ya existían; después se indexan las nuevas
+        nuevas = set(creadas.values())
+        solapes = {i: _solapes_sin_falla(validas[i], excluir=nuevas) for i in creadas}
+        for i, id_reserva in creadas.items():
+            _indexar_reserva(id_reserva, validas[i])
+
+        return jsonify({
+            "ok": not errores,
+            "creadas": [{"indice": i, "id_reserva": idr, "solapes": solapes[i]}
+                        for i, idr in sorted(creadas.items())],
+            "errores": [{"indice": i, "error": e} for i, e in sorted(errores.items())]
+        }), 201 if creadas else 400
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ---------------------------
+# SINCRONIZACIÓN DE DATOS DE CAMPO (offline)
+# ---------------------------
+SYNC_MAX_REGISTROS = int(os.getenv('SYNC_MAX_REGISTROS', '5000'))
+
+# Campos obligatorios por tipo (observaciones e id_reserva son opcionales)
+_CAMPOS_SYNC = {
+    "arbol": ("id_cliente", "altura", "dano", "diametro", "formafuste", "nsubparcela"),
+    "planta": ("id_cliente", "tamano", "nombre_comun", "nsubparcela"),
+}
+
+_SQL_INSERT_ARBOL = sentencias.registrar("insertar_arbol", """
+    INSERT INTO ARBOL (ALTURA, DANO, DIAMETRO, FORMAFUSTE, OBSERVACIONES,
+                       NSUBPARCELA, NRO_DOCUMENTO, ID_RESERVA)
+    VALUES (:altura, :dano, :diametro, :formafuste, :observaciones,
+            :nsubparcela, :nro_doc, :id_reserva)
+""", caliente=True)
+
+_SQL_INSERT_PLANTA = sentencias.registrar("insertar_planta", """
+    INSERT INTO PLANTA (TAMANO, NOMBRE_COMUN, OBSERVACIONES,
+                        NSUBPARCELA, ID_RESERVA, NRO_DOCUMENTO_USUARIO, ID_BRIGADA)
+    VALUES (:tamano, :nombre_comun, :observaciones,
+            :nsubparcela, :id_reserva, :nro_doc, :id_brigada)
+""", caliente=True)
+
+# Todas las reservas del usuario con una marca de vigencia (la de hoy es 1)
+_SQL_RESERVAS_USUARIO = sentencias.registrar("reservas_usuario", """
+    SELECT re.ID_RESERVA,
+           CASE WHEN TRUNC(SYSDATE) BETWEEN TRUNC(re.FECHA_INICIO)
+                                        AND TRUNC(re.FECHA_FIN) THEN 1 ELSE 0 END
+    FROM RESERVA_PARTICIPANTE rp
+    JOIN RESERVA_EVENTO re ON rp.ID_RESERVA = re.ID_RESERVA
+    WHERE rp.NRO_DOCUMENTO_USUARIO = :nro_documento
+    ORDER BY re.FECHA_INICIO DESC
+""", caliente=True)
+
+_SQL_INSERT_SYNC_REGISTRO = sentencias.registrar("insertar_sync_registro", """
+    INSERT INTO SYNC_REGISTRO (ID_CLIENTE, TIPO, NRO_DOCUMENTO)
+    VALUES (:id_cliente, :tipo, :nro_doc)
+""", caliente=True)
+
+_SQL_BORRAR_SYNC_REGISTRO = sentencias.registrar(
+    "borrar_sync_registro", "DELETE FROM SYNC_REGISTRO WHERE ID_CLIENTE = :id_cliente")
+
+# ORA-00001: violación de llave única -> el id_cliente ya fue sincronizado
+_ORA_UNICO = 1
+
+
+def _leer_registros_sync():
+    """
+    Lee el lote enviado por el dispositivo:
+      - JSON: {"arboles": [...], "plantas": [...]}
+      - multipart: archivo=<csv con encabezados> y tipo=arbol|planta
+    Devuelve {"arbol": [dict, ...], "planta": [dict, ...]}.
+    """
+    if 'archivo' in request.files:
+        tipo = (request.form.get('tipo') or '').lower()
+        if tipo not in _CAMPOS_SYNC:
+            raise ValueError("tipo debe ser 'arbol' o 'planta'")
+        texto = io.TextIOWrapper(request.files['archivo'].stream, encoding='utf-8-sig')
+        filas = [
+            {(k or '').strip().lower(): (v.strip() if isinstance(v, str) else v) for k, v in fila.items()}
+            for fila in csv.DictReader(texto)
+        ]
+        lotes = {"arbol": [], "planta": []}
+        lotes[tipo] = filas
+        return lotes
+
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        raise ValueError("Se esperaba JSON con 'arboles' y/o 'plantas', o un archivo CSV")
+    arboles = data.get('arboles') or []
+    plantas = data.get('plantas') or []
+    if not isinstance(arboles, list) or not isinstance(plantas, list):
+        raise ValueError("'arboles' y 'plantas' deben ser listas")
+    return {"arbol": arboles, "planta": plantas}
+
+
+def _insertar_lote_sync(cursor, tipo, registros, nro_documento, errores, duplicados):
+    """
+    Inserta un lote de un tipo con executemany. Primero reclama cada id_cliente
+    en SYNC_REGISTRO (los repetidos fallan por PK y se marcan como duplicados),
+    luego inserta los especímenes y libera los ids cuyo INSERT falló.
+    Devuelve la cantidad insertada.
+    """
+    if not registros:
+        return 0
+
+    sentencias.ejecutar_muchos(cursor, _SQL_INSERT_SYNC_REGISTRO, [
+        {"id_cliente": r["id_cliente"], "tipo": tipo, "nro_doc": nro_documento}
+        for _, r in registros
+    ], batcherrors=True)
+
+    rechazados = set()
+    for err in cursor.getbatcherrors():
+        indice, r = registros[err.offset]
+        rechazados.add(err.offset)
+        if err.code == _ORA_UNICO:
+            duplicados.append(r["id_cliente"])
+        else:
+            errores.append({"tipo": tipo, "indice": indice, "id_cliente": r["id_cliente"], "error": err.message})
+
+    nuevos = [reg for k, reg in enumerate(registros) if k not in rechazados]
+    if not nuevos:
+        return 0
+
+    if tipo == "arbol":
+        sql = _SQL_INSERT_ARBOL
+        filas = [{
+            "altura": r["altura"],
+            "dano": r["dano"],
+            "diametro": r["diametro"],
+            "formafuste": r["formafuste"],
+            "observaciones": r.get("observaciones"),
+            "nsubparcela": r["nsubparcela"],
+            "nro_doc": nro_documento,
+            "id_reserva": r["id_reserva"],
+        } for _, r in nuevos]
+    else:
+        sql = _SQL_INSERT_PLANTA
+        filas = [{
+            "tamano": r["tamano"],
+            "nombre_comun": r["nombre_comun"],
+            "observaciones": r.get("observaciones"),
+            "nsubparcela": r["nsubparcela"],
+            "id_reserva": r["id_reserva"],
+            "nro_doc": nro_documento,
+            "id_brigada": 1,  # Temporal (igual que registrar_planta)
+        } for _, r in nuevos]
+
+    sentencias.ejecutar_muchos(cursor, sql, filas, batcherrors=True)
+
+    fallidos = []
+    offsets_fallidos = set()
+    for err in cursor.getbatcherrors():
+        indice, r = nuevos[err.offset]
+        offsets_fallidos.add(err.offset)
+        fallidos.append({"id_cliente": r["id_cliente"]})
+        errores.append({"tipo": tipo, "indice": indice, "id_cliente": r["id_cliente"], "error": err.message})
+
+    sumar_a_resumen(cursor, tipo, [f for k, f in enumerate(filas) if k not in offsets_fallidos])
+
+    # Un reintento posterior de estos registros no debe verse como duplicado
+    if fallidos:
+        sentencias.ejecutar_muchos(cursor, _SQL_BORRAR_SYNC_REGISTRO, fallidos)
+
+    return len(nuevos) - len(fallidos)
+
+
+@app.route('/api/sync', methods=['POST'])
+def api_sync():
+    """
+    Sincroniza árboles y plantas capturados sin señal.
+    Cada registro trae "id_cliente" (generado en el dispositivo) y opcionalmente
+    "id_reserva"; si no viene se usa la reserva vigente del usuario.
+    Todo entra en una transacción; reenviar el mismo lote no crea duplicados.
+    Respuesta: {"insertados": {"arboles": n, "plantas": m}, "duplicados": [...], "errores": [...]}
+    """
+    if 'usuario' not in session:
+        return jsonify({"error": "No autenticado"}), 401
+
+    nro_documento = session['usuario']
+
+    try:
+        lotes = _leer_registros_sync()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": str(e)}), 400
+
+    total = sum(len(v) for v in lotes.values())
+    if total == 0:
+        return jsonify({"error": "No se enviaron registros"}), 400
+    if total > SYNC_MAX_REGISTROS:
+        return jsonify({"error": f"Máximo {SYNC_MAX_REGISTROS} registros por envío"}), 413
+
+    errores = []
+    duplicados = []
+    insertados = {"arboles": 0, "plantas": 0}
+
+    try:
+        with pool.acquire() as connection:
+            with connection.cursor() as cursor:
+                # Reservas del usuario, una sola vez para todo el lote
+                sentencias.ejecutar(cursor, _SQL_RESERVAS_USUARIO, {'nro_documento': nro_documento})
+                reservas = cursor.fetchall()
+                permitidas = {int(r[0]) for r in reservas}
+                vigente = next((int(r[0]) for r in reservas if r[1] == 1), None)
+
+                validos = {"arbol": [], "planta": []}
+                vistos = set()
+                for tipo, registros in lotes.items():
+                    for indice, r in enumerate(registros):
+                        if not isinstance(r, dict):
+                            errores.append({"tipo": tipo, "indice": indice, "error": "Registro inválido"})
+                            continue
+                        faltan = [c for c in _CAMPOS_SYNC[tipo] if r.get(c) in (None, "")]
+                        if faltan:
+                            errores.append({"tipo": tipo, "indice": indice, "id_cliente": r.get("id_cliente"),
+                                            "error": f"Faltan campos: {', '.join(faltan)}"})
+                            continue
+
+                        r = dict(r, id_cliente=str(r["id_cliente"]))
+                        if r["id_cliente"] in vistos:
+                            duplicados.append(r["id_cliente"])
+                            continue
+
+                        try:
+                            id_reserva = int(r["id_reserva"]) if r.get("id_reserva") not in (None, "") else vigente
+                        except (TypeError, ValueError):
+                            id_reserva = None
+                        if id_reserva is None or id_reserva not in permitidas:
+                            errores.append({"tipo": tipo, "indice": indice, "id_cliente": r["id_cliente"],
+                                            "error": "El usuario no tiene esa reserva (o ninguna vigente)"})
+                            continue
+
+                        vistos.add(r["id_cliente"])
+                        r["id_reserva"] = id_reserva
+                        validos[tipo].append((indice, r))
+
+                insertados["arboles"] = _insertar_lote_sync(
+                    cursor, "arbol", validos["arbol"], nro_documento, errores, duplicados)
+                insertados["plantas"] = _insertar_lote_sync(
+                    cursor, "planta", validos["planta"], nro_documento, errores, duplicados)
+
+                connection.commit()
+
+        if insertados["arboles"]:
+            invalidar_estadisticas(*{r["id_reserva"] for _, r in validos["arbol"]})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    log_action(nro_documento, "sync", {
+        "arboles": insertados["arboles"],
+        "plantas": insertados["plantas"],
+        "duplicados": len(duplicados),
+        "errores": len(errores)
+    })
+
+    return jsonify({
+        "insertados": insertados,
+        "duplicados": duplicados,
+        "errores": errores
+    }), 200
+
+
+# ---------------------------
+# RESÚMENES MATERIALIZADOS (tablero de reportes)
+# ---------------------------
+# Cada inserción suma su fila a RESUMEN_ARBOL / RESUMEN_PLANTA con un MERGE en
+# la misma transacción; actualizar_resumen() recalcula los días recientes desde
+# las tablas crudas para corregir lo que se haya escapado. DDL en sql/resumen.sql.
+RESUMEN_INTERVALO = int(os.getenv('RESUMEN_INTERVALO', '0'))     # s; 0 = sin hilo periódico
+RESUMEN_SOLAPE_DIAS = int(os.getenv('RESUMEN_SOLAPE_DIAS', '1'))
+
+# FECHA_REGISTRO puede ser NULL (registros viejos). Esas filas van a un día
+# propio, anterior a cualquier registro: el resumen, el recálculo, la carga de
+# sql/resumen.sql y el orden de los reportes usan las mismas expresiones, así
+# que fuente=resumen y fuente=crudo cuentan las mismas filas.
+_FECHA_NULA = datetime(1900, 1, 1)
+_SQL_FECHA_NULA = "DATE '1900-01-01'"
+_SQL_FECHA_REGISTRO = f"NVL(FECHA_REGISTRO, {_SQL_FECHA_NULA})"
+_SQL_DIA_REGISTRO = f"NVL(TRUNC(FECHA_REGISTRO), {_SQL_FECHA_NULA})"
+
+
+def _sql_clase_tamano(expr):
+    """Clase de tamaño (cm) con la que se agrupan las plantas."""
+    return f"""CASE WHEN {expr} IS NULL THEN 'SIN DATO'
+                WHEN {expr} < 10 THEN '<10'
+                WHEN {expr} < 50 THEN '10-50'
+                WHEN {expr} < 100 THEN '50-100'
+                WHEN {expr} < 200 THEN '100-200'
+                ELSE '>=200' END"""
+
+
+def _sql_acumular(prefijo, valor):
+    """SET del MERGE que suma una observación a N_/SUMA_/SUMA_2/MIN_/MAX_ de una medida."""
+    return f"""
+        r.N_{prefijo} = r.N_{prefijo} + NVL2({valor}, 1, 0),
+        r.SUMA_{prefijo} = r.SUMA_{prefijo} + NVL({valor}, 0),
+        r.SUMA_{prefijo}2 = r.SUMA_{prefijo}2 + NVL({valor} * {valor}, 0),
+        r.MIN_{prefijo} = LEAST(NVL(r.MIN_{prefijo}, {valor}), NVL({valor}, r.MIN_{prefijo})),
+        r.MAX_{prefijo} = GREATEST(NVL(r.MAX_{prefijo}, {valor}), NVL({valor}, r.MAX_{prefijo}))"""
+
+
+def _sql_inicial(valor):
+    """Valores N_/SUMA_/SUMA_2/MIN_/MAX_ de una fila nueva del resumen."""
+    return f"NVL2({valor}, 1, 0), NVL({valor}, 0), NVL({valor} * {valor}, 0), {valor}, {valor}"
+
+
+_SQL_MERGE_RESUMEN_ARBOL = sentencias.registrar("sumar_resumen_arbol", f"""
+    MERGE INTO RESUMEN_ARBOL r
+    USING (
+        SELECT NVL(:id_reserva, 0) AS ID_RESERVA,
+               NVL(TO_CHAR(:nsubparcela), 'SIN DATO') AS NSUBPARCELA,
+               TRUNC(SYSDATE) AS DIA,
+               NVL(:dano, 'SIN DATO') AS DANO,
+               NVL(:formafuste, 'SIN DATO') AS FORMAFUSTE,
+               TO_NUMBER(:altura) AS ALTURA,
+               TO_NUMBER(:diametro) AS DIAMETRO
+        FROM DUAL
+    ) s
+    ON (r.ID_RESERVA = s.ID_RESERVA AND r.NSUBPARCELA = s.NSUBPARCELA AND r.DIA = s.DIA
+        AND r.DANO = s.DANO AND r.FORMAFUSTE = s.FORMAFUSTE)
+    WHEN MATCHED THEN UPDATE SET
+        r.N = r.N + 1,{_sql_acumular("ALTURA", "s.ALTURA")},{_sql_acumular("DIAMETRO", "s.DIAMETRO")}
+    WHEN NOT MATCHED THEN INSERT (
+        ID_RESERVA, NSUBPARCELA, DIA, DANO, FORMAFUSTE, N,
+        N_ALTURA, SUMA_ALTURA, SUMA_ALTURA2, MIN_ALTURA, MAX_ALTURA,
+        N_DIAMETRO, SUMA_DIAMETRO, SUMA_DIAMETRO2, MIN_DIAMETRO, MAX_DIAMETRO
+    ) VALUES (
+        s.ID_RESERVA, s.NSUBPARCELA, s.DIA, s.DANO, s.FORMAFUSTE, 1,
+        {_sql_inicial("s.ALTURA")},
+        {_sql_inicial("s.DIAMETRO")}
+    )
+""", caliente=True)
+
+_SQL_MERGE_RESUMEN_PLANTA = sentencias.registrar("sumar_resumen_planta", f"""
+    MERGE INTO RESUMEN_PLANTA r
+    USING (
+        SELECT NVL(:id_reserva, 0) AS ID_RESERVA,
+               NVL(TO_CHAR(:nsubparcela), 'SIN DATO') AS NSUBPARCELA,
+               TRUNC(SYSDATE) AS DIA,
+               NVL(:id_brigada, 0) AS ID_BRIGADA,
+               NVL(:nombre_comun, 'SIN DATO') AS NOMBRE_COMUN,
+               {_sql_clase_tamano("TO_NUMBER(:tamano)")} AS CLASE_TAMANO,
+               TO_NUMBER(:tamano) AS TAMANO
+        FROM DUAL
+    ) s
+    ON (r.ID_RESERVA = s.ID_RESERVA AND r.NSUBPARCELA = s.NSUBPARCELA AND r.DIA = s.DIA
+        AND r.ID_BRIGADA = s.ID_BRIGADA AND r.NOMBRE_COMUN = s.NOMBRE_COMUN
+        AND r.CLASE_TAMANO = s.CLASE_TAMANO)
+    WHEN MATCHED THEN UPDATE SET
+        r.N = r.N + 1,{_sql_acumular("TAMANO", "s.TAMANO")}
+    WHEN NOT MATCHED THEN INSERT (
+        ID_RESERVA, NSUBPARCELA, DIA, ID_BRIGADA, NOMBRE_COMUN, CLASE_TAMANO, N,
+        N_TAMANO, SUMA_TAMANO, SUMA_TAMANO2, MIN_TAMANO, MAX_TAMANO
+    ) VALUES (
+        s.ID_RESERVA, s.NSUBPARCELA, s.DIA, s.ID_BRIGADA, s.NOMBRE_COMUN, s.CLASE_TAMANO, 1,
+        {_sql_inicial("s.TAMANO")}
+    )
+""", caliente=True)
+
+# Recálculo desde las tablas crudas (DELETE + INSERT ... SELECT de los días >= :desde;
+# con :desde = _FECHA_NULA entra también el día de las fechas NULL).
+# Cada tabla se bloquea IN EXCLUSIVE MODE antes de borrar: los MERGE de
+# sumar_a_resumen esperan al commit del recálculo en vez de sumar sobre filas
+# que el INSERT ... SELECT vuelve a escribir (y el recálculo espera a que
+# terminen las transacciones que ya sumaron, así su fila cruda ya es visible).
+_SQL_RECALCULO = {
+    "ARBOL": (
+        sentencias.registrar("borrar_resumen[ARBOL]", "DELETE FROM RESUMEN_ARBOL WHERE DIA >= :desde"),
+        sentencias.registrar("recalcular_resumen[ARBOL]", f"""
+        INSERT INTO RESUMEN_ARBOL (
+            ID_RESERVA, NSUBPARCELA, DIA, DANO, FORMAFUSTE, N,
+            N_ALTURA, SUMA_ALTURA, SUMA_ALTURA2, MIN_ALTURA, MAX_ALTURA,
+            N_DIAMETRO, SUMA_DIAMETRO, SUMA_DIAMETRO2, MIN_DIAMETRO, MAX_DIAMETRO
+        )
+        SELECT NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), {_SQL_DIA_REGISTRO},
+               NVL(DANO, 'SIN DATO'), NVL(FORMAFUSTE, 'SIN DATO'), COUNT(*),
+               COUNT(ALTURA), NVL(SUM(ALTURA), 0), NVL(SUM(ALTURA * ALTURA), 0), MIN(ALTURA), MAX(ALTURA),
+               COUNT(DIAMETRO), NVL(SUM(DIAMETRO), 0), NVL(SUM(DIAMETRO * DIAMETRO), 0), MIN(DIAMETRO), MAX(DIAMETRO)
+        FROM ARBOL
+        WHERE {_SQL_FECHA_REGISTRO} >= :desde
+        GROUP BY NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), {_SQL_DIA_REGISTRO},
+                 NVL(DANO, 'SIN DATO'), NVL(FORMAFUSTE, 'SIN DATO')
+        """),
+    ),
+    "PLANTA": (
+        sentencias.registrar("borrar_resumen[PLANTA]", "DELETE FROM RESUMEN_PLANTA WHERE DIA >= :desde"),
+        sentencias.registrar("recalcular_resumen[PLANTA]", f"""
+        INSERT INTO RESUMEN_PLANTA (
+            ID_RESERVA, NSUBPARCELA, DIA, ID_BRIGADA, NOMBRE_COMUN, CLASE_TAMANO, N,
+            N_TAMANO, SUMA_TAMANO, SUMA_TAMANO2, MIN_TAMANO, MAX_TAMANO
+        )
+        SELECT NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), {_SQL_DIA_REGISTRO},
+               NVL(ID_BRIGADA, 0), NVL(NOMBRE_COMUN, 'SIN DATO'), {_sql_clase_tamano("TAMANO")}, COUNT(*),
+               COUNT(TAMANO), NVL(SUM(TAMANO), 0), NVL(SUM(TAMANO * TAMANO), 0), MIN(TAMANO), MAX(TAMANO)
+        FROM PLANTA
+        WHERE {_SQL_FECHA_REGISTRO} >= :desde
+        GROUP BY NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), {_SQL_DIA_REGISTRO},
+                 NVL(ID_BRIGADA, 0), NVL(NOMBRE_COMUN, 'SIN DATO'), {_sql_clase_tamano("TAMANO")}
+        """),
+    ),
+}
+
+_SQL_BLOQUEO_RESUMEN = {
+    tabla: sentencias.registrar(f"bloquear_resumen[{tabla}]", f"LOCK TABLE RESUMEN_{tabla} IN EXCLUSIVE MODE")
+    for tabla in _SQL_RECALCULO
+}
+
+_SQL_SYSDATE = sentencias.registrar("sysdate", "SELECT SYSDATE FROM DUAL")
+
+_SQL_MARCA_RESUMEN = sentencias.registrar(
+    "marca_resumen", "SELECT ULTIMA_FECHA FROM RESUMEN_MARCA WHERE TABLA = :t")
+
+_SQL_GUARDAR_MARCA_RESUMEN = sentencias.registrar("guardar_marca_resumen", """
+    MERGE INTO RESUMEN_MARCA m
+    USING (SELECT :t AS TABLA, :f AS ULTIMA_FECHA FROM DUAL) s
+    ON (m.TABLA = s.TABLA)
+    WHEN MATCHED THEN UPDATE SET m.ULTIMA_FECHA = s.ULTIMA_FECHA
+    WHEN NOT MATCHED THEN INSERT (TABLA, ULTIMA_FECHA) VALUES (s.TABLA, s.ULTIMA_FECHA)
+""")
+
+_CAMPOS_RESUMEN = {
+    "arbol": (_SQL_MERGE_RESUMEN_ARBOL, ("id_reserva", "nsubparcela", "dano", "formafuste", "altura", "diametro")),
+    "planta": (_SQL_MERGE_RESUMEN_PLANTA, ("id_reserva", "nsubparcela", "id_brigada", "nombre_comun", "tamano")),
+}
+
+
+# Fallos de sumar_a_resumen por tipo: mientras crezcan, el resumen se aleja de
+# las tablas crudas hasta el siguiente recálculo (ver /api/metricas/resumen)
+_fallos_resumen = {"arbol": 0, "planta": 0, "filas": 0, "ultimo_error": None, "ultimo_en": None}
+_fallos_resumen_lock = threading.Lock()
+
+
+def sumar_a_resumen(cursor, tipo, filas):
+    """
+    Suma las filas recién insertadas (mismos binds del INSERT) al resumen, en la
+    transacción del llamador. Con batcherrors una fila que falla no deshace las
+    demás: solo las fallidas se cuentan en _fallos_resumen, el INSERT sigue y el
+    recálculo periódico corrige el resumen. Dos MERGE concurrentes que no
+    encuentran la misma llave intentan insertarla y el segundo da ORA-00001
+    (DUP_VAL_ON_INDEX): esas filas se repiten una vez y ya suman sobre la fila.
+    """
+    if not filas:
+        return
+    sql, campos = _CAMPOS_RESUMEN[tipo]
+    binds = [{c: f.get(c) for c in campos} for f in filas]
+    try:
+        sentencias.ejecutar_muchos(cursor, sql, binds, batcherrors=True)
+        errores = cursor.getbatcherrors()
+        repetir = [binds[err.offset] for err in errores if err.code == _ORA_UNICO]
+        errores = [err for err in errores if err.code != _ORA_UNICO]
+        if repetir:
+            sentencias.ejecutar_muchos(cursor, sql, repetir, batcherrors=True)
+            errores += cursor.getbatcherrors()
+        fallidas = len(errores)
+        detalle = errores[0].message if errores else None
+    except Exception as e:
+        # Falló la llamada entera (p. ej. se cayó la conexión), no una fila
+        fallidas, detalle = len(binds), str(e)
+
+    if fallidas:
+        with _fallos_resumen_lock:
+            _fallos_resumen[tipo] += 1
+            _fallos_resumen["filas"] += fallidas
+            _fallos_resumen["ultimo_error"] = f"{tipo}: {detalle}"
+            _fallos_resumen["ultimo_en"] = datetime.now().isoformat(timespec="seconds")
+        print(f"⚠ No se pudo actualizar el resumen de {tipo} ({fallidas} de {len(binds)} filas):", detalle)
+
+
+def actualizar_resumen(completo=False):
+    """
+    Recalcula RESUMEN_ARBOL y RESUMEN_PLANTA desde la última marca menos
+    RESUMEN_SOLAPE_DIAS (o desde cero con completo=True). Idempotente.
+    Cada tabla va en su propia transacción, con la tabla bloqueada hasta el commit.
+    Devuelve {"ARBOL": <desde>, "PLANTA": <desde>}.
+    """
+    hechos = {}
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            sentencias.ejecutar(cursor, _SQL_SYSDATE)
+            inicio = cursor.fetchone()[0]
+
+            for tabla, (borrar, insertar) in _SQL_RECALCULO.items():
+                desde = datetime(1900, 1, 1)
+                if not completo:
+                    sentencias.ejecutar(cursor, _SQL_MARCA_RESUMEN, {"t": tabla})
+                    fila = cursor.fetchone()
+                    if fila:
+                        desde = datetime.combine(fila[0].date(), datetime.min.time()) \
+                            - timedelta(days=RESUMEN_SOLAPE_DIAS)
+
+                sentencias.ejecutar(cursor, _SQL_BLOQUEO_RESUMEN[tabla])
+                sentencias.ejecutar(cursor, borrar, {"desde": desde})
+                sentencias.ejecutar(cursor, insertar, {"desde": desde})
+                sentencias.ejecutar(cursor, _SQL_GUARDAR_MARCA_RESUMEN, {"t": tabla, "f": inicio})
+                connection.commit()
+                hechos[tabla] = desde
+    return hechos
+
+
+@app.cli.command("actualizar-resumen")
+@click.option("--completo", is_flag=True, help="Recalcular todo el histórico")
+def cli_actualizar_resumen(completo):
+    """Recalcula los resúmenes del tablero (para cron: flask --app app actualizar-resumen)."""
+    for tabla, desde in actualizar_resumen(completo).items():
+        click.echo(f"✔ RESUMEN_{tabla} recalculado desde {desde:%Y-%m-%d}")
+
+
+_job_resumen = {"pid": None}
+
+
+def _ciclo_resumen():
+    while True:
+        time.sleep(RESUMEN_INTERVALO)
+        try:
+            actualizar_resumen()
+        except Exception as e:
+            print("❌ Error recalculando resúmenes:", e)
+
+
+@app.before_request
+def _iniciar_job_resumen():
+    # Un hilo por proceso (se compara el pid para que cada worker tenga el suyo)
+    if RESUMEN_INTERVALO > 0 and _job_resumen["pid"] != os.getpid():
+        _job_resumen["pid"] = os.getpid()
+        threading.Thread(target=_ciclo_resumen, name="resumen-job", daemon=True).start()
+
+
+# ---------------------------
+# REPORTES (streaming + paginación por llave)
+# ---------------------------
+REPORTES_ARRAYSIZE = int(os.getenv('REPORTES_ARRAYSIZE', '1000'))
+REPORTES_LIMITE_MAX = int(os.getenv('REPORTES_LIMITE_MAX', '5000'))
+
+_COLUMNAS_ARBOL = [
+    "ID_ARBOL",
+    "NOMBRE_CIENTIFICO",
+    "NOMBRE_COMUN",
+    "ALTURA",
+    "DIAMETRO",
+    "DANO",
+    "FORMAFUSTE",
+    "OBSERVACIONES",
+    "NSUBPARCELA",
+    "NRO_DOCUMENTO",
+    "ID_RESERVA",
+    "FECHA_REGISTRO",
+]
+
+
+_COLUMNAS_PLANTA = [
+    "ID_PLANTA",
+    "NOMBRE_COMUN",
+    "TAMANO",
+    "OBSERVACIONES",
+    "NSUBPARCELA",
+    "ID_RESERVA",
+    "NRO_DOCUMENTO_USUARIO",
+    "ID_BRIGADA",
+    "FECHA_REGISTRO",
+]
+
+# tipo -> (tabla, columna id para el keyset, columnas del reporte)
+_TIPOS_REPORTE = {
+    "Arbol": ("arbol", "ID_ARBOL", _COLUMNAS_ARBOL),
+    "Planta": ("planta", "ID_PLANTA", _COLUMNAS_PLANTA),
+}
+
+
+def _codificar_cursor(fecha, id_fila, tipo=None):
+    """
+    Token opaco con la última llave (FECHA_REGISTRO, ID) enviada. Con tipo
+    (ndjson de varios tipos) dice además en qué tabla va; sin llave, que ese
+    tipo se empieza desde el principio.
+    """
+    partes = [tipo] if tipo else []
+    partes += ["" if fecha is None else fecha.isoformat(), "" if id_fila is None else str(id_fila)]
+    return base64.urlsafe_b64encode("|".join(partes).encode()).decode()
+
+
+def _decodificar_cursor(token):
+    """
+    Inverso de _codificar_cursor: (tipo o None, (fecha, id) o None). Lanza
+    ValueError si el token no es válido.
+    """
+    try:
+        partes = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+        tipo = partes.pop(0) if len(partes) == 3 else None
+        fecha, id_fila = partes
+        if tipo is not None and tipo not in _TIPOS_REPORTE:
+            raise ValueError(tipo)
+        if not id_fila:
+            if tipo is None:
+                raise ValueError(token)
+            return tipo, None
+        return tipo, (datetime.fromisoformat(fecha) if fecha else _FECHA_NULA, int(id_fila))
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def _filtro_reporte(fecha_inicio, fecha_fin, id_reserva=None, id_brigada=None, columna_fecha="FECHA_REGISTRO"):
+    """
+    Condiciones y binds de los filtros que comparten los reportes (fechas,
+    reserva, brigada). Las fechas son un intervalo semiabierto
+    [ini, fin + 1 día): fechaFin incluye el día completo, tanto sobre
+    FECHA_REGISTRO (con hora) como sobre DIA de los resúmenes. En los
+    resúmenes el día _FECHA_NULA guarda las filas sin FECHA_REGISTRO: con
+    cualquier filtro de fecha se deja fuera, igual que en las tablas crudas,
+    donde la comparación con NULL nunca se cumple.
+    """
+    binds = {"ini": fecha_inicio or None, "fin": fecha_fin or None}
+    condiciones = [
+        f"(:ini IS NULL OR {columna_fecha} >= TO_DATE(:ini, 'YYYY-MM-DD'))",
+        f"(:fin IS NULL OR {columna_fecha} < TO_DATE(:fin, 'YYYY-MM-DD') + 1)",
+    ]
+    if columna_fecha == "DIA":
+        condiciones.append(f"((:ini IS NULL AND :fin IS NULL) OR DIA > {_SQL_FECHA_NULA})")
+    if id_reserva is not None:
+        binds["reserva"] = id_reserva
+        condiciones.append("ID_RESERVA = :reserva")
+    if id_brigada is not None:
+        binds["brigada"] = id_brigada
+        condiciones.append("ID_BRIGADA = :brigada")
+    return condiciones, binds
+
+
+def _sentencia_reporte(nombre, texto, binds):
+    """
+    Registra una consulta armada según los filtros. El texto sólo cambia con
+    los filtros presentes, que son los binds: una variante por juego de binds.
+    """
+    return sentencias.registrar(f"{nombre}[{','.join(sorted(binds))}]", texto)
+
+
+def _consulta_reporte(tipo, fecha_inicio, fecha_fin, llave=None, limite=None,
+                      id_reserva=None, id_brigada=None):
+    """
+    Arma la consulta del tipo (ARBOL o PLANTA) ordenada por (FECHA_REGISTRO, ID)
+    descendente, con las fechas NULL al final. Con llave (la del cursor)
+    continúa después de la última fila entregada (keyset), así cada página
+    cuesta lo mismo sin importar qué tan atrás esté.
+    """
+    tabla, columna_id, columnas = _TIPOS_REPORTE[tipo]
+    condiciones, binds = _filtro_reporte(fecha_inicio, fecha_fin, id_reserva, id_brigada)
+    # Las fechas NULL van al final y el cursor las recorre como las demás;
+    # sql/indices.sql indexa la expresión.
+    fecha = _SQL_FECHA_REGISTRO
+
+    if llave:
+        binds["cfecha"], binds["cid"] = llave
+        condiciones.append(f"({fecha} < :cfecha OR ({fecha} = :cfecha AND {columna_id} < :cid))")
+
+    query = f"""
+        SELECT {', '.join(columnas)}
+        FROM {tabla}
+        WHERE {' AND '.join(condiciones)}
+        ORDER BY {fecha} DESC, {columna_id} DESC
+    """
+    if limite:
+        # Se pide una fila extra para saber si hay página siguiente
+        query += " FETCH FIRST :lim ROWS ONLY"
+        binds["lim"] = limite + 1
+
+    return _sentencia_reporte(f"reporte_{tabla}", query, binds), binds
+
+
+def _consulta_arboles(fecha_inicio, fecha_fin, llave=None, limite=None, id_reserva=None):
+    return _consulta_reporte("Arbol", fecha_inicio, fecha_fin, llave, limite, id_reserva)
+
+
+def _stream_reporte_ndjson(tipos, fecha_inicio, fecha_fin, cursor, limite, id_reserva, id_brigada):
+    """
+    Genera una línea JSON por fila a medida que el cursor entrega lotes.
+    Con varios tipos se recorren uno tras otro en la misma conexión y cada
+    línea lleva "TIPO". cursor es (tipo, llave) de _decodificar_cursor: los
+    tipos anteriores al del cursor ya se entregaron y la llave sólo aplica al suyo.
+    Con limite se envían a lo sumo limite filas entre todos los tipos y, si
+    quedan más, una última línea {"siguiente": <token>}.
+    """
+    varios = len(tipos) > 1
+    tipo_cursor, llave = cursor
+    if tipo_cursor:
+        tipos = tipos[tipos.index(tipo_cursor):]
+    restantes = limite
+    siguiente = None
+
+    with pool.acquire() as conn:
+        for n, tipo in enumerate(tipos):
+            if limite and not restantes:
+                # Página llena justo al terminar un tipo: la siguiente empieza en éste
+                siguiente = _codificar_cursor(None, None, tipo)
+                break
+            _, columna_id, columnas = _TIPOS_REPORTE[tipo]
+            query, binds = _consulta_reporte(tipo, fecha_inicio, fecha_fin, llave if n == 0 else None,
+                                             restantes, id_reserva, id_brigada)
+            extra = {"TIPO": tipo} if varios else {}
+            ultima, sobra = None, False
+
+            with conn.cursor() as cur:
+                cur.arraysize = REPORTES_ARRAYSIZE
+                cur.prefetchrows = REPORTES_ARRAYSIZE
+                sentencias.ejecutar(cur, query, binds)
+
+                while not sobra:
+                    filas = cur.fetchmany()
+                    if not filas:
+                        break
+                    if limite:
+                        # FETCH FIRST trae una fila extra: si llega, hay página siguiente
+                        sobra = len(filas) > restantes
+                        filas = filas[:restantes]
+                        restantes -= len(filas)
+                    if filas:
+                        ultima = dict(zip(columnas, filas[-1]))
+                        yield "".join(
+                            app.json.dumps({**extra, **dict(zip(columnas, fila))}) + "\n"
+                            for fila in filas
+                        )
+
+            if sobra:
+                siguiente = _codificar_cursor(ultima["FECHA_REGISTRO"], ultima[columna_id],
+                                              tipo if varios else None)
+                break
+
+    if siguiente:
+        yield app.json.dumps({"siguiente": siguiente}) + "\n"
+
+
+def _parametros_reporte():
+    """
+    Lee tipo (uno o varios separados por coma: "Arbol,Planta"), reserva y brigada.
+    Devuelve (tipos, id_reserva, id_brigada); lanza ValueError si no son válidos.
+    """
+    tipos = list(dict.fromkeys(t.strip() for t in (request.args.get("tipo") or "").split(",") if t.strip()))
+    if not tipos or any(t not in _TIPOS_REPORTE for t in tipos):
+        raise ValueError("Tipo de reporte no soportado")
+
+    id_reserva = request.args.get("reserva", type=int)
+    id_brigada = request.args.get("brigada", type=int)
+    if id_brigada is not None and "Arbol" in tipos:
+        # ARBOL no guarda la brigada; los árboles se filtran por reserva
+        raise ValueError("El filtro brigada sólo aplica al reporte de plantas")
+    return tipos, id_reserva, id_brigada
+
+
+@app.route("/api/reportes", methods=["GET"])
+def api_reportes():
+    """
+    Reporte de árboles o plantas. Parámetros:
+      tipo=Arbol|Planta (o "Arbol,Planta" con formato=ndjson), fechaInicio, fechaFin (YYYY-MM-DD)
+      reserva=<id>, brigada=<id> (sólo Planta)
+      limite=<n>    -> página de n filas + "siguiente" (token para la próxima)
+      cursor=<tok>  -> continúa después del token recibido
+      formato=ndjson -> respuesta en streaming, una fila por línea; con limite
+                        la última línea es {"siguiente": <tok>} si quedan filas
+    Sin limite ni formato se comporta como antes: {"tabla": [...]}.
+    """
+    fecha_inicio = request.args.get("fechaInicio")
+    fecha_fin = request.args.get("fechaFin")
+    cursor_token = request.args.get("cursor")
+    formato = request.args.get("formato")
+
+    try:
+        tipos, id_reserva, id_brigada = _parametros_reporte()
+        limite = request.args.get("limite", type=int)
+        if limite is not None and not (0 < limite <= REPORTES_LIMITE_MAX):
+            return jsonify({"error": f"limite debe estar entre 1 y {REPORTES_LIMITE_MAX}"}), 400
+        cursor = _decodificar_cursor(cursor_token) if cursor_token else (None, None)
+        if cursor[0] is not None and cursor[0] not in tipos:
+            raise ValueError("Cursor inválido")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if formato == "ndjson":
+        return Response(
+            stream_with_context(_stream_reporte_ndjson(
+                tipos, fecha_inicio, fecha_fin, cursor, limite, id_reserva, id_brigada)),
+            mimetype="application/x-ndjson"
+        )
+
+    if len(tipos) > 1:
+        return jsonify({"error": "Para varios tipos use formato=ndjson"}), 400
+
+    tipo = tipos[0]
+    _, columna_id, columnas = _TIPOS_REPORTE[tipo]
+    query, binds = _consulta_reporte(tipo, fecha_inicio, fecha_fin, cursor[1], limite,
+                                     id_reserva, id_brigada)
+
+    with pool.acquire() as conn:
+        with conn.cursor() as cur:
+            tamano = (limite + 1) if limite else REPORTES_ARRAYSIZE
+            cur.arraysize = tamano
+            cur.prefetchrows = tamano
+            sentencias.ejecutar(cur, query, binds)
+            rows = cur.fetchall()
+
+    siguiente = None
+    if limite and len(rows) > limite:
+        rows = rows[:limite]
+        ultima = dict(zip(columnas, rows[-1]))
+        siguiente = _codificar_cursor(ultima["FECHA_REGISTRO"], ultima[columna_id])
+
+    data = [dict(zip(columnas, fila)) for fila in rows]
+
+    if limite:
+        return jsonify({"tabla": data, "siguiente": siguiente})
+
+    return jsonify({
+        "tabla": data
+    })
+
+
+
+def _estadistica(promedio, minimo, maximo, desviacion):
+    """Convierte los agregados de Oracle (Decimal/None) a números JSON."""
+    return {
+        "promedio": float(promedio) if promedio is not None else None,
+        "minimo": float(minimo) if minimo is not None else None,
+        "maximo": float(maximo) if maximo is not None else None,
+        "desviacion": float(desviacion) if desviacion is not None else None,
+    }
+
+
+def _estadistica_sumas(n, suma, suma2, minimo, maximo):
+    """Promedio y desviación estándar muestral (como STDDEV) a partir de sumas acumuladas."""
+    if not n:
+        return _estadistica(None, None, None, None)
+    n, suma, suma2 = float(n), float(suma), float(suma2)
+    promedio = suma / n
+    varianza = max(0.0, (suma2 - suma * suma / n) / (n - 1)) if n > 1 else 0.0
+    return _estadistica(promedio, minimo, maximo, math.sqrt(varianza))
+
+
+def _filas_desglose(cur, medidas):
+    """Filas del ROLLUP (ID_RESERVA, NSUBPARCELA): conteo y el promedio de cada medida."""
+    filas = []
+    for g_res, g_sub, id_reserva, nsub, n, *promedios in cur:
+        fila = {
+            # nivel: subparcela, reserva (subtotal) o total
+            "nivel": "total" if g_res else ("reserva" if g_sub else "subparcela"),
+            "ID_RESERVA": id_reserva,
+            "NSUBPARCELA": nsub,
+            # SUM(N) del resumen es NULL en el total de un rango sin filas
+            "cantidad": int(n or 0),
+        }
+        for medida, valor in zip(medidas, promedios):
+            fila[f"{medida}_promedio"] = float(valor) if valor is not None else None
+        filas.append(fila)
+    return filas
+
+
+def _resumen_arbol_crudo(cur, fecha_inicio, fecha_fin, desglose, id_reserva=None, id_brigada=None):
+    """Resumen calculado directamente sobre ARBOL (fuente=crudo)."""
+    condiciones, binds = _filtro_reporte(fecha_inicio, fecha_fin, id_reserva)
+    where = " AND ".join(condiciones)
+
+    resumen = {"total": 0, "dano": {}, "formafuste": {}, "altura": None, "diametro": None}
+
+    # Un solo recorrido: conteo por DANO, por FORMAFUSTE y el total () con estadísticas
+    sentencias.ejecutar(cur, _sentencia_reporte("resumen_arbol_crudo", f"""
+        SELECT GROUPING(DANO), GROUPING(FORMAFUSTE), DANO, FORMAFUSTE, COUNT(*),
+               AVG(ALTURA), MIN(ALTURA), MAX(ALTURA), STDDEV(ALTURA),
+               AVG(DIAMETRO), MIN(DIAMETRO), MAX(DIAMETRO), STDDEV(DIAMETRO)
+        FROM arbol
+        WHERE {where}
+        GROUP BY GROUPING SETS ((DANO), (FORMAFUSTE), ())
+    """, binds), binds)
+    for g_dano, g_fuste, dano, fuste, n, *stats in cur:
+        if g_dano and g_fuste:
+            resumen["total"] = n
+            resumen["altura"] = _estadistica(*stats[:4])
+            resumen["diametro"] = _estadistica(*stats[4:])
+        elif not g_dano:
+            resumen["dano"][dano or "SIN DATO"] = n
+        else:
+            resumen["formafuste"][fuste or "SIN DATO"] = n
+
+    if desglose:
+        sentencias.ejecutar(cur, _sentencia_reporte("desglose_arbol_crudo", f"""
+            SELECT GROUPING(ID_RESERVA), GROUPING(NSUBPARCELA),
+                   ID_RESERVA, NSUBPARCELA, COUNT(*), AVG(ALTURA), AVG(DIAMETRO)
+            FROM arbol
+            WHERE {where}
+            GROUP BY ROLLUP (ID_RESERVA, NSUBPARCELA)
+            ORDER BY ID_RESERVA, NSUBPARCELA
+        """, binds), binds)
+        resumen["desglose"] = _filas_desglose(cur, ("altura", "diametro"))
+
+    return resumen
+
+
+def _resumen_arbol_materializado(cur, fecha_inicio, fecha_fin, desglose, id_reserva=None, id_brigada=None):
+    """Mismo resultado que _resumen_arbol_crudo, leyendo RESUMEN_ARBOL (fuente=resumen)."""
+    condiciones, binds = _filtro_reporte(fecha_inicio, fecha_fin, id_reserva, columna_fecha="DIA")
+    where = " AND ".join(condiciones)
+
+    resumen = {"total": 0, "dano": {}, "formafuste": {}, "altura": None, "diametro": None}
+
+    sentencias.ejecutar(cur, _sentencia_reporte("resumen_arbol", f"""
+        SELECT GROUPING(DANO), GROUPING(FORMAFUSTE), DANO, FORMAFUSTE, SUM(N),
+               SUM(N_ALTURA), SUM(SUMA_ALTURA), SUM(SUMA_ALTURA2), MIN(MIN_ALTURA), MAX(MAX_ALTURA),
+               SUM(N_DIAMETRO), SUM(SUMA_DIAMETRO), SUM(SUMA_DIAMETRO2), MIN(MIN_DIAMETRO), MAX(MAX_DIAMETRO)
+        FROM RESUMEN_ARBOL
+        WHERE {where}
+        GROUP BY GROUPING SETS ((DANO), (FORMAFUSTE), ())
+    """, binds), binds)
+    for g_dano, g_fuste, dano, fuste, n, *sumas in cur:
+        if g_dano and g_fuste:
+            resumen["total"] = int(n or 0)
+            resumen["altura"] = _estadistica_sumas(*sumas[:5])
+            resumen["diametro"] = _estadistica_sumas(*sumas[5:])
+        elif not g_dano:
+            resumen["dano"][dano] = int(n)
+        else:
+            resumen["formafuste"][fuste] = int(n)
+
+    if desglose:
+        sentencias.ejecutar(cur, _sentencia_reporte("desglose_arbol", f"""
+            SELECT GROUPING(ID_RESERVA), GROUPING(NSUBPARCELA), ID_RESERVA, NSUBPARCELA, SUM(N),
+                   SUM(SUMA_ALTURA) / NULLIF(SUM(N_ALTURA), 0),
+                   SUM(SUMA_DIAMETRO) / NULLIF(SUM(N_DIAMETRO), 0)
+            FROM RESUMEN_ARBOL
+            WHERE {where}
+            GROUP BY ROLLUP (ID_RESERVA, NSUBPARCELA)
+            ORDER BY ID_RESERVA, NSUBPARCELA
+        """, binds), binds)
+        resumen["desglose"] = _filas_desglose(cur, ("altura", "diametro"))
+
+    return resumen
+
+
+def _resumen_planta_crudo(cur, fecha_inicio, fecha_fin, desglose, id_reserva=None, id_brigada=None):
+    """Conteos por NOMBRE_COMUN y clase de TAMANO calculados sobre PLANTA (fuente=crudo)."""
+    condiciones, binds = _filtro_reporte(fecha_inicio, fecha_fin, id_reserva, id_brigada)
+    where = " AND ".join(condiciones)
+    clase = _sql_clase_tamano("TAMANO")
+
+    resumen = {"total": 0, "nombre_comun": {}, "clase_tamano": {}, "tamano": None}
+
+    sentencias.ejecutar(cur, _sentencia_reporte("resumen_planta_crudo", f"""
+        SELECT GROUPING(NVL(NOMBRE_COMUN, 'SIN DATO')), GROUPING({clase}),
+               NVL(NOMBRE_COMUN, 'SIN DATO'), {clase}, COUNT(*),
+               AVG(TAMANO), MIN(TAMANO), MAX(TAMANO), STDDEV(TAMANO)
+        FROM planta
+        WHERE {where}
+        GROUP BY GROUPING SETS ((NVL(NOMBRE_COMUN, 'SIN DATO')), ({clase}), ())
+    """, binds), binds)
+    for g_nombre, g_clase, nombre, clase_tamano, n, *stats in cur:
+        if g_nombre and g_clase:
+            resumen["total"] = n
+            resumen["tamano"] = _estadistica(*stats)
+        elif not g_nombre:
+            resumen["nombre_comun"][nombre] = n
+        else:
+            resumen["clase_tamano"][clase_tamano] = n
+
+    if desglose:
+        sentencias.ejecutar(cur, _sentencia_reporte("desglose_planta_crudo", f"""
+            SELECT GROUPING(ID_RESERVA), GROUPING(NSUBPARCELA),
+                   ID_RESERVA, NSUBPARCELA, COUNT(*), AVG(TAMANO)
+            FROM planta
+            WHERE {where}
+            GROUP BY ROLLUP (ID_RESERVA, NSUBPARCELA)
+            ORDER BY ID_RESERVA, NSUBPARCELA
+        """, binds), binds)
+        resumen["desglose"] = _filas_desglose(cur, ("tamano",))
+
+    return resumen
+
+
+def _resumen_planta_materializado(cur, fecha_inicio, fecha_fin, desglose, id_reserva=None, id_brigada=None):
+    """Mismo resultado que _resumen_planta_crudo, leyendo RESUMEN_PLANTA (fuente=resumen)."""
+    condiciones, binds = _filtro_reporte(fecha_inicio, fecha_fin, id_reserva, id_brigada, columna_fecha="DIA")
+    where = " AND ".join(condiciones)
+
+    resumen = {"total": 0, "nombre_comun": {}, "clase_tamano": {}, "tamano": None}
+
+    sentencias.ejecutar(cur, _sentencia_reporte("resumen_planta", f"""
+        SELECT GROUPING(NOMBRE_COMUN), GROUPING(CLASE_TAMANO), NOMBRE_COMUN, CLASE_TAMANO, SUM(N),
+               SUM(N_TAMANO), SUM(SUMA_TAMANO), SUM(SUMA_TAMANO2), MIN(MIN_TAMANO), MAX(MAX_TAMANO)
+        FROM RESUMEN_PLANTA
+        WHERE {where}
+        GROUP BY GROUPING SETS ((NOMBRE_COMUN), (CLASE_TAMANO), ())
+    """, binds), binds)
+    for g_nombre, g_clase, nombre, clase_tamano, n, *sumas in cur:
+        if g_nombre and g_clase:
+            resumen["total"] = int(n or 0)
+            resumen["tamano"] = _estadistica_sumas(*sumas)
+        elif not g_nombre:
+            resumen["nombre_comun"][nombre] = int(n)
+        else:
+            resumen["clase_tamano"][clase_tamano] = int(n)
+
+    if desglose:
+        sentencias.ejecutar(cur, _sentencia_reporte("desglose_planta", f"""
+            SELECT GROUPING(ID_RESERVA), GROUPING(NSUBPARCELA), ID_RESERVA, NSUBPARCELA, SUM(N),
+                   SUM(SUMA_TAMANO) / NULLIF(SUM(N_TAMANO), 0)
+            FROM RESUMEN_PLANTA
+            WHERE {where}
+            GROUP BY ROLLUP (ID_RESERVA, NSUBPARCELA)
+            ORDER BY ID_RESERVA, NSUBPARCELA
+        """, binds), binds)
+        resumen["desglose"] = _filas_desglose(cur, ("tamano",))
+
+    return resumen
+
+
+# tipo -> fuente -> función de resumen
+_RESUMENES = {
+    "Arbol": {"resumen": _resumen_arbol_materializado, "crudo": _resumen_arbol_crudo},
+    "Planta": {"resumen": _resumen_planta_materializado, "crudo": _resumen_planta_crudo},
+}
+
+# Tablas RESUMEN_* ya cargadas (con fila en RESUMEN_MARCA). Una vez cargada una
+# tabla no vuelve a quedar vacía, así que sólo se consulta mientras falte alguna.
+_resumen_cargado = set()
+_SQL_TABLAS_RESUMEN = sentencias.registrar("tablas_resumen", "SELECT TABLA FROM RESUMEN_MARCA")
+
+_SQL_MARCAS_RESUMEN = sentencias.registrar("marcas_resumen", "SELECT TABLA, ULTIMA_FECHA FROM RESUMEN_MARCA")
+
+
+def _fuente_efectiva(cur, tipo, fuente):
+    """fuente=resumen cae a crudo si RESUMEN_<tipo> todavía no tiene la carga inicial."""
+    if fuente != "resumen" or tipo.upper() in _resumen_cargado:
+        return fuente
+    sentencias.ejecutar(cur, _SQL_TABLAS_RESUMEN)
+    _resumen_cargado.update(t for (t,) in cur.fetchall())
+    return "resumen" if tipo.upper() in _resumen_cargado else "crudo"
+
+
+@app.route("/api/reportes/resumen", methods=["GET"])
+def api_reportes_resumen():
+    """
+    Conteos y estadísticas calculados en la base de datos (las gráficas ya no
+    necesitan la tabla):
+      Arbol  -> por DANO y FORMAFUSTE, ALTURA/DIAMETRO
+      Planta -> por NOMBRE_COMUN y clase de TAMANO, TAMANO
+    Parámetros: tipo (uno o "Arbol,Planta"), fechaInicio, fechaFin, reserva,
+    brigada (sólo Planta),
+    desglose=1 -> agrega subtotales ROLLUP por ID_RESERVA y NSUBPARCELA,
+    fuente=resumen (por defecto, lee RESUMEN_*; si la tabla aún no tiene la
+    carga inicial se usa crudo) | crudo (recorre ARBOL/PLANTA). La respuesta
+    indica en "fuente" la que se usó.
+    Con varios tipos responde {"Arbol": {...}, "Planta": {...}} en una sola consulta HTTP.
+    """
+    fecha_inicio = request.args.get("fechaInicio")
+    fecha_fin = request.args.get("fechaFin")
+    desglose = request.args.get("desglose") == "1"
+    fuente = request.args.get("fuente", "resumen")
+
+    try:
+        tipos, id_reserva, id_brigada = _parametros_reporte()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fuente not in ("resumen", "crudo"):
+        return jsonify({"error": "fuente debe ser 'resumen' o 'crudo'"}), 400
+
+    try:
+        with pool.acquire() as conn:
+            with conn.cursor() as cur:
+                fuentes = {tipo: _fuente_efectiva(cur, tipo, fuente) for tipo in tipos}
+                resumenes = {
+                    tipo: _RESUMENES[tipo][fuentes[tipo]](cur, fecha_inicio, fecha_fin, desglose, id_reserva, id_brigada)
+                    for tipo in tipos
+                }
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    for tipo in tipos:
+        resumenes[tipo]["fuente"] = fuentes[tipo]
+    if len(tipos) == 1:
+        return jsonify(resumenes[tipos[0]])
+
+    # "resumen" sólo si todos los tipos salieron del resumen; cada tipo trae la suya
+    resumenes["fuente"] = "resumen" if all(f == "resumen" for f in fuentes.values()) else "crudo"
+    return jsonify(resumenes)
+
+
+# ---------------------------
+# ESTADÍSTICAS DE INVENTARIO POR RESERVA (NumPy)
+# ---------------------------
+# Métricas de parcela desde ARBOL: área basal, distribuciones de diámetro y
+# altura, tasa de daño por subparcela y densidad por hectárea. Cada reserva
+# tiene las subparcelas circulares de SUBPARCELAS (centros a 80 m del punto de
+# la reserva) con radio SUBPARCELA_RADIO_M. ALTURA y DIAMETRO vienen en cm.
+SUBPARCELA_RADIO_M = float(os.getenv('SUBPARCELA_RADIO_M', '15'))
+ESTADISTICAS_ARRAYSIZE = int(os.getenv('ESTADISTICAS_ARRAYSIZE', '5000'))
+# Límites (cm) de las clases de los histogramas; la primera y la última quedan abiertas
+CLASES_DIAMETRO_CM = tuple(float(x) for x in os.getenv('CLASES_DIAMETRO_CM', '10,20,30,40,50,60,80,100').split(','))
+CLASES_ALTURA_CM = tuple(float(x) for x in os.getenv('CLASES_ALTURA_CM', '500,1000,1500,2000,2500,3000').split(','))
+DANO_SIN_DANO = "SD"
+
+_estadisticas_cache = CacheTTL(
+    maxsize=int(os.getenv('ESTADISTICAS_CACHE_MAX', '256')),
+    ttl=float(os.getenv('ESTADISTICAS_CACHE_TTL', '3600'))
+)
+# Generación por reserva: un cálculo que empezó antes de un registro nuevo no
+# debe guardarse en la caché cuando termina
+_estadisticas_generacion = {}
+_estadisticas_lock = threading.Lock()
+
+
+def invalidar_estadisticas(*ids_reserva):
+    """Se llama después de confirmar árboles nuevos (formulario o sync) en esas reservas."""
+    ids_reserva = [int(i) for i in ids_reserva]
+    with _estadisticas_lock:
+        for id_reserva in ids_reserva:
+            _estadisticas_generacion[id_reserva] = _estadisticas_generacion.get(id_reserva, 0) + 1
+    _estadisticas_cache.invalidar(*ids_reserva)
+
+
+_SQL_ARBOLES_RESERVA = sentencias.registrar("arboles_reserva", """
+    SELECT NSUBPARCELA, DIAMETRO, ALTURA, DANO
+    FROM ARBOL
+    WHERE ID_RESERVA = :id_reserva
+""")
+
+
+def _cargar_arboles(id_reserva):
+    """
+    Trae los árboles de la reserva en un solo viaje (prefetch del tamaño del
+    arraysize; IX_ARBOL_RESERVA_STATS cubre la consulta) y los deja como arreglos.
+    """
+    with pool.acquire() as connection:
+        with connection.cursor() as cursor:
+            cursor.arraysize = ESTADISTICAS_ARRAYSIZE
+            cursor.prefetchrows = ESTADISTICAS_ARRAYSIZE + 1
+            sentencias.ejecutar(cursor, _SQL_ARBOLES_RESERVA, {"id_reserva": id_reserva})
+            filas = cursor.fetchall()
+
+    subparcelas, diametros, alturas, danos = zip(*filas) if filas else ((), (), (), ())
+    return (
+        np.array(["SIN DATO" if v is None else str(v).strip() for v in subparcelas], dtype=str),
+        np.array(diametros, dtype=float),   # None -> NaN
+        np.array(alturas, dtype=float),
+        np.array(["" if v is None else str(v).strip().upper() for v in danos], dtype=str),
+    )
+
+
+def _redondear(valor, decimales=4):
+    return None if valor is None or not np.isfinite(valor) else round(float(valor), decimales)
+
+
+def _describir(valores):
+    """Resumen de una medida ignorando los NaN (datos faltantes)."""
+    validos = valores[~np.isnan(valores)]
+    if validos.size == 0:
+        return {"n": 0}
+    p25, p50, p75 = np.percentile(validos, (25, 50, 75))
+    return {
+        "n": int(validos.size),
+        "media": _redondear(validos.mean(), 2),
+        "desv": _redondear(validos.std(ddof=1), 2) if validos.size > 1 else 0.0,
+        "min": _redondear(validos.min(), 2),
+        "p25": _redondear(p25, 2),
+        "mediana": _redondear(p50, 2),
+        "p75": _redondear(p75, 2),
+        "max": _redondear(validos.max(), 2),
+    }
+
+
+def _distribucion(valores, limites):
+    """Conteo por clase, en orden: [{"clase": "<10", "n": ...}, {"clase": "10-20", ...}, ...]."""
+    validos = valores[~np.isnan(valores)]
+    conteos = np.bincount(np.searchsorted(limites, validos, side="right"), minlength=len(limites) + 1)
+    etiquetas = ([f"<{limites[0]:g}"]
+                 + [f"{a:g}-{b:g}" for a, b in zip(limites, limites[1:])]
+                 + [f">={limites[-1]:g}"])
+    return [{"clase": e, "n": c} for e, c in zip(etiquetas, conteos.tolist())]
+
+
+def _clave_subparcela(codigo):
+    """Orden natural: "2" antes que "10" y lo no numérico al final."""
+    return (0, int(codigo), "") if codigo.isdigit() else (1, 0, str(codigo))
+
+
+def calcular_estadisticas(subparcelas, diametros, alturas, danos):
+    """
+    Todas las métricas de una reserva sobre los arreglos de _cargar_arboles.
+    Los agregados por subparcela salen de np.unique + np.bincount (sin bucles
+    por árbol). La densidad usa el área de todas las subparcelas del diseño,
+    aunque alguna no tenga árboles registrados.
+    """
+    area_subparcela_ha = math.pi * SUBPARCELA_RADIO_M ** 2 / 10_000
+    n = int(subparcelas.size)
+
+    # Área basal por árbol (m²): π (DAP/2)², con DAP en cm -> m
+    area_basal = np.pi * (np.nan_to_num(diametros) / 200.0) ** 2
+    con_dano = danos != ""
+    danado = con_dano & (danos != DANO_SIN_DANO)
+
+    codigos, grupo = np.unique(subparcelas, return_inverse=True)
+    area_muestreada_ha = max(len(SUBPARCELAS), len(codigos)) * area_subparcela_ha
+
+    por_grupo = {
+        "n": np.bincount(grupo, minlength=len(codigos)),
+        "area_basal": np.bincount(grupo, weights=area_basal, minlength=len(codigos)),
+        "n_dano": np.bincount(grupo, weights=con_dano, minlength=len(codigos)),
+        "danados": np.bincount(grupo, weights=danado, minlength=len(codigos)),
+        "n_diametro": np.bincount(grupo, weights=~np.isnan(diametros), minlength=len(codigos)),
+        "suma_diametro": np.bincount(grupo, weights=np.nan_to_num(diametros), minlength=len(codigos)),
+        "n_altura": np.bincount(grupo, weights=~np.isnan(alturas), minlength=len(codigos)),
+        "suma_altura": np.bincount(grupo, weights=np.nan_to_num(alturas), minlength=len(codigos)),
+    }
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tasa_dano = por_grupo["danados"] / por_grupo["n_dano"]
+        diametro_medio = por_grupo["suma_diametro"] / por_grupo["n_diametro"]
+        altura_media = por_grupo["suma_altura"] / por_grupo["n_altura"]
+
+    orden = sorted(range(len(codigos)), key=lambda k: _clave_subparcela(codigos[k]))
+
+    tipos_dano, conteo_danos = np.unique(danos[con_dano], return_counts=True)
+    validos_d = diametros[~np.isnan(diametros)]
+
+    return {
+        "n_arboles": n,
+        "subparcela_radio_m": SUBPARCELA_RADIO_M,
+        "area_muestreada_ha": _redondear(area_muestreada_ha),
+        "area_basal_m2": _redondear(area_basal.sum()),
+        "area_basal_m2_ha": _redondear(area_basal.sum() / area_muestreada_ha),
+        "densidad_arboles_ha": _redondear(n / area_muestreada_ha, 1),
+        "diametro_cm": dict(_describir(diametros),
+                            cuadratico_medio=_redondear(np.sqrt(np.mean(validos_d ** 2)), 2) if validos_d.size else None),
+        "altura_cm": _describir(alturas),
+        "distribucion_diametro": _distribucion(diametros, CLASES_DIAMETRO_CM),
+        "distribucion_altura": _distribucion(alturas, CLASES_ALTURA_CM),
+        "danos": dict(zip(tipos_dano.tolist(), conteo_danos.tolist())),
+        "tasa_dano": _redondear(danado.sum() / con_dano.sum()) if con_dano.any() else None,
+        "subparcelas": [{
+            "nsubparcela": str(codigos[k]),
+            "n_arboles": int(por_grupo["n"][k]),
+            "area_basal_m2": _redondear(por_grupo["area_basal"][k]),
+            "area_basal_m2_ha": _redondear(por_grupo["area_basal"][k] / area_subparcela_ha),
+            "densidad_arboles_ha": _redondear(por_grupo["n"][k] / area_subparcela_ha, 1),
+            "diametro_medio_cm": _redondear(diametro_medio[k], 2),
+            "altura_media_cm": _redondear(altura_media[k], 2),
+            "tasa_dano": _redondear(tasa_dano[k]),
+        } for k in orden],
+    }
+
+
+def estadisticas_reserva(id_reserva):
+    """Estadísticas memoizadas por reserva; devuelve (resultado, desde_cache)."""
+    resultado = _estadisticas_cache.obtener(id_reserva)
+    if resultado is not _FALTA:
+        return resultado, True
+
+    with _estadisticas_lock:
+        generacion = _estadisticas_generacion.get(id_reserva, 0)
+
+    resultado = dict(calcular_estadisticas(*_cargar_arboles(id_reserva)),
+                     id_reserva=id_reserva,
+                     calculado_en=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+    with _estadisticas_lock:
+        if _estadisticas_generacion.get(id_reserva, 0) == generacion:
+            _estadisticas_cache.guardar(id_reserva, resultado)
+    return resultado, False
+
+
+@app.route('/api/reservas/<int:id_reserva>/estadisticas', methods=['GET'])
+def api_estadisticas_reserva(id_reserva):
+    """
+    Métricas de inventario de la reserva: área basal (total y por ha),
+    densidad por ha, distribuciones de diámetro/altura, daños y el detalle por
+    subparcela. Se recalcula sólo cuando se registran árboles nuevos.
+    """
+    if 'usuario' not in session:
+        return jsonify({"error": "No autenticado"}), 401
+    if np is None:
+        return jsonify({"error": "Las estadísticas requieren numpy instalado"}), 501
+
+    try:
+        resultado, desde_cache = estadisticas_reserva(id_reserva)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(dict(resultado, cache=desde_cache)), 200
+
+
+# ---------------------------
+# EXPORTACIÓN COLUMNAR (CSV.gz / Parquet / Arrow IPC)
+# ---------------------------
+EXPORT_ARRAYSIZE = int(os.getenv('EXPORT_ARRAYSIZE', '10000'))
+
+_FORMATOS_EXPORT = {
+    "csv": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+
+def _esquema_arbol():
+    return pa.schema([
+        ("ID_ARBOL", pa.int64()),
+        ("NOMBRE_CIENTIFICO", pa.string()),
+        ("NOMBRE_COMUN", pa.string()),
+        ("ALTURA", pa.float64()),
+        ("DIAMETRO", pa.float64()),
+        ("DANO", pa.string()),
+        ("FORMAFUSTE", pa.string()),
+        ("OBSERVACIONES", pa.string()),
+        ("NSUBPARCELA", pa.string()),
+        ("NRO_DOCUMENTO", pa.string()),
+        ("ID_RESERVA", pa.int64()),
+        ("FECHA_REGISTRO", pa.timestamp("s")),
+    ])
+
+
+class _SumideroFlujo:
+    """
+    Archivo de sólo escritura para pyarrow que acumula bytes hasta que se
+    vacían con drenar(); tell() cuenta el total escrito (Parquet lo necesita).
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self):
+        datos = b"".join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _lotes_export(fecha_inicio, fecha_fin, id_reserva, formato):
+    """
+    Lotes del reporte de árboles con arraysize grande. Para Arrow/Parquet usa
+    connection.fetch_df_batches (oracledb >= 3, sin pasar por objetos Python)
+    cuando existe; si no, fetchmany y conversión a RecordBatch por lote.
+    """
+    query, binds = _consulta_arboles(fecha_inicio, fecha_fin, id_reserva=id_reserva)
+
+    with pool.acquire() as conn:
+        if formato != "csv" and hasattr(conn, "fetch_df_batches"):
+            for df in conn.fetch_df_batches(query, binds, size=EXPORT_ARRAYSIZE):
+                yield pa.record_batch(df)
+            return
+
+        with conn.cursor() as cur:
+            cur.arraysize = EXPORT_ARRAYSIZE
+            cur.prefetchrows = EXPORT_ARRAYSIZE
+            sentencias.ejecutar(cur, query, binds)
+            while True:
+                filas = cur.fetchmany()
+                if not filas:
+                    break
+                yield filas
+
+
+def _filas_a_batch(filas, esquema):
+    columnas = list(zip(*filas))
+    arrays = []
+    for campo, valores in zip(esquema, columnas):
+        if pa.types.is_string(campo.type):
+            valores = [None if v is None else str(v) for v in valores]
+        arrays.append(pa.array(valores, type=campo.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=esquema)
+
+
+def generar_export(formato, fecha_inicio=None, fecha_fin=None, id_reserva=None):
+    """
+    Genera el archivo por pedazos (bytes): la memoria depende del tamaño de
+    lote, no del rango de fechas. CSV va comprimido con gzip; Parquet con zstd
+    (un row group por lote); Arrow como stream IPC.
+    """
+    lotes = _lotes_export(fecha_inicio, fecha_fin, id_reserva, formato)
+
+    if formato == "csv":
+        gz = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31 -> formato gzip
+        texto = io.StringIO()
+        escritor = csv.writer(texto)
+        escritor.writerow(_COLUMNAS_ARBOL)
+        for filas in lotes:
+            escritor.writerows(filas)
+            yield gz.compress(texto.getvalue().encode("utf-8"))
+            texto.seek(0)
+            texto.truncate()
+        yield gz.compress(texto.getvalue().encode("utf-8")) + gz.flush()
+        return
+
+    sumidero = _SumideroFlujo()
+    escritor = None
+    esquema = None
+    for lote in lotes:
+        if isinstance(lote, list):
+            esquema = esquema or _esquema_arbol()
+            lote = _filas_a_batch(lote, esquema)
+        if escritor is None:
+            esquema = lote.schema
+            if formato == "parquet":
+                escritor = pq.ParquetWriter(sumidero, esquema, compression="zstd")
+            else:
+                escritor = pa.ipc.new_stream(sumidero, esquema)
+        escritor.write_batch(lote)
+        yield sumidero.drenar()
+
+    if escritor is None:   # sin filas: archivo válido y vacío
+        esquema = _esquema_arbol()
+        escritor = (pq.ParquetWriter(sumidero, esquema, compression="zstd") if formato == "parquet"
+                    else pa.ipc.new_stream(sumidero, esquema))
+    escritor.close()
+    yield sumidero.drenar()
+
+
+def _parametros_export(formato, id_reserva):
+    """Valida formato y reserva; devuelve (id_reserva, error)."""
+    if formato not in _FORMATOS_EXPORT:
+        return None, f"formato debe ser uno de: {', '.join(_FORMATOS_EXPORT)}"
+    if formato != "csv" and pa is None:
+        return None, "Exportar a Parquet/Arrow requiere pyarrow instalado"
+    if id_reserva in (None, ""):
+        return None, None
+    try:
+        return int(id_reserva), None
+    except (TypeError, ValueError):
+        return None, "reserva debe ser un número"
+
+
+@app.route("/api/reportes/exportar", methods=["GET"])
+def api_reportes_exportar():
+    """
+    Descarga del inventario de árboles para análisis.
+    Parámetros: formato=csv|parquet|arrow, fechaInicio, fechaFin, reserva=<ID_RESERVA>.
+    """
+    formato = request.args.get("formato", "csv").lower()
+    fecha_inicio = request.args.get("fechaInicio")
+    fecha_fin = request.args.get("fechaFin")
+
+    id_reserva, error = _parametros_export(formato, request.args.get("reserva"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    mimetype, extension = _FORMATOS_EXPORT[formato]
+    nombre = f"arboles_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    return Response(
+        stream_with_context(generar_export(formato, fecha_inicio, fecha_fin, id_reserva)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+
+@app.cli.command("exportar-arboles")
+@click.option("--formato", type=click.Choice(list(_FORMATOS_EXPORT)), default="parquet")
+@click.option("--salida", required=True, help="Archivo de destino")
+@click.option("--desde", default=None, help="Fecha inicio YYYY-MM-DD")
+@click.option("--hasta", default=None, help="Fecha fin YYYY-MM-DD")
+@click.option("--reserva", type=int, default=None, help="ID_RESERVA")
+def cli_exportar_arboles(formato, salida, desde, hasta, reserva):
+    """Exporta ARBOL a CSV.gz, Parquet o Arrow IPC (flask --app app exportar-arboles ...)."""
+    _, error = _parametros_export(formato, reserva)
+    if error:
+        raise click.ClickException(error)
+
+    inicio = time.perf_counter()
+    total = 0
+    with open(salida, "wb") as f:
+        for pedazo in generar_export(formato, desde, hasta, reserva):
+            f.write(pedazo)
+            total += len(pedazo)
+    click.echo(f"✔ {salida}: {total / 1e6:.1f} MB en {time.perf_counter() - inicio:.1f} s")
+
+
+# ---------------------------
+# HISTORIAL: CONSULTA, RESÚMENES Y RETENCIÓN
+# ---------------------------
+HISTORIAL_LIMITE_MAX = int(os.getenv('HISTORIAL_LIMITE_MAX', '500'))
+HISTORIAL_ZONA = os.getenv('HISTORIAL_ZONA', 'America/Bogota')   # para agrupar por día
+
+_historial_resumenes = CacheTTL(maxsize=64, ttl=float(os.getenv('HISTORIAL_RESUMEN_TTL', '60')))
+
+
+def _fecha_historial(valor, fin=False):
+    """YYYY-MM-DD o ISO 8601 -> datetime UTC. Una fecha sola como fin cubre todo ese día."""
+    if not valor:
+        return None
+    fecha = datetime.fromisoformat(valor)
+    if fin and len(valor) == 10:
+        fecha += timedelta(days=1)
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha
+
+
+def _filtro_historial(desde, hasta, **iguales):
+    filtro = {k: v for k, v in iguales.items() if v}
+    if desde or hasta:
+        filtro["ts"] = {}
+        if desde:
+            filtro["ts"]["$gte"] = desde
+        if hasta:
+            filtro["ts"]["$lt"] = hasta
+    return filtro
+
+
+def _evento_json(doc):
+    ts = doc.get("ts")
+    if isinstance(ts, datetime) and ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)   # pymongo devuelve UTC sin zona
+    return {
+        "id": str(doc["_id"]),
+        "user": doc.get("user"),
+        "action": doc.get("action"),
+        "details": doc.get("details") or {},
+        "ts": ts.isoformat() if isinstance(ts, datetime) else ts,
+    }
+
+
+@app.route("/api/historial", methods=["GET"])
+@requiere_admin
+def api_historial():
+    """
+    Eventos del historial, del más reciente al más antiguo. Parámetros:
+      usuario, accion, desde, hasta (YYYY-MM-DD o ISO 8601)
+      limite (por defecto 50), cursor=<tok> -> continúa después del token "siguiente"
+    La paginación es por llave (ts, _id), apoyada en los índices user_ts / action_ts / ts.
+    """
+    try:
+        desde = _fecha_historial(request.args.get("desde"))
+        hasta = _fecha_historial(request.args.get("hasta"), fin=True)
+        limite = request.args.get("limite", 50, type=int)
+        if not (0 < limite <= HISTORIAL_LIMITE_MAX):
+            return jsonify({"error": f"limite debe estar entre 1 y {HISTORIAL_LIMITE_MAX}"}), 400
+
+        filtro = _filtro_historial(desde, hasta,
+                                   user=request.args.get("usuario"), action=request.args.get("accion"))
+
+        token = request.args.get("cursor")
+        if token:
+            try:
+                crudo_ts, crudo_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+                cts, cid = datetime.fromisoformat(crudo_ts), ObjectId(crudo_id)
+            except Exception:
+                raise ValueError("Cursor inválido")
+            filtro = {"$and": [filtro, {"$or": [{"ts": {"$lt": cts}}, {"ts": cts, "_id": {"$lt": cid}}]}]}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        docs = list(
+            obtener_mongo().historial.find(filtro)
+            .sort([("ts", DESCENDING), ("_id", DESCENDING)])
+            .limit(limite + 1)
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    siguiente = None
+    if len(docs) > limite:
+        docs = docs[:limite]
+        ultimo = docs[-1]
+        siguiente = base64.urlsafe_b64encode(
+            f"{ultimo['ts'].isoformat()}|{ultimo['_id']}".encode()).decode()
+
+    return jsonify({"eventos": [_evento_json(d) for d in docs], "siguiente": siguiente})
+
+
+def _pipeline_logins_por_dia(filtro):
+    return [
+        {"$match": {**filtro, "action": "login"}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ts", "timezone": HISTORIAL_ZONA}},
+            "logins": {"$sum": 1},
+            "usuarios": {"$addToSet": "$user"},
+        }},
+        {"$project": {"_id": 0, "dia": "$_id", "logins": 1, "usuarios": {"$size": "$usuarios"}}},
+        {"$sort": {"dia": 1}},
+    ]
+
+
+def _pipeline_activos_por_departamento(filtro):
+    # El departamento viaja en los detalles del login (eventos anteriores: "SIN DATO")
+    return [
+        {"$match": {**filtro, "action": "login"}},
+        {"$group": {"_id": {"dep": {"$ifNull": ["$details.departamento", "SIN DATO"]}, "user": "$user"}}},
+        {"$group": {"_id": "$_id.dep", "usuarios": {"$sum": 1}}},
+        {"$project": {"_id": 0, "departamento": "$_id", "usuarios": 1}},
+        {"$sort": {"usuarios": -1, "departamento": 1}},
+    ]
+
+
+_RESUMENES_HISTORIAL = {
+    "logins_por_dia": _pipeline_logins_por_dia,
+    "activos_por_departamento": _pipeline_activos_por_departamento,
+}
+
+
+@app.route("/api/historial/resumen", methods=["GET"])
+@requiere_admin
+def api_historial_resumen():
+    """
+    Resúmenes calculados en Mongo (aggregation pipeline). Parámetros:
+      tipo=logins_por_dia | activos_por_departamento, desde, hasta
+    Se guardan HISTORIAL_RESUMEN_TTL segundos por combinación de parámetros.
+    """
+    tipo = request.args.get("tipo")
+    if tipo not in _RESUMENES_HISTORIAL:
+        return jsonify({"error": f"tipo debe ser uno de: {', '.join(_RESUMENES_HISTORIAL)}"}), 400
+    try:
+        desde = _fecha_historial(request.args.get("desde"))
+        hasta = _fecha_historial(request.args.get("hasta"), fin=True)
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (usar YYYY-MM-DD o ISO 8601)"}), 400
+
+    clave = (tipo, desde, hasta)
+    filas = _historial_resumenes.obtener(clave)
+    if filas is _FALTA:
+        try:
+            pipeline = _RESUMENES_HISTORIAL[tipo](_filtro_historial(desde, hasta))
+            filas = list(obtener_mongo().historial.aggregate(pipeline))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        _historial_resumenes.guardar(clave, filas)
+
+    return jsonify({"tipo": tipo, "filas": filas})
+
+
+def archivar_historial(dias, destino, lote=5000, borrar=True):
+    """
+    Copia a destino (JSON Lines con gzip, formato extendido de bson) los
+    eventos con más de `dias` días y luego los borra de la colección, lote por
+    lote y en orden de _id. Devuelve la cantidad archivada.
+    """
+    coleccion = obtener_mongo().historial
+    limite = datetime.now(timezone.utc) - timedelta(days=dias)
+    filtro = {"ts": {"$lt": limite}}
+    total = 0
+    ultimo = None
+
+    with gzip.open(destino, "at", encoding="utf-8") as f:
+        while True:
+            consulta = dict(filtro, _id={"$gt": ultimo}) if ultimo else filtro
+            docs = list(coleccion.find(consulta).sort("_id", ASCENDING).limit(lote))
+            if not docs:
+                break
+            f.writelines(json_util.dumps(d) + "\n" for d in docs)
+            f.flush()
+            if borrar:
+                coleccion.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+            ultimo = docs[-1]["_id"]
+            total += len(docs)
+    return total
+
+
+@app.cli.command("archivar-historial")
+@click.option("--dias", type=int, default=365, show_default=True, help="Archivar eventos más antiguos que esto")
+@click.option("--destino", default=None, help="Archivo .jsonl.gz (por defecto historial_<fecha>.jsonl.gz)")
+@click.option("--sin-borrar", is_flag=True, help="Sólo copiar, sin borrar de Mongo")
+def cli_archivar_historial(dias, destino, sin_borrar):
+    """Pasa el historial viejo a un archivo comprimido (para cron, antes de que venza el TTL)."""
+    destino = destino or f"historial_{datetime.now():%Y%m%d}.jsonl.gz"
+    total = archivar_historial(dias, destino, borrar=not sin_borrar)
+    click.echo(f"✔ {total} eventos archivados en {destino}")
+
+
+@app.route("/api/metricas/historial", methods=["GET"])
+@requiere_admin
+def api_metricas_historial():
+    """Profundidad de la cola del historial y contadores de escritos/descartados."""
+    return jsonify(historial_writer.estadisticas())
+
+
+@app.route("/api/metricas/sentencias", methods=["GET"])
+@requiere_admin
+def api_metricas_sentencias():
+    """Registro de sentencias: aciertos/fallos del caché por sesión y costo del precalentamiento."""
+    return jsonify(sentencias.estadisticas())
+
+
+@app.route("/api/metricas/fragmentos", methods=["GET"])
+@requiere_admin
+def api_metricas_fragmentos():
+    """Tamaño y aciertos/fallos del caché de fragmentos HTML (formularios e index)."""
+    return jsonify(_fragmentos.estadisticas())
+
+
+@app.route("/api/metricas/pool", methods=["GET"])
+@requiere_admin
+def api_metricas_pool():
+    """Conexiones ocupadas/abiertas, timeouts e histograma de espera del pool Oracle."""
+    return jsonify(pool.estadisticas())
+
+
+@app.route("/api/metricas/resumen", methods=["GET"])
+@requiere_admin
+def api_metricas_resumen():
+    """Fallos al sumar registros a RESUMEN_* y la marca del último recálculo de cada tabla."""
+    with _fallos_resumen_lock:
+        fallos = dict(_fallos_resumen)
+    try:
+        with pool.acquire() as conn:
+            with conn.cursor() as cur:
+                sentencias.ejecutar(cur, _SQL_MARCAS_RESUMEN)
+                marcas = {tabla: str(fecha) for tabla, fecha in cur.fetchall()}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"fallos": fallos, "marcas": marcas, "intervalo_s": RESUMEN_INTERVALO})
+
+
+@app.route("/api/metricas/latencia", methods=["GET"])
+@requiere_admin
+def api_metricas_latencia():
+    """
+    Percentiles (ms) por endpoint y por sentencia SQL sobre las últimas
+    METRICAS_VENTANA muestras, y viajes a la base por request.
+    """
+    return jsonify({
+        "habilitado": METRICAS_HABILITADAS,
+        "sql_lento_ms": SQL_LENTO_MS,
+        "endpoints": _latencia_endpoints.resumen(),
+        "viajes_por_request": _viajes_endpoints.resumen(),
+        "sql": _latencia_sql.resumen(),
+    })
+
+
+# ---------------------------
+# SALUD (separado del arranque)
+# ---------------------------
+@app.route("/salud", methods=["GET"])
+def salud():
+    """Liveness: el proceso responde. No toca Oracle ni Mongo."""
+    return jsonify({"ok": True}), 200
+
+
+@app.route("/salud/listo", methods=["GET"])
+def salud_listo():
+    """Readiness: hace ping a Oracle y a Mongo (crea los recursos si aún no existen)."""
+    estado = {}
+
+    try:
+        with pool.acquire() as connection:
+            connection.ping()
+        estado["oracle"] = "ok"
+    except Exception as e:
+        estado["oracle"] = str(e)
+
+    try:
+        obtener_mongo().client.admin.command("ping")
+        estado["mongo"] = "ok"
+    except Exception as e:
+        estado["mongo"] = str(e)
 
+    ok = all(v == "ok" for v in estado.values())
+    return jsonify({"ok": ok, **estado}), 200 if ok else 503
 
 
 @app.route("/reportes")
@@ -602,5 +4419,6 @@ def reportes():
 # EJECUCIÓN LOCAL
 # ---------------------------
 if __name__ == '__main__':
-    # Nota: en producción usa un WSGI server (gunicorn/uwsgi)
+    # Nota: en producción usa gunicorn con la configuración del repo:
+    #   gunicorn -c gunicorn.conf.py app:app
     app.run(debug=True, host='0.0.0.0', port=5000)
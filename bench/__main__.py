@@ -0,0 +1,308 @@
+# bench/__main__.py
+"""
+Benchmark / prueba de carga de las rutas de app.py sin Oracle ni Mongo reales.
+
+    python -m bench                                   # Oracle falso, 1 ms por viaje
+    python -m bench --backend sqlite --filas 10000,1000000,10000000
+    python -m bench --rutas login,api_reportes --hilos 16 --peticiones 2000
+    python -m bench --json resultados.json
+    python -m bench --url http://127.0.0.1:8000 --hilos 32   # contra un servidor real
+
+Por cada escenario (backend x filas x ruta) reporta throughput (req/s),
+latencia p50/p99, viajes a la base por request, el pico de RSS durante el
+escenario (muestreado cada 10 ms, sólo Linux) con lo que creció desde su
+inicio, y el pico de RSS de todo el proceso hasta ese momento.
+Las bases SQLite sembradas se guardan en bench/.datos/ y se reutilizan.
+
+Con --url las peticiones van por HTTP a un servidor levantado con
+bench/servidor.py (dev server o gunicorn); los viajes y el RSS quedan del
+lado del servidor y no se reportan.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+# Se importa app.py desde la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from bench import fakes  # noqa: E402
+from bench.servidor import crear_pool, instalar_backends  # noqa: E402
+
+
+# -------------------------
+# PETICIONES POR RUTA
+# -------------------------
+def _login(cliente, i):
+    return cliente.post("/login", data={"nro_documento": str(1000 + i % 500), "contrasena": "clave"})
+
+
+def _form_arbol(i):
+    return {
+        "altura": "1200", "dano": "SD", "diametro": "35", "formafuste": "CIL",
+        "observaciones": "", "nsubparcela": str(1 + i % 4),
+    }
+
+
+def _registrar_arbol(cliente, i):
+    return cliente.post("/registrar_arbol", data=_form_arbol(i))
+
+
+def _registrar_arbol_json(cliente, i):
+    # Envío rápido de registro_rapido.js: mismo formulario, respuesta JSON corta
+    return cliente.post("/registrar_arbol", data=_form_arbol(i), headers={"Accept": "application/json"})
+
+
+# Cada corrida usa su propio tramo de fechas para no chocar (409) con las
+# reservas que dejaron corridas anteriores sobre la misma base SQLite
+_INICIO_RESERVAS = datetime(2100, 1, 1) + timedelta(days=random.randrange(0, 2_000_000))
+
+
+def _crear_reserva(cliente, i):
+    base = 1000 + (i * 4) % 4000
+    inicio = _INICIO_RESERVAS + timedelta(days=20 * i)
+    return cliente.post("/api/crear_reserva", json={
+        "fechainicio": f"{inicio:%Y-%m-%d}", "fechafin": f"{inicio + timedelta(days=9):%Y-%m-%d}",
+        "municipio": "Meta", "lat": "4.1", "lng": "-73.6", "participantes": [str(base + k) for k in range(4)],
+    })
+
+
+def _reportes(cliente, i):
+    return cliente.get("/api/reportes?tipo=Arbol&fechaInicio=&fechaFin=&limite=500")
+
+
+def _reportes_resumen(cliente, i):
+    return cliente.get("/api/reportes/resumen?tipo=Arbol&fuente=crudo&desglose=1")
+
+
+def _usuarios(cliente, i):
+    return cliente.get("/api/usuarios?departamento=Meta&limite=50")
+
+
+RUTAS = {
+    "login": _login,
+    "registrar_arbol": _registrar_arbol,
+    "registrar_arbol_json": _registrar_arbol_json,
+    "api_crear_reserva": _crear_reserva,
+    "api_reportes": _reportes,
+    "api_reportes_resumen": _reportes_resumen,
+    "api_usuarios": _usuarios,
+}
+
+
+# -------------------------
+# CLIENTES (en proceso o por HTTP)
+# -------------------------
+# Sesión de cada hilo: crear_reserva y usuarios requieren admin
+_SESION = {"usuario": "1000", "nombre": "brigadista", "rol": app_module.ROL_ADMIN}
+
+
+def _cliente_local():
+    cliente = app_module.app.test_client()
+    with cliente.session_transaction() as s:
+        s.update(_SESION)
+    return cliente
+
+
+# post() recibe un parámetro `json` (como el test client) que tapa al módulo
+_json_dumps = json.dumps
+
+
+class _RespuestaHttp:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class ClienteHttp:
+    """
+    Lo mínimo del test client de Flask (get/post con data o json y cabeceras) sobre una
+    conexión keep-alive. La cookie de sesión se firma con el secret_key de
+    app.py, así que el servidor debe usar el mismo FLASK_SECRET.
+    """
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self._conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=60)
+        serializador = app_module.app.session_interface.get_signing_serializer(app_module.app)
+        nombre = app_module.app.config["SESSION_COOKIE_NAME"]
+        self._cookie = f"{nombre}={serializador.dumps(_SESION)}"
+
+    def _pedir(self, metodo, ruta, cuerpo=None, tipo=None, extra=None):
+        cabeceras = {"Cookie": self._cookie, "Accept-Encoding": "identity", **(extra or {})}
+        if tipo:
+            cabeceras["Content-Type"] = tipo
+        try:
+            self._conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self._conexion.getresponse()
+            respuesta.read()
+        except (http.client.HTTPException, OSError):
+            # El servidor cerró la conexión (p. ej. max_requests): se reintenta una vez
+            self._conexion.close()
+            self._conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = self._conexion.getresponse()
+            respuesta.read()
+        if respuesta.will_close:
+            self._conexion.close()
+        return _RespuestaHttp(respuesta.status)
+
+    def get(self, ruta):
+        return self._pedir("GET", ruta)
+
+    def post(self, ruta, data=None, json=None, headers=None):
+        if json is not None:
+            return self._pedir("POST", ruta, _json_dumps(json).encode(), "application/json", headers)
+        return self._pedir("POST", ruta, urlencode(data or {}).encode(),
+                           "application/x-www-form-urlencoded", headers)
+
+
+# -------------------------
+# EJECUCIÓN
+# -------------------------
+def _percentil(valores, p):
+    if not valores:
+        return None
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _rss_mb():
+    """RSS actual del proceso según /proc/self/statm; None fuera de Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return None
+
+
+def _muestrear_rss(fin, pico):
+    """Hasta que se marque fin, guarda en pico[0] el mayor RSS visto."""
+    while not fin.wait(0.01):
+        pico[0] = max(pico[0], _rss_mb())
+
+
+def correr_escenario(ruta, peticiones, hilos, url=None):
+    hacer = RUTAS[ruta]
+    latencias = []
+    viajes = []
+    errores = 0
+    lock = threading.Lock()
+    siguiente = iter(range(peticiones))
+
+    def trabajador():
+        nonlocal errores
+        cliente = ClienteHttp(url) if url else _cliente_local()
+        propias_l, propias_v, propios_e = [], [], 0
+        while True:
+            with lock:
+                i = next(siguiente, None)
+            if i is None:
+                break
+            fakes.reiniciar_viajes()
+            inicio = time.perf_counter()
+            r = hacer(cliente, i)
+            propias_l.append((time.perf_counter() - inicio) * 1000)
+            propias_v.append(fakes.viajes())
+            if r.status_code >= 500:
+                propios_e += 1
+        with lock:
+            latencias.extend(propias_l)
+            viajes.extend(propias_v)
+            errores += propios_e
+
+    # ru_maxrss es el pico de todo el proceso: no baja entre escenarios, así
+    # que el de cada escenario se muestrea mientras corre
+    rss_inicio = None if url else _rss_mb()
+    pico, fin = [rss_inicio], threading.Event()
+    muestreo = threading.Thread(target=_muestrear_rss, args=(fin, pico), daemon=True)
+    if rss_inicio is not None:
+        muestreo.start()
+
+    inicio = time.perf_counter()
+    ts = [threading.Thread(target=trabajador) for _ in range(hilos)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    if rss_inicio is not None:
+        fin.set()
+        muestreo.join()
+        pico[0] = max(pico[0], _rss_mb())
+
+    latencias.sort()
+    return {
+        "ruta": ruta,
+        "peticiones": peticiones,
+        "errores_5xx": errores,
+        "req_s": round(peticiones / duracion, 1),
+        "p50_ms": round(_percentil(latencias, 0.50), 2),
+        "p99_ms": round(_percentil(latencias, 0.99), 2),
+        # Por HTTP los viajes ocurren en otro proceso y no se pueden contar aquí
+        "viajes_por_req": None if url else (round(sum(viajes) / len(viajes), 2) if viajes else 0),
+        "rss_pico_mb": None if rss_inicio is None else round(pico[0], 1),
+        "rss_crecimiento_mb": None if rss_inicio is None else round(pico[0] - rss_inicio, 1),
+        # ru_maxrss viene en KB en Linux (bytes en macOS)
+        "rss_pico_proceso_mb": None if url else round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("fake", "sqlite"), default="fake")
+    parser.add_argument("--filas", default="10000",
+                        help="tamaños de ARBOL separados por coma (p. ej. 10000,1000000,10000000)")
+    parser.add_argument("--rutas", default=",".join(RUTAS))
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--pool-max", type=int, default=4)
+    parser.add_argument("--latencia-ms", type=float, default=1.0, help="espera por viaje a Oracle")
+    parser.add_argument("--latencia-mongo-ms", type=float, default=2.0)
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    parser.add_argument("--url", help="medir un servidor ya levantado (bench/servidor.py) en vez del test client")
+    args = parser.parse_args(argv)
+
+    rutas = [r.strip() for r in args.rutas.split(",") if r.strip()]
+    desconocidas = [r for r in rutas if r not in RUTAS]
+    if desconocidas:
+        parser.error(f"rutas desconocidas: {', '.join(desconocidas)}")
+
+    latencia = args.latencia_ms / 1000
+    resultados = []
+    # Con --url el backend y las filas los fija el servidor (variables BENCH_*)
+    for filas in ([None] if args.url else (int(x) for x in args.filas.split(","))):
+        if not args.url:
+            pool_bench = crear_pool(args.backend, filas, latencia, args.pool_max)
+            instalar_backends(pool_bench, args.latencia_mongo_ms / 1000)
+
+        etiqueta = "http" if args.url else args.backend
+        for ruta in rutas:
+            r = correr_escenario(ruta, args.peticiones, args.hilos, url=args.url)
+            r.update(backend=etiqueta, filas=filas, hilos=args.hilos,
+                     pool_max=None if args.url else args.pool_max, url=args.url)
+            resultados.append(r)
+            print(f"{etiqueta:6} {filas or '-':>9} {ruta:18} {r['req_s']:>8} req/s  "
+                  f"p50 {r['p50_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  "
+                  f"viajes {r['viajes_por_req'] or '-':>5}  rss {r['rss_pico_mb'] or '-':>7} MB "
+                  f"(+{r['rss_crecimiento_mb'] if r['rss_crecimiento_mb'] is not None else '-'})  "
+                  f"5xx {r['errores_5xx']}", flush=True)
+
+    app_module.historial_writer.cerrar()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# bench/fakes.py
+"""
+Dobles de prueba para medir app.py sin Oracle ni Mongo.
+
+FakePool / FakeConnection / FakeCursor imitan la parte de oracledb que usa
+app.py y responden con datos sintéticos según el texto del SQL. Cada viaje a
+la "base" (execute, executemany, callproc, commit) espera `latencia` segundos
+y suma uno al contador del hilo, para poder reportar viajes por request.
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+# -------------------------
+# CONTADOR DE VIAJES (por hilo)
+# -------------------------
+_local = threading.local()
+
+
+def reiniciar_viajes():
+    _local.viajes = 0
+
+
+def viajes():
+    return getattr(_local, "viajes", 0)
+
+
+def _viaje(latencia):
+    _local.viajes = getattr(_local, "viajes", 0) + 1
+    if latencia:
+        time.sleep(latencia)
+
+
+# -------------------------
+# PIEZAS COMUNES
+# -------------------------
+class FakeVar:
+    """Equivalente mínimo de cursor.var(): guarda un valor (o lista en DML RETURNING)."""
+
+    def __init__(self, tipo=None):
+        self.tipo = tipo
+        self.valor = None
+
+    def getvalue(self, pos=0):
+        return self.valor
+
+    def setvalue(self, pos, valor):
+        self.valor = valor
+
+
+class BatchError:
+    """Lo que devuelve cursor.getbatcherrors() en oracledb."""
+
+    def __init__(self, offset, code, message):
+        self.offset = offset
+        self.code = code
+        self.full_code = f"ORA-{code:05d}"
+        self.message = f"{self.full_code}: {message}"
+
+
+# -------------------------
+# ORACLE FALSO (respuestas sintéticas)
+# -------------------------
+_DEPARTAMENTOS = ("Antioquia", "Meta", "Huila", "Cauca", "Nariño", "Boyacá")
+_DANOS = ("DB", "DM", "EB", "Q", "SD")
+_FUSTES = ("CIL", "FA", "INC", "IRR", "RT")
+
+
+class Datos:
+    """Tamaños del conjunto sintético que devuelve el Oracle falso."""
+
+    def __init__(self, arboles=10_000, usuarios=1_000):
+        self.arboles = arboles
+        self.usuarios = usuarios
+        self.base = datetime(2025, 1, 1)
+        # Contraseña guardada de todos los usuarios; el benchmark pone el hash de "clave"
+        self.contrasena = "clave"
+
+    def arbol(self, i):
+        return (
+            i, None, None, 100 + i % 900, 10 + i % 90,
+            _DANOS[i % len(_DANOS)], _FUSTES[i % len(_FUSTES)], None,
+            1 + i % 4, str(1000 + i % self.usuarios), 1 + i % 50,
+            self.base + timedelta(minutes=i),
+        )
+
+    def usuario(self, i):
+        return (str(1000 + i), f"Nombre{i}", f"Apellido{i}", _DEPARTAMENTOS[i % len(_DEPARTAMENTOS)])
+
+
+class FakeCursor:
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._filas = iter(())
+        self._errores = []
+        self.arraysize = 100
+        self.prefetchrows = 2
+        self.description = None
+        self.rowcount = 0
+
+    # --- ejecución ---
+    def execute(self, sql, binds=None, **kwargs):
+        _viaje(self._conexion.latencia)
+        self._responder(" ".join(sql.split()), binds or kwargs or {})
+
+    def executemany(self, sql, filas, batcherrors=False, **kwargs):
+        _viaje(self._conexion.latencia)
+        self._errores = []
+        self.rowcount = len(filas)
+
+    def callproc(self, nombre, params=()):
+        _viaje(self._conexion.latencia)
+
+    def getbatcherrors(self):
+        return self._errores
+
+    def var(self, tipo=None, *args, **kwargs):
+        return FakeVar(tipo)
+
+    def parse(self, sql):
+        _viaje(self._conexion.latencia)
+
+    # --- lectura ---
+    def fetchone(self):
+        return next(self._filas, None)
+
+    def fetchmany(self, size=None):
+        size = size or self.arraysize
+        out = []
+        for fila in self._filas:
+            out.append(fila)
+            if len(out) >= size:
+                break
+        return out
+
+    def fetchall(self):
+        return list(self._filas)
+
+    def __iter__(self):
+        return self._filas
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- respuestas según el SQL ---
+    def _responder(self, sql, binds):
+        datos = self._conexion.datos
+        up = sql.upper()
+        self.description = None
+
+        if "RETURNING" in up:
+            for valor in binds.values():
+                if isinstance(valor, FakeVar):
+                    valor.valor = [int(time.time() * 1000) % 1_000_000]
+            self._filas = iter(())
+        elif up.startswith(("INSERT", "UPDATE", "DELETE", "MERGE", "ALTER")):
+            self._filas = iter(())
+        elif "FROM ARBOL" in up and "GROUP BY" not in up:
+            limite = binds.get("lim") or datos.arboles
+            n = min(limite, datos.arboles)
+            self.description = [(c,) for c in _columnas(sql)]
+            self._filas = (datos.arbol(datos.arboles - k) for k in range(n))
+        elif "NRO_DOCUMENTO IN" in up:
+            self._filas = iter([(v,) for v in binds.values()])
+        elif "FROM USUARIO" in up and "NOMBRE" in up:
+            if "CONTRASENA" in up:
+                self._filas = iter([("brigadista", datos.contrasena, "brigadista", "Meta")])
+            elif "NRO_DOCUMENTO = :" in up:
+                self._filas = iter([("brigadista",)])
+            else:
+                n = min(binds.get("lim") or datos.usuarios, datos.usuarios)
+                self._filas = (datos.usuario(i) for i in range(n))
+        elif "NRO_DOCUMENTO_USUARIO IN" in up or "SELECT DISTINCT RP." in up:
+            # Cruce de fechas entre reservas: nadie está ocupado
+            self._filas = iter(())
+        elif "RESERVA_EVENTO" in up and "RESERVA_PARTICIPANTE" in up:
+            hoy = datetime.now()
+            self._filas = iter([(1, "Meta", 4.1, -73.6, hoy - timedelta(days=1), hoy + timedelta(days=5))])
+        elif "NEXTVAL" in up:
+            n = binds.get("n", 1)
+            self._filas = iter([(k + 1,) for k in range(n)])
+        else:
+            self._filas = iter(())
+
+
+def _columnas(sql):
+    m = re.search(r"SELECT\s+(.*?)\s+FROM", sql, re.IGNORECASE | re.DOTALL)
+    if not m:
+        return []
+    return [c.strip().split()[-1].split(".")[-1].upper() for c in m.group(1).split(",")]
+
+
+class FakeConnection:
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.latencia = pool.latencia
+        self.datos = pool.datos
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        _viaje(self.latencia)
+
+    def rollback(self):
+        _viaje(self.latencia)
+
+    def ping(self):
+        _viaje(self.latencia)
+
+    def close(self):
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakePool:
+    """Pool con el mismo límite de conexiones que oracledb (bloquea al llegar a max)."""
+
+    def __init__(self, latencia=0.0, max=4, datos=None):
+        self.latencia = latencia
+        self.datos = datos or Datos()
+        self.min = 1
+        self.max = max
+        self.increment = 1
+        self.stmtcachesize = 50
+        self._sem = threading.BoundedSemaphore(max)
+        self._ocupadas = 0
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self):
+        return self._ocupadas
+
+    @property
+    def opened(self):
+        return self.max
+
+    def acquire(self, *args, **kwargs):
+        self._sem.acquire()
+        with self._lock:
+            self._ocupadas += 1
+        return FakeConnection(self)
+
+    def release(self, conexion):
+        with self._lock:
+            self._ocupadas -= 1
+        self._sem.release()
+
+
+# -------------------------
+# MONGO FALSO
+# -------------------------
+class FakeCollection:
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.documentos = 0
+        self.llamadas = 0
+
+    def insert_one(self, doc):
+        self.insert_many([doc])
+
+    def insert_many(self, docs, ordered=True):
+        if self.latencia:
+            time.sleep(self.latencia)
+        self.llamadas += 1
+        self.documentos += len(docs)
+
+
+class FakeMongoDB:
+
+    def __init__(self, latencia=0.0):
+        self.historial = FakeCollection(latencia)
+
+    def __getitem__(self, nombre):
+        return getattr(self, nombre)
@@ -0,0 +1,90 @@
+# bench/servidor.py
+"""
+app.py servido de verdad (por HTTP) sobre los mismos dobles del benchmark,
+para medir el servidor y no sólo las rutas:
+
+    python -m bench.servidor                                   # servidor de desarrollo (app.run)
+    gunicorn -c gunicorn.conf.py "bench.servidor:crear_app()"  # gunicorn gthread
+
+y desde otra terminal:
+
+    python -m bench --url http://127.0.0.1:5000 --hilos 32
+
+Se configura con las mismas opciones que `python -m bench`, por entorno:
+BENCH_BACKEND (fake|sqlite), BENCH_FILAS, BENCH_LATENCIA_MS y
+BENCH_LATENCIA_MONGO_MS. El tamaño del pool es el DB_POOL_MAX de app.py, que
+gunicorn.conf.py iguala a los hilos de cada worker.
+"""
+import os
+import sqlite3
+import sys
+
+# Se importa app.py desde la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from bench import fakes  # noqa: E402
+from bench.sqlite_backend import SqlitePool, preparar_base  # noqa: E402
+
+DIR_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".datos")
+
+
+def _hashear_contrasenas(ruta_db):
+    """
+    Guarda "clave" con el HASH_METODO actual (el mismo default de producción
+    si no se define la variable) para que el login mida la verificación del
+    hash y no la migración desde texto plano.
+    """
+    db = sqlite3.connect(ruta_db)
+    with db:
+        fila = db.execute("SELECT CONTRASENA FROM USUARIO LIMIT 1").fetchone()
+        if fila and app_module.verificar_contrasena(fila[0], "clave") != (True, False):
+            db.execute("UPDATE USUARIO SET CONTRASENA = ?", (app_module.hashear_contrasena("clave"),))
+    db.close()
+
+
+def crear_pool(backend, filas, latencia, pool_max):
+    """Pool del benchmark: Oracle falso o SQLite sembrado con `filas` árboles."""
+    if backend == "sqlite":
+        os.makedirs(DIR_DATOS, exist_ok=True)
+        ruta_db = os.path.join(DIR_DATOS, f"ideam_{filas}.db")
+        print(f"Preparando {ruta_db} ...", flush=True)
+        preparar_base(ruta_db, filas)
+        _hashear_contrasenas(ruta_db)
+        return SqlitePool(ruta_db, latencia=latencia, max=pool_max)
+
+    datos = fakes.Datos(arboles=filas)
+    datos.contrasena = app_module.hashear_contrasena("clave")
+    return fakes.FakePool(latencia=latencia, max=pool_max, datos=datos)
+
+
+def instalar_backends(pool_bench, latencia_mongo):
+    """Reemplaza el pool y Mongo de app.py por los dobles del benchmark."""
+    app_module.pool = app_module.PoolInstrumentado(lambda: pool_bench)
+    db = fakes.FakeMongoDB(latencia_mongo)
+    app_module._mongo["client"] = db
+    app_module._mongo["db"] = db
+    app_module._mongo["indices"] = True   # FakeMongoDB no maneja índices
+    app_module._reservas_activas.limpiar()
+    app_module._usuarios_cache.limpiar()
+
+
+def crear_app():
+    """
+    Fábrica para gunicorn. Cada worker la llama después del fork (sin
+    preload_app), así que el pool y el Mongo falsos son propios del worker.
+    """
+    pool_bench = crear_pool(
+        os.getenv("BENCH_BACKEND", "fake"),
+        int(os.getenv("BENCH_FILAS", "10000")),
+        float(os.getenv("BENCH_LATENCIA_MS", "1")) / 1000,
+        app_module.DB_POOL_MAX,
+    )
+    instalar_backends(pool_bench, float(os.getenv("BENCH_LATENCIA_MONGO_MS", "2")) / 1000)
+    return app_module.app
+
+
+if __name__ == "__main__":
+    # Mismo servidor que `python app.py` (debug incluido), sin el reloader: éste
+    # vuelve a importar app.py en un proceso hijo sin los dobles instalados
+    crear_app().run(debug=True, use_reloader=False, host="127.0.0.1", port=int(os.getenv("PORT", "5000")))
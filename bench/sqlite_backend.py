@@ -0,0 +1,517 @@
+# bench/sqlite_backend.py
+"""
+Backend SQLite para los benchmarks: mismo esquema que usa app.py, datos
+sintéticos de 10k a 10M árboles y una traducción mínima del SQL de Oracle
+que aparece en app.py (TO_DATE, TRUNC(SYSDATE), FETCH FIRST, RETURNING INTO,
+secuencias, batcherrors, MERGE, GROUPING SETS/ROLLUP y las funciones NVL,
+NVL2, LEAST, GREATEST, TO_NUMBER, TO_CHAR y STDDEV).
+
+No pretende ser Oracle: sirve para comparar versiones de app.py entre sí
+con planes y volúmenes realistas. GROUPING SETS y ROLLUP se reescriben como
+UNION ALL de un GROUP BY por conjunto, que da las mismas filas (más lento).
+"""
+import functools
+import math
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from bench.fakes import BatchError, FakeVar, _viaje
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS USUARIO (
+    NRO_DOCUMENTO TEXT PRIMARY KEY, NOMBRE TEXT, APELLIDO TEXT,
+    CONTRASENA TEXT, DEPARTAMENTO TEXT, ROL TEXT DEFAULT 'brigadista'
+);
+CREATE TABLE IF NOT EXISTS RESERVA_EVENTO (
+    ID_RESERVA INTEGER PRIMARY KEY, FECHA_INICIO TIMESTAMP, FECHA_FIN TIMESTAMP,
+    MUNICIPIO TEXT, LATITUD REAL, LONGITUD REAL, CREADO_EN TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS RESERVA_PARTICIPANTE (
+    ID_RESERVA INTEGER, NRO_DOCUMENTO_USUARIO TEXT,
+    PRIMARY KEY (ID_RESERVA, NRO_DOCUMENTO_USUARIO)
+);
+CREATE TABLE IF NOT EXISTS ARBOL (
+    ID_ARBOL INTEGER PRIMARY KEY, NOMBRE_CIENTIFICO TEXT, NOMBRE_COMUN TEXT,
+    ALTURA REAL, DIAMETRO REAL, DANO TEXT, FORMAFUSTE TEXT, OBSERVACIONES TEXT,
+    NSUBPARCELA TEXT, NRO_DOCUMENTO TEXT, ID_RESERVA INTEGER,
+    FECHA_REGISTRO TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS PLANTA (
+    ID_PLANTA INTEGER PRIMARY KEY, TAMANO REAL, NOMBRE_COMUN TEXT, OBSERVACIONES TEXT,
+    NSUBPARCELA TEXT, ID_RESERVA INTEGER, NRO_DOCUMENTO_USUARIO TEXT, ID_BRIGADA INTEGER,
+    FECHA_REGISTRO TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+CREATE TABLE IF NOT EXISTS SYNC_REGISTRO (
+    ID_CLIENTE TEXT PRIMARY KEY, TIPO TEXT, NRO_DOCUMENTO TEXT,
+    FECHA_SYNC TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- sql/resumen.sql (DIA y ULTIMA_FECHA como TIMESTAMP para que vuelvan como datetime)
+CREATE TABLE IF NOT EXISTS RESUMEN_ARBOL (
+    ID_RESERVA INTEGER NOT NULL, NSUBPARCELA TEXT NOT NULL, DIA TIMESTAMP NOT NULL,
+    DANO TEXT NOT NULL, FORMAFUSTE TEXT NOT NULL, N INTEGER DEFAULT 0 NOT NULL,
+    N_ALTURA INTEGER DEFAULT 0 NOT NULL, SUMA_ALTURA REAL DEFAULT 0 NOT NULL,
+    SUMA_ALTURA2 REAL DEFAULT 0 NOT NULL, MIN_ALTURA REAL, MAX_ALTURA REAL,
+    N_DIAMETRO INTEGER DEFAULT 0 NOT NULL, SUMA_DIAMETRO REAL DEFAULT 0 NOT NULL,
+    SUMA_DIAMETRO2 REAL DEFAULT 0 NOT NULL, MIN_DIAMETRO REAL, MAX_DIAMETRO REAL,
+    PRIMARY KEY (ID_RESERVA, NSUBPARCELA, DIA, DANO, FORMAFUSTE)
+);
+CREATE TABLE IF NOT EXISTS RESUMEN_PLANTA (
+    ID_RESERVA INTEGER NOT NULL, NSUBPARCELA TEXT NOT NULL, DIA TIMESTAMP NOT NULL,
+    ID_BRIGADA INTEGER NOT NULL, NOMBRE_COMUN TEXT NOT NULL, CLASE_TAMANO TEXT NOT NULL,
+    N INTEGER DEFAULT 0 NOT NULL, N_TAMANO INTEGER DEFAULT 0 NOT NULL,
+    SUMA_TAMANO REAL DEFAULT 0 NOT NULL, SUMA_TAMANO2 REAL DEFAULT 0 NOT NULL,
+    MIN_TAMANO REAL, MAX_TAMANO REAL,
+    PRIMARY KEY (ID_RESERVA, NSUBPARCELA, DIA, ID_BRIGADA, NOMBRE_COMUN, CLASE_TAMANO)
+);
+CREATE TABLE IF NOT EXISTS RESUMEN_MARCA (TABLA TEXT PRIMARY KEY, ULTIMA_FECHA TIMESTAMP NOT NULL);
+CREATE INDEX IF NOT EXISTS IX_ARBOL_FECHA ON ARBOL (FECHA_REGISTRO, ID_ARBOL);
+CREATE INDEX IF NOT EXISTS IX_USUARIO_DEP ON USUARIO (DEPARTAMENTO, NOMBRE, APELLIDO);
+CREATE INDEX IF NOT EXISTS IX_RP_USUARIO ON RESERVA_PARTICIPANTE (NRO_DOCUMENTO_USUARIO, ID_RESERVA);
+"""
+
+DEPARTAMENTOS = ("Antioquia", "Meta", "Huila", "Cauca", "Nariño", "Boyacá", "Caldas", "Tolima")
+DANOS = ("DB", "DM", "EB", "Q", "SD")
+FUSTES = ("CIL", "FA", "INC", "IRR", "RT")
+
+sqlite3.register_adapter(datetime, lambda d: d.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+# -------------------------
+# TRADUCCIÓN ORACLE -> SQLITE
+# -------------------------
+_REEMPLAZOS = [
+    (re.compile(r"TO_DATE\(\s*(:\w+)\s*,\s*'YYYY-MM-DD'\s*\)\s*\+\s*1\b", re.I), r"datetime(\1, '+1 day')"),
+    (re.compile(r"TO_DATE\(\s*(:\w+)\s*,\s*'YYYY-MM-DD'\s*\)", re.I), r"datetime(\1)"),
+    (re.compile(r"\bDATE\s+'(\d{4}-\d{2}-\d{2})'", re.I), r"datetime('\1')"),
+    (re.compile(r"TO_CHAR\(\s*([\w.]+)\s*,\s*'DD/MM/YYYY'\s*\)", re.I), r"strftime('%d/%m/%Y', \1)"),
+    (re.compile(r"TO_CHAR\(\s*([\w.]+)\s*\)", re.I), r"CAST(\1 AS TEXT)"),
+    (re.compile(r"TRUNC\(\s*SYSDATE\s*\)", re.I), "datetime('now', 'localtime', 'start of day')"),
+    (re.compile(r"TRUNC\(\s*([\w.]+)\s*\)", re.I), r"datetime(\1, 'start of day')"),
+    (re.compile(r"\bSYSDATE\b", re.I), "datetime('now', 'localtime')"),
+    (re.compile(r"\bFROM\s+DUAL\b", re.I), ""),
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),  # SQLite ya serializa las escrituras
+    (re.compile(r"OFFSET\s+(:\w+)\s+ROWS\s+FETCH\s+NEXT\s+(:\w+)\s+ROWS\s+ONLY", re.I), r"LIMIT \2 OFFSET \1"),
+    (re.compile(r"FETCH\s+(?:FIRST|NEXT)\s+(:?\w+)\s+ROWS?\s+ONLY", re.I), r"LIMIT \1"),
+    (re.compile(r"SEQ_RESERVA_ID\.NEXTVAL", re.I),
+     "(SELECT COALESCE(MAX(ID_RESERVA), 0) + 1 FROM RESERVA_EVENTO)"),
+    (re.compile(r":(\d+)\b"), r"?\1"),
+]
+_RE_RETURNING = re.compile(r"\s+RETURNING\s+(\w+)\s+INTO\s+:(\w+)\s*$", re.I)
+_RE_ES_MERGE = re.compile(r"^\s*MERGE\b", re.I)
+_RE_LOCK_TABLE = re.compile(r"^\s*LOCK\s+TABLE\b", re.I)  # SQLite ya serializa las escrituras
+_RE_SECUENCIA_N = re.compile(r"NEXTVAL.*CONNECT\s+BY\s+LEVEL", re.I | re.S)
+
+
+def _partir(texto, separador=","):
+    """Divide por `separador` sólo fuera de paréntesis y de literales '...'."""
+    partes, nivel, comillas, inicio = [], 0, False, 0
+    for i, c in enumerate(texto):
+        if c == "'":
+            comillas = not comillas
+        elif comillas:
+            continue
+        elif c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+        elif c == separador and nivel == 0:
+            partes.append(texto[inicio:i].strip())
+            inicio = i + 1
+    partes.append(texto[inicio:].strip())
+    return [p for p in partes if p]
+
+
+def _normalizar(expr):
+    return " ".join(expr.split()).upper()
+
+
+def _sin_parentesis(expr):
+    expr = expr.strip()
+    return expr[1:-1].strip() if expr.startswith("(") and expr.endswith(")") else expr
+
+
+_RE_AGRUPACION = re.compile(
+    r"^SELECT\s+(?P<select>.*?)\s+FROM\s+(?P<desde>.*?)\s+GROUP\s+BY\s+"
+    r"(?P<tipo>GROUPING\s+SETS|ROLLUP)\s*\((?P<grupos>.*)\)\s*(?:ORDER\s+BY\s+(?P<orden>[^()]*))?$",
+    re.I | re.S)
+_RE_GROUPING = re.compile(r"^GROUPING\s*\((.*)\)$", re.I | re.S)
+
+
+def _traducir_agrupacion(sql):
+    """
+    GROUP BY GROUPING SETS (...) / ROLLUP (...) -> UNION ALL de un GROUP BY por
+    conjunto. En cada rama GROUPING(x) vale 0 o 1 y las columnas agrupadas que
+    no están en el conjunto salen como NULL, igual que en Oracle.
+    """
+    m = _RE_AGRUPACION.match(sql)
+    if not m:
+        return sql
+    if m.group("tipo").upper() == "ROLLUP":
+        columnas = _partir(m.group("grupos"))
+        conjuntos = [columnas[:k] for k in range(len(columnas), -1, -1)]
+    else:
+        conjuntos = [_partir(_sin_parentesis(g)) for g in _partir(m.group("grupos"))]
+    agrupadas = {_normalizar(e) for conjunto in conjuntos for e in conjunto}
+
+    ramas = []
+    for conjunto in conjuntos:
+        presentes = {_normalizar(e) for e in conjunto}
+        columnas = []
+        for item in _partir(m.group("select")):
+            g = _RE_GROUPING.match(item)
+            if g:
+                columnas.append("0" if _normalizar(g.group(1)) in presentes else "1")
+            elif _normalizar(item) in agrupadas and _normalizar(item) not in presentes:
+                columnas.append("NULL")
+            else:
+                columnas.append(item)
+        rama = f"SELECT {', '.join(columnas)} FROM {m.group('desde')}"
+        if conjunto:
+            rama += f" GROUP BY {', '.join(conjunto)}"
+        ramas.append(rama)
+
+    sql = " UNION ALL ".join(ramas)
+    if m.group("orden"):
+        # Oracle ordena los NULL (subtotales) al final en orden ascendente
+        sql += " ORDER BY " + ", ".join(f"{c} NULLS LAST" for c in _partir(m.group("orden")))
+    return sql
+
+
+@functools.lru_cache(maxsize=256)
+def traducir(sql):
+    sql = sql.strip()
+    for patron, reemplazo in _REEMPLAZOS:
+        sql = patron.sub(reemplazo, sql)
+    return _traducir_agrupacion(sql)
+
+
+_RE_MERGE = re.compile(
+    r"^MERGE\s+INTO\s+(?P<tabla>\w+)\s+(?P<alias>\w+)\s+USING\s*\((?P<fuente>.*)\)\s*(?P<s>\w+)\s+"
+    r"ON\s*\((?P<on>[^()]*)\)\s+WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+(?P<set>.*?)\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s*\((?P<columnas>[^()]*)\)\s*VALUES\s*\((?P<valores>.*)\)$",
+    re.I | re.S)
+
+
+@functools.lru_cache(maxsize=64)
+def traducir_merge(sql):
+    """
+    MERGE INTO t r USING (SELECT ...) s ON (...) WHEN MATCHED ... WHEN NOT MATCHED ...
+    -> (UPDATE t AS r SET ... FROM (SELECT ...) AS s WHERE ..., INSERT INTO t (...) SELECT ... FROM (...) AS s).
+    El cursor corre el UPDATE y, si no tocó ninguna fila, el INSERT (como el MERGE de una fila).
+    """
+    m = _RE_MERGE.match(traducir(sql))
+    if not m:
+        raise NotImplementedError(f"MERGE no soportado por el backend SQLite: {sql[:80]}")
+    alias = m.group("alias")
+    # En el SET de SQLite la columna destino va sin el alias de la tabla
+    asignaciones = [re.sub(rf"^{alias}\.", "", a) for a in _partir(m.group("set"))]
+    fuente = f"({m.group('fuente')}) AS {m.group('s')}"
+    actualizar = (f"UPDATE {m.group('tabla')} AS {alias} SET {', '.join(asignaciones)} "
+                  f"FROM {fuente} WHERE {m.group('on')}")
+    insertar = f"INSERT INTO {m.group('tabla')} ({m.group('columnas')}) SELECT {m.group('valores')} FROM {fuente}"
+    return actualizar, insertar
+
+
+# -------------------------
+# FUNCIONES DE ORACLE QUE SQLITE NO TIENE
+# -------------------------
+class _Desviacion:
+    """STDDEV de Oracle: desviación muestral, 0 con una sola fila, NULL sin filas."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def step(self, valor):
+        if valor is None:
+            return
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+
+    def finalize(self):
+        if not self.n:
+            return None
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def _a_numero(valor):
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    return float(valor)
+
+
+def _a_texto(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return None if valor is None else str(valor)
+
+
+def _extremo(funcion):
+    # LEAST/GREATEST de Oracle: NULL si algún argumento es NULL
+    return lambda *valores: None if any(v is None for v in valores) else funcion(valores)
+
+
+def registrar_funciones(db):
+    db.create_function("NVL", 2, lambda a, b: b if a is None else a, deterministic=True)
+    db.create_function("NVL2", 3, lambda a, b, c: c if a is None else b, deterministic=True)
+    db.create_function("LEAST", -1, _extremo(min), deterministic=True)
+    db.create_function("GREATEST", -1, _extremo(max), deterministic=True)
+    db.create_function("TO_NUMBER", 1, _a_numero, deterministic=True)
+    db.create_function("TO_CHAR", 1, _a_texto, deterministic=True)
+    db.create_aggregate("STDDEV", 1, _Desviacion)
+
+
+class SqliteCursor:
+
+    def __init__(self, conexion):
+        self._conexion = conexion
+        self._cur = conexion.db.cursor()
+        self._errores = []
+        self.arraysize = 100
+        self.prefetchrows = 2
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def execute(self, sql, binds=None, **kwargs):
+        _viaje(self._conexion.latencia)
+        binds = binds if binds is not None else kwargs
+
+        if _RE_SECUENCIA_N.search(sql):
+            # SELECT SEQ.NEXTVAL FROM DUAL CONNECT BY LEVEL <= :n
+            inicio = self._cur.execute("SELECT COALESCE(MAX(ID_RESERVA), 0) FROM RESERVA_EVENTO").fetchone()[0]
+            self._cur = self._conexion.db.execute(
+                "WITH RECURSIVE s(x) AS (SELECT ? UNION ALL SELECT x + 1 FROM s WHERE x < ?) SELECT x FROM s",
+                (inicio + 1, inicio + binds["n"]))
+            return
+
+        if _RE_LOCK_TABLE.match(sql):
+            return
+
+        if _RE_ES_MERGE.match(sql):
+            self._merge(traducir_merge(sql), self._limpiar(binds))
+            return
+
+        m = _RE_RETURNING.search(sql)
+        if m:
+            columna, nombre_var = m.groups()
+            sql = sql[:m.start()]
+            var = binds[nombre_var]
+            binds = {k: v for k, v in binds.items() if k != nombre_var}
+            self._cur.execute(traducir(sql), self._limpiar(binds))
+            tabla = re.search(r"INTO\s+(\w+)", sql, re.I).group(1)
+            var.valor = [self._cur.execute(f"SELECT MAX({columna}) FROM {tabla}").fetchone()[0]]
+            return
+
+        self._cur.execute(traducir(sql), self._limpiar(binds))
+
+    def executemany(self, sql, filas, batcherrors=False, **kwargs):
+        _viaje(self._conexion.latencia)
+        self._errores = []
+        es_merge = _RE_ES_MERGE.match(sql)
+        if es_merge:
+            sentencias = traducir_merge(sql)
+        else:
+            sql = traducir(sql)
+            if not batcherrors:
+                self._cur.executemany(sql, [self._limpiar(f) for f in filas])
+                return
+        for offset, fila in enumerate(filas):
+            try:
+                if es_merge:
+                    self._merge(sentencias, self._limpiar(fila))
+                else:
+                    self._cur.execute(sql, self._limpiar(fila))
+            except sqlite3.IntegrityError as e:
+                if not batcherrors:
+                    raise
+                codigo = 1 if "UNIQUE" in str(e) else 2290
+                self._errores.append(BatchError(offset, codigo, str(e)))
+
+    def _merge(self, sentencias, binds):
+        actualizar, insertar = sentencias
+        self._cur.execute(actualizar, binds)
+        if self._cur.rowcount == 0:
+            self._cur.execute(insertar, binds)
+
+    def getbatcherrors(self):
+        return self._errores
+
+    def callproc(self, nombre, params=()):
+        _viaje(self._conexion.latencia)
+        raise NotImplementedError(nombre)
+
+    def parse(self, sql):
+        _viaje(self._conexion.latencia)
+
+    def var(self, tipo=None, *args, **kwargs):
+        return FakeVar(tipo)
+
+    @staticmethod
+    def _limpiar(binds):
+        if isinstance(binds, dict):
+            return {k: (v if not isinstance(v, FakeVar) else None) for k, v in binds.items()}
+        return binds
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cur.fetchmany(size or self.arraysize)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def __iter__(self):
+        return iter(self._cur)
+
+    def close(self):
+        self._cur.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteConnection:
+
+    def __init__(self, pool, db):
+        self._pool = pool
+        self.db = db
+        self.latencia = pool.latencia
+
+    def cursor(self):
+        return SqliteCursor(self)
+
+    def commit(self):
+        _viaje(self.latencia)
+        self.db.commit()
+
+    def rollback(self):
+        _viaje(self.latencia)
+        self.db.rollback()
+
+    def ping(self):
+        _viaje(self.latencia)
+
+    def close(self):
+        self.db.rollback()
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqlitePool:
+    """Pool de `max` conexiones SQLite sobre el mismo archivo."""
+
+    def __init__(self, ruta, latencia=0.0, max=4):
+        self.latencia = latencia
+        self.min = 1
+        self.max = max
+        self.increment = 1
+        self.stmtcachesize = 50
+        self._libres = queue.Queue()
+        self._ocupadas = 0
+        self._lock = threading.Lock()
+        for _ in range(max):
+            db = sqlite3.connect(ruta, check_same_thread=False, timeout=30,
+                                 detect_types=sqlite3.PARSE_DECLTYPES)
+            db.execute("PRAGMA journal_mode=WAL")
+            registrar_funciones(db)
+            self._libres.put(db)
+
+    @property
+    def busy(self):
+        return self._ocupadas
+
+    @property
+    def opened(self):
+        return self.max
+
+    def acquire(self, *args, **kwargs):
+        db = self._libres.get()
+        with self._lock:
+            self._ocupadas += 1
+        return SqliteConnection(self, db)
+
+    def release(self, conexion):
+        with self._lock:
+            self._ocupadas -= 1
+        self._libres.put(conexion.db)
+
+
+# -------------------------
+# DATOS SINTÉTICOS
+# -------------------------
+def preparar_base(ruta, arboles, usuarios=5_000, reservas=500, lote=50_000, semilla=7):
+    """
+    Crea (o reutiliza) un archivo SQLite con `arboles` filas en ARBOL.
+    Las reservas cubren desde hace un año hasta dentro de un mes, de modo que
+    los usuarios sembrados tienen reserva vigente hoy.
+    """
+    if os.path.exists(ruta):
+        # Bases sembradas por versiones anteriores: agrega las tablas nuevas
+        db = sqlite3.connect(ruta)
+        db.executescript(ESQUEMA)
+        db.close()
+        return ruta
+
+    rnd = random.Random(semilla)
+    db = sqlite3.connect(ruta)
+    db.executescript(ESQUEMA)
+
+    db.executemany(
+        "INSERT INTO USUARIO (NRO_DOCUMENTO, NOMBRE, APELLIDO, CONTRASENA, DEPARTAMENTO) VALUES (?, ?, ?, ?, ?)",
+        ((str(1000 + i), f"Nombre{i}", f"Apellido{i}", "clave", DEPARTAMENTOS[i % len(DEPARTAMENTOS)])
+         for i in range(usuarios)))
+
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.executemany(
+        "INSERT INTO RESERVA_EVENTO VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((i, hoy - timedelta(days=365 - i % 330), hoy + timedelta(days=30),
+          DEPARTAMENTOS[i % len(DEPARTAMENTOS)], 1 + rnd.random() * 10, -77 + rnd.random() * 10, hoy)
+         for i in range(1, reservas + 1)))
+    db.executemany(
+        "INSERT INTO RESERVA_PARTICIPANTE VALUES (?, ?)",
+        ((1 + i % reservas, str(1000 + i)) for i in range(usuarios)))
+
+    inicio = hoy - timedelta(days=365)
+    paso = 365 * 24 * 3600 / max(arboles, 1)
+
+    def filas():
+        for i in range(arboles):
+            yield (
+                i + 1, None, None, round(rnd.uniform(100, 3000), 1), round(rnd.uniform(10, 120), 1),
+                rnd.choice(DANOS), rnd.choice(FUSTES), None, str(1 + i % 4),
+                str(1000 + i % usuarios), 1 + i % reservas,
+                inicio + timedelta(seconds=i * paso),
+            )
+
+    gen = filas()
+    while True:
+        bloque = [f for _, f in zip(range(lote), gen)]
+        if not bloque:
+            break
+        db.executemany("INSERT INTO ARBOL VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", bloque)
+    db.commit()
+    db.close()
+    return ruta
@@ -0,0 +1,62 @@
+# gunicorn.conf.py
+"""
+Modo de alta concurrencia: gunicorn con workers gthread.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Cada request sigue siendo síncrono (oracledb y pymongo bloquean el hilo),
+pero cada worker atiende GUNICORN_THREADS requests a la vez y el pool de
+Oracle del worker tiene exactamente esa cantidad de conexiones: ningún hilo
+espera conexión y no sobran sesiones abiertas. En total la app abre
+GUNICORN_WORKERS x GUNICORN_THREADS sesiones de Oracle, que deben caber en
+el PROCESSES/SESSIONS de la base.
+
+Las cachés en memoria de app.py son de cada worker y una escritura sólo
+invalida la del worker que la atendió: en los demás, una reserva nueva se ve
+a lo sumo RESERVAS_CACHE_TTL segundos después y un usuario nuevo en las listas
+por departamento, USUARIOS_CACHE_TTL (60 por defecto ambas).
+
+Todo se puede ajustar por variables de entorno (GUNICORN_*, DB_POOL_*).
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Un worker por CPU: los hilos ya cubren la espera de Oracle/Mongo y el GIL
+# limita lo que un proceso puede aprovechar de la CPU (hash del login, JSON)
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Pool por worker = hilos por worker (app.py lee DB_POOL_* al importarse,
+# así que tiene que quedar en el entorno antes de cargar la app)
+os.environ.setdefault("DB_POOL_MAX", str(threads))
+os.environ.setdefault("DB_POOL_MIN", str(min(2, threads)))
+# Con pool == hilos no debería haber espera; si la hay, que falle rápido
+os.environ.setdefault("DB_POOL_WAIT_TIMEOUT", "2000")
+
+# Sin preload por defecto: cada worker importa app.py y crea su pool, su
+# cliente Mongo y su hilo de historial. Con preload también funciona, porque
+# reiniciar_recursos() suelta lo heredado del master después del fork
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Reciclar workers de vez en cuando acota fugas de memoria; el jitter evita
+# que todos se reinicien a la vez
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+# GUNICORN_ACCESSLOG vacío apaga el log de accesos
+accesslog = os.getenv("GUNICORN_ACCESSLOG", "-") or None
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def worker_exit(server, worker):
+    """Vacía la cola del historial antes de que el worker termine."""
+    app_module = sys.modules.get("app")
+    if app_module is not None:
+        app_module.historial_writer.cerrar()
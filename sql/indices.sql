@@ -0,0 +1,31 @@
+-- Índices de apoyo para las consultas de app.py.
+
+-- /api/usuarios?departamento=...  filtra con UPPER(DEPARTAMENTO) = UPPER(:dep);
+-- un índice normal sobre DEPARTAMENTO no sirve para esa expresión, así que se
+-- indexa la expresión misma (índice basado en función). NOMBRE y APELLIDO van
+-- detrás para que el ORDER BY salga del índice.
+CREATE INDEX IX_USUARIO_DEP_UPPER ON USUARIO (UPPER(DEPARTAMENTO), NOMBRE, APELLIDO);
+
+-- /api/usuarios?q=...  búsqueda por prefijo del nombre (UPPER(NOMBRE) LIKE 'ANA%').
+CREATE INDEX IX_USUARIO_NOMBRE_UPPER ON USUARIO (UPPER(NOMBRE));
+
+-- Cruce de reservas por participante (api_crear_reserva, /api/usuarios/disponibilidad):
+-- de cada documento se llega a sus reservas y de ahí a las fechas sin tocar
+-- las tablas; la condición es FECHA_INICIO <= :fin AND FECHA_FIN >= :inicio.
+CREATE INDEX IX_PARTICIPANTE_USUARIO ON RESERVA_PARTICIPANTE (NRO_DOCUMENTO_USUARIO, ID_RESERVA);
+CREATE INDEX IX_RESERVA_FECHAS ON RESERVA_EVENTO (ID_RESERVA, FECHA_INICIO, FECHA_FIN);
+
+-- /api/usuarios?libres_desde=...: reservas que se cruzan con un rango
+CREATE INDEX IX_RESERVA_INICIO_FIN ON RESERVA_EVENTO (FECHA_INICIO, FECHA_FIN, ID_RESERVA);
+
+-- /api/reservas/<id>/estadisticas: todos los árboles de una reserva con sólo
+-- las columnas que usa el cálculo; la consulta se resuelve desde el índice.
+CREATE INDEX IX_ARBOL_RESERVA_STATS ON ARBOL (ID_RESERVA, NSUBPARCELA, DIAMETRO, ALTURA, DANO);
+
+-- Refresco del índice de reservas cercanas: las creadas desde la última marca
+CREATE INDEX IX_RESERVA_CREADO ON RESERVA_EVENTO (CREADO_EN);
+
+-- /api/reportes: orden y cursor por (NVL(FECHA_REGISTRO, DATE '1900-01-01'), ID)
+-- descendente (el recálculo de los resúmenes filtra por la misma expresión); la expresión debe coincidir con _SQL_FECHA_REGISTRO de app.py.
+CREATE INDEX IX_ARBOL_REPORTE ON ARBOL (NVL(FECHA_REGISTRO, DATE '1900-01-01'), ID_ARBOL);
+CREATE INDEX IX_PLANTA_REPORTE ON PLANTA (NVL(FECHA_REGISTRO, DATE '1900-01-01'), ID_PLANTA);
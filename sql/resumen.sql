@@ -0,0 +1,110 @@
+-- Resúmenes materializados para el tablero de reportes.
+-- app.py los actualiza con un MERGE en la misma transacción de cada árbol/planta
+-- registrado y el comando `flask actualizar-resumen` (o el hilo periódico con
+-- RESUMEN_INTERVALO) recalcula los días desde la última marca para corregir
+-- cualquier diferencia. Las llaves no admiten NULL: se guarda 'SIN DATO'.
+
+CREATE TABLE RESUMEN_ARBOL (
+    ID_RESERVA      NUMBER        NOT NULL,
+    NSUBPARCELA     VARCHAR2(30)  NOT NULL,
+    DIA             DATE          NOT NULL,
+    DANO            VARCHAR2(10)  NOT NULL,
+    FORMAFUSTE      VARCHAR2(10)  NOT NULL,
+    N               NUMBER        DEFAULT 0 NOT NULL,
+    N_ALTURA        NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_ALTURA     NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_ALTURA2    NUMBER        DEFAULT 0 NOT NULL,
+    MIN_ALTURA      NUMBER,
+    MAX_ALTURA      NUMBER,
+    N_DIAMETRO      NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_DIAMETRO   NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_DIAMETRO2  NUMBER        DEFAULT 0 NOT NULL,
+    MIN_DIAMETRO    NUMBER,
+    MAX_DIAMETRO    NUMBER,
+    CONSTRAINT PK_RESUMEN_ARBOL PRIMARY KEY (ID_RESERVA, NSUBPARCELA, DIA, DANO, FORMAFUSTE)
+);
+CREATE INDEX IX_RESUMEN_ARBOL_DIA ON RESUMEN_ARBOL (DIA);
+
+CREATE TABLE RESUMEN_PLANTA (
+    ID_RESERVA      NUMBER        NOT NULL,
+    NSUBPARCELA     VARCHAR2(30)  NOT NULL,
+    DIA             DATE          NOT NULL,
+    ID_BRIGADA      NUMBER        NOT NULL,
+    NOMBRE_COMUN    VARCHAR2(50)  NOT NULL,
+    CLASE_TAMANO    VARCHAR2(10)  NOT NULL,
+    N               NUMBER        DEFAULT 0 NOT NULL,
+    N_TAMANO        NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_TAMANO     NUMBER        DEFAULT 0 NOT NULL,
+    SUMA_TAMANO2    NUMBER        DEFAULT 0 NOT NULL,
+    MIN_TAMANO      NUMBER,
+    MAX_TAMANO      NUMBER,
+    CONSTRAINT PK_RESUMEN_PLANTA PRIMARY KEY (ID_RESERVA, NSUBPARCELA, DIA, ID_BRIGADA, NOMBRE_COMUN, CLASE_TAMANO)
+);
+CREATE INDEX IX_RESUMEN_PLANTA_DIA ON RESUMEN_PLANTA (DIA);
+
+-- Hasta qué FECHA_REGISTRO llegó el último recálculo de cada tabla
+CREATE TABLE RESUMEN_MARCA (
+    TABLA          VARCHAR2(30) PRIMARY KEY,
+    ULTIMA_FECHA   DATE NOT NULL
+);
+
+-- Los reportes crudos filtran por FECHA_REGISTRO; el recálculo, por
+-- NVL(FECHA_REGISTRO, DATE '1900-01-01'), que indexa sql/indices.sql
+CREATE INDEX IX_ARBOL_FECHA ON ARBOL (FECHA_REGISTRO, ID_ARBOL);
+CREATE INDEX IX_PLANTA_FECHA ON PLANTA (FECHA_REGISTRO);
+
+-- Carga inicial desde las tablas crudas (lo mismo que `flask actualizar-resumen
+-- --completo`). Correrla antes de desplegar la versión de app.py que suma con
+-- MERGE, o con la app detenida: si no, una fila insertada en medio queda
+-- contada dos veces. Mientras RESUMEN_MARCA no tenga la fila de una tabla,
+-- /api/reportes/resumen responde desde la tabla cruda (fuente=crudo).
+-- Los INSERT son los de _SQL_RECALCULO en app.py con :desde = DATE '1900-01-01'
+-- (las filas sin FECHA_REGISTRO van a ese día); si cambia uno hay que cambiar
+-- el otro, tests/test_resumen.py verifica que coincidan.
+INSERT INTO RESUMEN_ARBOL (
+    ID_RESERVA, NSUBPARCELA, DIA, DANO, FORMAFUSTE, N,
+    N_ALTURA, SUMA_ALTURA, SUMA_ALTURA2, MIN_ALTURA, MAX_ALTURA,
+    N_DIAMETRO, SUMA_DIAMETRO, SUMA_DIAMETRO2, MIN_DIAMETRO, MAX_DIAMETRO
+)
+SELECT NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), NVL(TRUNC(FECHA_REGISTRO), DATE '1900-01-01'),
+       NVL(DANO, 'SIN DATO'), NVL(FORMAFUSTE, 'SIN DATO'), COUNT(*),
+       COUNT(ALTURA), NVL(SUM(ALTURA), 0), NVL(SUM(ALTURA * ALTURA), 0), MIN(ALTURA), MAX(ALTURA),
+       COUNT(DIAMETRO), NVL(SUM(DIAMETRO), 0), NVL(SUM(DIAMETRO * DIAMETRO), 0), MIN(DIAMETRO), MAX(DIAMETRO)
+FROM ARBOL
+WHERE NVL(FECHA_REGISTRO, DATE '1900-01-01') >= DATE '1900-01-01'
+GROUP BY NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), NVL(TRUNC(FECHA_REGISTRO), DATE '1900-01-01'),
+         NVL(DANO, 'SIN DATO'), NVL(FORMAFUSTE, 'SIN DATO');
+
+INSERT INTO RESUMEN_PLANTA (
+    ID_RESERVA, NSUBPARCELA, DIA, ID_BRIGADA, NOMBRE_COMUN, CLASE_TAMANO, N,
+    N_TAMANO, SUMA_TAMANO, SUMA_TAMANO2, MIN_TAMANO, MAX_TAMANO
+)
+SELECT NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), NVL(TRUNC(FECHA_REGISTRO), DATE '1900-01-01'),
+       NVL(ID_BRIGADA, 0), NVL(NOMBRE_COMUN, 'SIN DATO'),
+       CASE WHEN TAMANO IS NULL THEN 'SIN DATO'
+           WHEN TAMANO < 10 THEN '<10'
+           WHEN TAMANO < 50 THEN '10-50'
+           WHEN TAMANO < 100 THEN '50-100'
+           WHEN TAMANO < 200 THEN '100-200'
+           ELSE '>=200' END, COUNT(*),
+       COUNT(TAMANO), NVL(SUM(TAMANO), 0), NVL(SUM(TAMANO * TAMANO), 0), MIN(TAMANO), MAX(TAMANO)
+FROM PLANTA
+WHERE NVL(FECHA_REGISTRO, DATE '1900-01-01') >= DATE '1900-01-01'
+GROUP BY NVL(ID_RESERVA, 0), NVL(TO_CHAR(NSUBPARCELA), 'SIN DATO'), NVL(TRUNC(FECHA_REGISTRO), DATE '1900-01-01'),
+         NVL(ID_BRIGADA, 0), NVL(NOMBRE_COMUN, 'SIN DATO'),
+         CASE WHEN TAMANO IS NULL THEN 'SIN DATO'
+              WHEN TAMANO < 10 THEN '<10'
+              WHEN TAMANO < 50 THEN '10-50'
+              WHEN TAMANO < 100 THEN '50-100'
+              WHEN TAMANO < 200 THEN '100-200'
+              ELSE '>=200' END;
+
+INSERT INTO RESUMEN_MARCA (TABLA, ULTIMA_FECHA) VALUES ('ARBOL', SYSDATE);
+INSERT INTO RESUMEN_MARCA (TABLA, ULTIMA_FECHA) VALUES ('PLANTA', SYSDATE);
+COMMIT;
+
+-- RESUMEN_PLANTA creada antes de agregar ID_BRIGADA: se recrea y se recalcula
+-- todo con `flask actualizar-resumen --completo`.
+--   DROP TABLE RESUMEN_PLANTA;
+--   DELETE FROM RESUMEN_MARCA WHERE TABLA = 'PLANTA';
+--   (CREATE TABLE RESUMEN_PLANTA de arriba)
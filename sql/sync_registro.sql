@@ -0,0 +1,11 @@
+-- Registro de idempotencia para /api/sync (carga de datos tomados sin señal).
+-- Cada árbol/planta trae un id generado en el dispositivo (ID_CLIENTE, p. ej. un UUID);
+-- si el mismo lote se reenvía, el INSERT aquí choca con la PK y el registro se
+-- reporta como duplicado en lugar de crearse otra vez.
+CREATE TABLE SYNC_REGISTRO (
+    ID_CLIENTE     VARCHAR2(64)  NOT NULL,
+    TIPO           VARCHAR2(10)  NOT NULL,   -- 'arbol' | 'planta'
+    NRO_DOCUMENTO  VARCHAR2(20)  NOT NULL,
+    FECHA_SYNC     DATE DEFAULT SYSDATE NOT NULL,
+    CONSTRAINT PK_SYNC_REGISTRO PRIMARY KEY (ID_CLIENTE)
+);
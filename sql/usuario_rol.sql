@@ -0,0 +1,11 @@
+-- Login en un solo viaje: el rol vive en USUARIO y la contraseña se guarda
+-- con hash de werkzeug (p. ej. "scrypt:32768:8:1$sal$hash", ~160 caracteres).
+-- Las contraseñas en texto plano existentes se convierten a hash en el
+-- siguiente login de cada usuario; SP_LOGIN_USUARIO ya no se usa.
+
+ALTER TABLE USUARIO ADD (ROL VARCHAR2(20) DEFAULT 'brigadista' NOT NULL);
+ALTER TABLE USUARIO MODIFY (CONTRASENA VARCHAR2(255));
+
+-- Antes el administrador se reconocía por NOMBRE = 'admin'
+UPDATE USUARIO SET ROL = 'admin' WHERE LOWER(NOMBRE) = 'admin';
+COMMIT;
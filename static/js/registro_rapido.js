@@ -0,0 +1,69 @@
+// static/js/registro_rapido.js
+// Envío rápido de los formularios de campo (árbol / planta): los formularios
+// con data-envio-json se mandan por fetch pidiendo JSON, y el servidor responde
+// sólo {ok, mensaje | error} en vez de volver a renderizar la página completa.
+// Sin JavaScript (o si fetch falla por red) el formulario se envía como siempre.
+(function () {
+  function mostrarEstado(caja, ok, texto) {
+    if (!caja) return;
+    caja.hidden = false;
+    caja.textContent = texto;
+    caja.style.cssText = ok
+      ? "background-color:#e6ffed; color:#0b5; padding:10px; border-radius:8px; margin-bottom:12px;"
+      : "background-color:#ffcccc; color:#a00; padding:10px; border-radius:8px; margin-bottom:12px;";
+  }
+
+  // Limpia los campos del ejemplar pero conserva los marcados con data-conservar
+  // (la subparcela), que no cambian entre un registro y el siguiente
+  function limpiar(form) {
+    const conservados = Array.from(form.querySelectorAll("[data-conservar]"))
+      .map(function (campo) { return [campo, campo.value]; });
+    form.reset();
+    conservados.forEach(function (par) { par[0].value = par[1]; });
+    const primero = form.querySelector("input, select, textarea");
+    if (primero) primero.focus();
+  }
+
+  document.querySelectorAll("form[data-envio-json]").forEach(function (form) {
+    const caja = document.getElementById("estadoEnvio");
+    const boton = form.querySelector("button[type=submit]");
+
+    // Se registra después de la validación en línea de cada plantilla (defer),
+    // así que si ésta canceló el envío no se hace nada
+    form.addEventListener("submit", async function (e) {
+      if (e.defaultPrevented) return;
+      e.preventDefault();
+      if (boton) boton.disabled = true;
+
+      let respuesta;
+      try {
+        respuesta = await fetch(form.action, {
+          method: "POST",
+          body: new FormData(form),
+          headers: { "Accept": "application/json" },
+          credentials: "same-origin",
+        });
+      } catch (err) {
+        // Sin conexión con el servidor: envío tradicional (recarga la página)
+        if (boton) boton.disabled = false;
+        form.submit();
+        return;
+      }
+
+      let datos = {};
+      try {
+        datos = await respuesta.json();
+      } catch (err) {
+        datos = { ok: false, error: "Respuesta inesperada del servidor (" + respuesta.status + ")" };
+      }
+      if (boton) boton.disabled = false;
+
+      if (respuesta.status === 401) {
+        window.location.href = datos.redirigir || "/login";
+        return;
+      }
+      mostrarEstado(caja, !!datos.ok, datos.ok ? datos.mensaje : datos.error);
+      if (datos.ok) limpiar(form);
+    });
+  });
+})();
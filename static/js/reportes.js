@@ -1,55 +1,116 @@
 document.getElementById("btnAplicar").addEventListener("click", cargarReporte);
 
+const TAMANO_PAGINA = 500;
+
+// Columnas de la tabla y gráficas (campo del resumen + título) por tipo de reporte
+const REPORTES = {
+    Arbol: {
+        columnas: [
+            "ID_ARBOL",
+            "NOMBRE_CIENTIFICO",
+            "NOMBRE_COMUN",
+            "ALTURA",
+            "DIAMETRO",
+            "DANO",
+            "FORMAFUSTE",
+            "OBSERVACIONES",
+            "NSUBPARCELA",
+            "NRO_DOCUMENTO",
+            "ID_RESERVA",
+            "FECHA_REGISTRO"
+        ],
+        graficas: [
+            ["dano", "Porcentaje de Tipo de Daño"],
+            ["formafuste", "Porcentaje de Forma del Fuste"]
+        ]
+    },
+    Planta: {
+        columnas: [
+            "ID_PLANTA",
+            "NOMBRE_COMUN",
+            "TAMANO",
+            "OBSERVACIONES",
+            "NSUBPARCELA",
+            "ID_RESERVA",
+            "NRO_DOCUMENTO_USUARIO",
+            "ID_BRIGADA",
+            "FECHA_REGISTRO"
+        ],
+        graficas: [
+            ["nombre_comun", "Porcentaje por Nombre Común"],
+            ["clase_tamano", "Porcentaje por Clase de Tamaño (cm)"]
+        ]
+    }
+};
+
 async function cargarReporte() {
     const tipo = document.getElementById("tipoReporte").value;
     const inicio = document.getElementById("fechaInicio").value;
     const fin = document.getElementById("fechaFin").value;
+    const reserva = document.getElementById("idReserva").value;
+    const brigada = document.getElementById("idBrigada").value;
 
-    if (tipo !== "Arbol") {
-        alert("Solo está habilitado el reporte de Árboles.");
+    const config = REPORTES[tipo];
+    if (!config) {
+        alert("Seleccione un tipo de reporte.");
         return;
     }
 
-    const url = `/api/reportes?tipo=${tipo}&fechaInicio=${inicio}&fechaFin=${fin}`;
+    const params = new URLSearchParams({ tipo, fechaInicio: inicio, fechaFin: fin });
+    if (reserva) params.set("reserva", reserva);
+    if (brigada && tipo === "Planta") params.set("brigada", brigada);
+    const filtros = params.toString();
 
-    const respuesta = await fetch(url);
-    const datos = await respuesta.json();
+    // ← ← LAS DOS GRÁFICAS: sólo necesitan los conteos agregados en el servidor,
+    // así que se dibujan sin esperar a que termine de cargar la tabla
+    fetch(`/api/reportes/resumen?${filtros}`)
+        .then(r => r.json())
+        .then(resumen => { if (!resumen.error) generarGraficas(config, resumen); });
 
-    if (!datos.tabla || datos.tabla.length === 0) {
-        document.getElementById("tablaResultados").innerHTML = "<p>No hay datos para mostrar.</p>";
-        return;
-    }
+    // Se carga por páginas: la tabla se va llenando sin esperar todo el rango
+    let cantidad = 0;
+    let cursor = null;
+    document.getElementById("tablaResultados").innerHTML = "<p>Cargando...</p>";
 
-    mostrarTablaArboles(datos.tabla);
+    do {
+        let url = `/api/reportes?${filtros}&limite=${TAMANO_PAGINA}`;
+        if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
 
-    // ← ← GENERAMOS LAS DOS GRÁFICAS
-    generarGraficas(datos.tabla);
-}
+        const respuesta = await fetch(url);
+        const datos = await respuesta.json();
 
+        if (datos.error) {
+            document.getElementById("tablaResultados").innerHTML = `<p>${datos.error}</p>`;
+            return;
+        }
+
+        if (cantidad === 0 && datos.tabla.length > 0) prepararTabla(config.columnas);
+        agregarFilas(config.columnas, datos.tabla);
+        cantidad += datos.tabla.length;
+        cursor = datos.siguiente;
+    } while (cursor);
+
+    if (cantidad === 0) {
+        document.getElementById("tablaResultados").innerHTML = "<p>No hay datos para mostrar.</p>";
+    }
+}
 
-function mostrarTablaArboles(registros) {
-    const columnas = [
-        "ID_ARBOL",
-        "NOMBRE_CIENTIFICO",
-        "NOMBRE_COMUN",
-        "ALTURA",
-        "DIAMETRO",
-        "DANO",
-        "FORMAFUSTE",
-        "OBSERVACIONES",
-        "NSUBPARCELA",
-        "NRO_DOCUMENTO",
-        "ID_RESERVA",
-        "FECHA_REGISTRO"
-    ];
 
+function prepararTabla(columnas) {
     let html = "<table><thead><tr>";
 
     columnas.forEach(col => {
         html += `<th>${col}</th>`;
     });
 
-    html += "</tr></thead><tbody>";
+    html += "</tr></thead><tbody id=\"cuerpoResultados\"></tbody></table>";
+
+    document.getElementById("tablaResultados").innerHTML = html;
+}
+
+// Agrega sólo las filas nuevas de cada página (no se redibuja la tabla completa)
+function agregarFilas(columnas, registros) {
+    let html = "";
 
     registros.forEach(row => {
         html += "<tr>";
@@ -59,68 +120,31 @@ function mostrarTablaArboles(registros) {
         html += "</tr>";
     });
 
-    html += "</tbody></table>";
-
-    document.getElementById("tablaResultados").innerHTML = html;
+    document.getElementById("cuerpoResultados")?.insertAdjacentHTML("beforeend", html);
 }
 
 let graficoDanio = null;
 let graficoFuste = null;
 
-function generarGraficas(registros) {
-    generarGraficaDanio(registros);
-    generarGraficaFuste(registros);
+function generarGraficas(config, resumen) {
+    const [[campo1, titulo1], [campo2, titulo2]] = config.graficas;
+    document.getElementById("tituloGrafico1").textContent = titulo1;
+    document.getElementById("tituloGrafico2").textContent = titulo2;
+    graficoDanio = generarGraficaPastel(graficoDanio, "graficoDanio", resumen[campo1] || {});
+    graficoFuste = generarGraficaPastel(graficoFuste, "graficoFuste", resumen[campo2] || {});
 }
 
-/* -------------------------
-   📌 GRÁFICA: TIPOS DE DAÑO
-   ------------------------- */
-function generarGraficaDanio(registros) {
-    const conteo = {};
-
-    registros.forEach(r => {
-        const d = r.DANO || "SIN DATO";
-        conteo[d] = (conteo[d] || 0) + 1;
-    });
-
-    const labels = Object.keys(conteo);
-    const valores = Object.values(conteo);
-
-    if (graficoDanio) graficoDanio.destroy();
-
-    graficoDanio = new Chart(document.getElementById("graficoDanio"), {
-        type: "pie",
-        data: {
-            labels: labels,
-            datasets: [
-                {
-                    data: valores
-                }
-            ]
-        },
-        options: {
-            responsive: true
-        }
-    });
-}
-
-/* ----------------------------
-   📌 GRÁFICA: FORMA DEL FUSTE
-   ---------------------------- */
-function generarGraficaFuste(registros) {
-    const conteo = {};
-
-    registros.forEach(r => {
-        const f = r.FORMAFUSTE || "SIN DATO";
-        conteo[f] = (conteo[f] || 0) + 1;
-    });
-
+/* ------------------------------------------------
+   📌 GRÁFICA DE PASTEL (daño / fuste, o nombre común / tamaño)
+   conteo = { "SD": 10, "DB": 3, ... } ya agregado por el servidor
+   ------------------------------------------------ */
+function generarGraficaPastel(grafico, idCanvas, conteo) {
     const labels = Object.keys(conteo);
     const valores = Object.values(conteo);
 
-    if (graficoFuste) graficoFuste.destroy();
+    if (grafico) grafico.destroy();
 
-    graficoFuste = new Chart(document.getElementById("graficoFuste"), {
+    return new Chart(document.getElementById(idCanvas), {
         type: "pie",
         data: {
             labels: labels,
@@ -0,0 +1,68 @@
+# tests/conftest.py
+"""
+Fixtures de las pruebas: app.py sobre el backend SQLite del benchmark (o el
+Oracle falso de bench/fakes.py), sin Oracle ni Mongo reales.
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+# Hash barato para que los logins de las pruebas no tarden (se lee al importar app.py)
+os.environ.setdefault("HASH_METODO", "pbkdf2:sha256:1000")
+os.environ.setdefault("DB_PRECALENTAR", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import app as app_module  # noqa: E402
+from bench.servidor import instalar_backends  # noqa: E402
+from bench.sqlite_backend import SqlitePool, preparar_base  # noqa: E402
+
+
+def _limpiar_caches():
+    for cache in (app_module._reservas_activas, app_module._usuarios_cache, app_module._fragmentos,
+                  app_module._estadisticas_cache, app_module._intentos_fallidos):
+        cache.limpiar()
+    app_module.indice_reservas.descartar()
+    app_module._resumen_cargado.clear()
+
+
+@pytest.fixture
+def ruta_db(tmp_path):
+    """Base SQLite chica sembrada: 50 usuarios, 10 reservas vigentes y 400 árboles."""
+    return preparar_base(str(tmp_path / "ideam.db"), arboles=400, usuarios=50, reservas=10)
+
+
+@pytest.fixture
+def app_sqlite(ruta_db):
+    instalar_backends(SqlitePool(ruta_db, max=2), latencia_mongo=0)
+    _limpiar_caches()
+    app_module.app.config["TESTING"] = True
+    yield app_module
+    _limpiar_caches()
+
+
+def _cliente(usuario, rol, nombre="brigadista"):
+    cliente = app_module.app.test_client()
+    with cliente.session_transaction() as s:
+        s.update({"usuario": usuario, "nombre": nombre, "rol": rol})
+    return cliente
+
+
+@pytest.fixture
+def cliente(app_sqlite):
+    """Brigadista 1000 (participa en la reserva 1, vigente hoy)."""
+    return _cliente("1000", "brigadista")
+
+
+@pytest.fixture
+def admin(app_sqlite):
+    return _cliente("1001", app_module.ROL_ADMIN, nombre="admin")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _cerrar_historial():
+    yield
+    app_module.historial_writer.cerrar()
@@ -0,0 +1,26 @@
+# tests/test_estaticos.py
+"""Variantes WebP de static/img: la página que las elige por Accept lleva Vary: Accept."""
+import shutil
+
+
+def test_vary_accept_con_variante_webp(app_sqlite, tmp_path, monkeypatch):
+    estaticos = tmp_path / "static"
+    shutil.copytree(app_sqlite.app.static_folder, estaticos,
+                    ignore=shutil.ignore_patterns("opt"))
+    (estaticos / "img" / "opt").mkdir(exist_ok=True)
+    (estaticos / "img" / "opt" / "Fondo.webp").write_bytes(b"RIFF....WEBP")
+    monkeypatch.setattr(app_sqlite.app, "static_folder", str(estaticos))
+
+    cliente = app_sqlite.app.test_client()
+    con_webp = cliente.get("/login", headers={"Accept": "text/html,image/webp,*/*"})
+    sin_webp = cliente.get("/login", headers={"Accept": "text/html,*/*"})
+
+    assert "img/opt/Fondo.webp" in con_webp.get_data(as_text=True)
+    assert "img/opt/Fondo.webp" not in sin_webp.get_data(as_text=True)
+    assert "Accept" in con_webp.vary and "Accept" in sin_webp.vary
+
+
+def test_sin_variante_no_agrega_vary(app_sqlite):
+    respuesta = app_sqlite.app.test_client().get("/login")
+    assert respuesta.status_code == 200
+    assert "Accept" not in respuesta.vary
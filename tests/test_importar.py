@@ -0,0 +1,52 @@
+# tests/test_importar.py
+"""/api/usuarios/importar: alta masiva por CSV con errores por fila."""
+import io
+import sqlite3
+
+CSV = (
+    "nro_documento,nombre,apellido,contrasena,departamento,rol\n"
+    "9001,Ana,Pérez,secreta1,meta,\n"                 # departamento sin mayúscula
+    "9002,Luis,Gómez,secreta2,Nariño,admin\n"
+    "9001,Ana,Otra,secreta3,Meta,\n"                  # repetido en el archivo
+    "1000,Ya,Existe,secreta4,Meta,\n"                 # ya está en USUARIO
+    "9003,Sin,Depto,secreta5,Atlantida,\n"            # departamento desconocido
+    "9004,,Vacío,secreta6,Meta,\n"                    # falta el nombre
+    "9005,Rol,Raro,secreta7,Meta,jefe\n"
+)
+
+
+def _importar(cliente, texto, **params):
+    return cliente.post("/api/usuarios/importar", query_string=params,
+                        data={"archivo": (io.BytesIO(texto.encode("utf-8")), "usuarios.csv")},
+                        content_type="multipart/form-data")
+
+
+def test_importar_csv(app_sqlite, ruta_db, admin):
+    r = _importar(admin, CSV, lote="1")
+    assert r.status_code == 201
+    datos = r.get_json()
+    assert datos["insertados"] == 2 and datos["ok"] is False
+    assert [(e["fila"], e["nro_documento"]) for e in datos["errores"]] == [
+        (4, "9001"), (5, "1000"), (6, "9003"), (7, "9004"), (8, "9005")]
+    assert datos["errores"][1]["error"] == "Documento ya registrado"
+
+    db = sqlite3.connect(ruta_db)
+    filas = dict((nro, (dep, rol)) for nro, dep, rol in db.execute(
+        "SELECT NRO_DOCUMENTO, DEPARTAMENTO, ROL FROM USUARIO WHERE NRO_DOCUMENTO IN ('9001', '9002')"))
+    db.close()
+    assert filas == {"9001": ("Meta", "brigadista"), "9002": ("Nariño", "admin")}
+
+    # Las contraseñas quedan con hash y sirven para entrar
+    login = app_sqlite.app.test_client().post("/login", data={"nro_documento": "9002", "contrasena": "secreta2"})
+    assert login.status_code == 302 and login.headers["Location"].endswith("/index2")
+
+
+def test_importar_como_texto_csv(app_sqlite, admin):
+    r = admin.post("/api/usuarios/importar", data=CSV.splitlines()[0] + "\n9010,Eva,Ruiz,x,Huila\n",
+                   content_type="text/csv")
+    assert r.status_code == 201 and r.get_json() == {"insertados": 1, "errores": [], "ok": True}
+
+
+def test_importar_sin_archivo(app_sqlite, admin, cliente):
+    assert admin.post("/api/usuarios/importar", json={}).status_code == 400
+    assert _importar(cliente, CSV).status_code == 403
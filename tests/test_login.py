@@ -0,0 +1,64 @@
+# tests/test_login.py
+"""Login: bloqueo tras LOGIN_MAX_INTENTOS fallos, re-hash de contraseñas heredadas y requiere_admin."""
+import sqlite3
+
+import app as app_module
+
+
+def _login(cliente, nro, contrasena):
+    return cliente.post("/login", data={"nro_documento": nro, "contrasena": contrasena})
+
+
+def test_bloqueo_tras_intentos_fallidos(app_sqlite):
+    cliente = app_module.app.test_client()
+    for _ in range(app_module.LOGIN_MAX_INTENTOS):
+        assert _login(cliente, "1005", "mala").status_code == 200
+    # Bloqueado aunque ahora la contraseña sea la correcta
+    assert _login(cliente, "1005", "clave").status_code == 429
+    # Otro documento no se ve afectado
+    assert _login(cliente, "1006", "clave").status_code == 302
+
+
+def test_login_correcto_reinicia_fallos(app_sqlite):
+    cliente = app_module.app.test_client()
+    for _ in range(app_module.LOGIN_MAX_INTENTOS - 1):
+        _login(cliente, "1005", "mala")
+    assert _login(cliente, "1005", "clave").status_code == 302
+    assert _login(cliente, "1005", "mala").status_code == 200
+    assert _login(cliente, "1005", "clave").status_code == 302
+
+
+def test_contrasena_heredada_se_rehashea(app_sqlite, ruta_db):
+    assert _login(app_module.app.test_client(), "1007", "clave").status_code == 302
+    db = sqlite3.connect(ruta_db)
+    guardada = db.execute("SELECT CONTRASENA FROM USUARIO WHERE NRO_DOCUMENTO = '1007'").fetchone()[0]
+    db.close()
+    assert guardada.startswith(app_module.HASH_METODO + "$")
+    assert _login(app_module.app.test_client(), "1007", "clave").status_code == 302
+
+
+def test_metodo_sin_parametros_no_rehashea_siempre(monkeypatch):
+    # werkzeug guarda "scrypt:32768:8:1" aunque HASH_METODO diga solo "scrypt"
+    monkeypatch.setattr(app_module, "HASH_METODO", "scrypt")
+    app_module._hash_ficticio.cache_clear()
+    try:
+        guardada = app_module.hashear_contrasena("clave")
+        assert app_module.verificar_contrasena(guardada, "clave") == (True, False)
+    finally:
+        app_module._hash_ficticio.cache_clear()
+
+
+def test_documento_desconocido(app_sqlite):
+    assert _login(app_module.app.test_client(), "no-existe", "clave").status_code == 200
+
+
+def test_requiere_admin(app_sqlite, cliente, admin):
+    anonimo = app_module.app.test_client()
+    # API: 401 sin sesión, 403 con otro rol
+    assert anonimo.post("/api/usuarios/disponibilidad", json={}).status_code == 401
+    assert cliente.post("/api/usuarios/disponibilidad", json={}).status_code == 403
+    assert admin.post("/api/usuarios/disponibilidad", json={}).status_code == 400
+    # Páginas: redirigen
+    assert anonimo.get("/index2").headers["Location"].endswith("/login")
+    assert cliente.get("/index2").headers["Location"].endswith("/index")
+    assert admin.get("/index2").status_code == 200
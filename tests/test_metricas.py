@@ -0,0 +1,23 @@
+# tests/test_metricas.py
+"""/api/metricas/*: sólo para administradores."""
+import pytest
+
+ENDPOINTS = ["historial", "sentencias", "fragmentos", "pool", "resumen", "latencia"]
+
+
+@pytest.mark.parametrize("nombre", ENDPOINTS)
+def test_metricas_requieren_admin(app_sqlite, cliente, admin, nombre):
+    ruta = f"/api/metricas/{nombre}"
+    assert app_sqlite.app.test_client().get(ruta).status_code == 401
+    assert cliente.get(ruta).status_code == 403
+    assert admin.get(ruta).status_code == 200
+
+
+def test_reportes_y_resumen_pasan_por_el_registro(app_sqlite, admin):
+    app_sqlite.actualizar_resumen(completo=True)
+    assert admin.get("/api/reportes", query_string={"tipo": "Arbol", "limite": "5"}).status_code == 200
+    assert admin.get("/api/reportes/resumen", query_string={"tipo": "Planta", "reserva": "1"}).status_code == 200
+
+    nombres = set(admin.get("/api/metricas/sentencias").get_json()["por_sentencia"])
+    assert {"recalcular_resumen[ARBOL]", "guardar_marca_resumen", "reporte_arbol[fin,ini,lim]",
+            "resumen_planta[fin,ini,reserva]", "insertar_sync_registro"} <= nombres
@@ -0,0 +1,43 @@
+# tests/test_mongo.py
+"""obtener_mongo: los índices del historial se reintentan si Mongo no respondía."""
+from pymongo.errors import ServerSelectionTimeoutError
+
+import app as app_module
+
+
+class _Coleccion:
+    def __init__(self, caido):
+        self.caido = caido
+        self.indices = []
+
+    def create_index(self, llaves, name, **opciones):
+        if self.caido[0]:
+            raise ServerSelectionTimeoutError("localhost:27017: Connection refused")
+        self.indices.append(name)
+
+
+class _Cliente:
+    def __init__(self, *args, **kwargs):
+        self.caido = [True]
+        self.historial = _Coleccion(self.caido)
+
+    def __getitem__(self, nombre):
+        return self
+
+
+def test_indices_se_reintentan(monkeypatch):
+    monkeypatch.setattr(app_module, "MongoClient", _Cliente)
+    monkeypatch.setattr(app_module, "MONGO_REINTENTO_INDICES_S", 0)
+    monkeypatch.setattr(app_module, "_mongo", {"client": None, "db": None, "indices": False, "reintento": 0.0})
+
+    db = app_module.obtener_mongo()
+    assert not app_module._mongo["indices"] and db.historial.indices == []
+
+    db.caido[0] = False
+    assert app_module.obtener_mongo() is db
+    assert app_module._mongo["indices"]
+    assert db.historial.indices == ["user_ts", "action_ts", "ts"]
+
+    # Ya creados: no se vuelven a pedir
+    app_module.obtener_mongo()
+    assert db.historial.indices == ["user_ts", "action_ts", "ts"]
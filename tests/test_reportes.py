@@ -0,0 +1,93 @@
+# tests/test_reportes.py
+"""/api/reportes: paginación por llave (JSON) y streaming ndjson con cursor por tipo."""
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+HOY = datetime.now().replace(microsecond=0)
+
+
+def _sembrar_plantas(ruta_db, n=30):
+    """Plantas de a tres con la misma FECHA_REGISTRO (empates que resuelve el ID)."""
+    db = sqlite3.connect(ruta_db)
+    with db:
+        db.executemany(
+            "INSERT INTO PLANTA (TAMANO, NOMBRE_COMUN, NSUBPARCELA, ID_RESERVA, NRO_DOCUMENTO_USUARIO,"
+            " ID_BRIGADA, FECHA_REGISTRO) VALUES (?, 'especie', '1', 1, '1000', 1, ?)",
+            [(10 + i, HOY - timedelta(hours=i // 3)) for i in range(n)])
+    db.close()
+
+
+def _lineas(respuesta):
+    assert respuesta.status_code == 200
+    return [json.loads(l) for l in respuesta.get_data(as_text=True).splitlines() if l]
+
+
+def _ndjson(cliente, **params):
+    return _lineas(cliente.get("/api/reportes", query_string={"formato": "ndjson", **params}))
+
+
+def _llave(fila):
+    return fila.get("TIPO"), fila.get("ID_ARBOL") or fila.get("ID_PLANTA")
+
+
+def test_ndjson_limite(app_sqlite, ruta_db, admin):
+    _sembrar_plantas(ruta_db)
+    lineas = _ndjson(admin, tipo="Arbol,Planta", limite="2")
+    assert len(lineas) == 3
+    assert "siguiente" in lineas[-1]
+
+
+@pytest.mark.parametrize("limite", ["7", "400", "430"])
+def test_ndjson_paginas_varios_tipos(app_sqlite, ruta_db, admin, limite):
+    _sembrar_plantas(ruta_db)
+    completo = [_llave(f) for f in _ndjson(admin, tipo="Arbol,Planta")]
+    assert len(completo) == 430
+
+    paginas, cursor = [], None
+    while True:
+        params = {"tipo": "Arbol,Planta", "limite": limite, **({"cursor": cursor} if cursor else {})}
+        lineas = _ndjson(admin, **params)
+        cursor = lineas.pop()["siguiente"] if lineas and "siguiente" in lineas[-1] else None
+        assert len(lineas) <= int(limite)
+        paginas += [_llave(f) for f in lineas]
+        if not cursor:
+            break
+    assert paginas == completo
+
+
+def test_cursor_de_otro_tipo(app_sqlite, ruta_db, admin):
+    _sembrar_plantas(ruta_db)
+    cursor = _ndjson(admin, tipo="Arbol,Planta", limite="401")[-1]["siguiente"]
+    r = admin.get("/api/reportes", query_string={"tipo": "Arbol", "formato": "ndjson", "cursor": cursor})
+    assert r.status_code == 400
+
+
+def _paginas_json(cliente, limite, **params):
+    ids, cursor = [], None
+    while True:
+        r = cliente.get("/api/reportes", query_string={
+            "tipo": "Arbol", "limite": limite, **params, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        datos = r.get_json()
+        ids += [f["ID_ARBOL"] for f in datos["tabla"]]
+        cursor = datos["siguiente"]
+        if not cursor:
+            return ids
+
+
+def test_paginacion_json_con_fechas_nulas(app_sqlite, ruta_db, admin):
+    db = sqlite3.connect(ruta_db)
+    with db:
+        db.executemany("INSERT INTO ARBOL (ID_ARBOL, ALTURA, DIAMETRO, ID_RESERVA, FECHA_REGISTRO)"
+                       " VALUES (?, 500, 20, 1, NULL)", [(1000 + i,) for i in range(5)])
+    db.close()
+
+    completo = [f["ID_ARBOL"] for f in admin.get("/api/reportes", query_string={"tipo": "Arbol"}).get_json()["tabla"]]
+    assert len(completo) == 405
+    # Las fechas NULL van al final, por ID descendente
+    assert completo[-5:] == [1004, 1003, 1002, 1001, 1000]
+    for limite in ("3", "50", "402"):
+        assert _paginas_json(admin, limite) == completo
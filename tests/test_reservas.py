@@ -0,0 +1,51 @@
+# tests/test_reservas.py
+"""/api/crear_reserva: participantes ocupados en fechas cruzadas -> 409."""
+from datetime import date, timedelta
+
+import app as app_module
+
+# Sembrados: el usuario 1000 + i participa en la reserva 1 + i % 10, vigente hasta dentro de 30 días
+OCUPADOS = ["1000", "1001", "1002", "1003"]
+
+
+def _reserva(participantes, desde, dias=3, lat="4.5"):
+    inicio = date.today() + timedelta(days=desde)
+    return {"fechainicio": inicio.isoformat(), "fechafin": (inicio + timedelta(days=dias)).isoformat(),
+            "municipio": "Villavicencio", "lat": lat, "lng": "-73.6", "participantes": participantes}
+
+
+def test_participantes_ocupados_409(app_sqlite, admin):
+    r = admin.post("/api/crear_reserva", json=_reserva(OCUPADOS, desde=1))
+    assert r.status_code == 409
+    assert set(r.get_json()["ocupados"]) == set(OCUPADOS)
+
+
+def test_fechas_sin_cruce_201(app_sqlite, admin):
+    r = admin.post("/api/crear_reserva", json=_reserva(OCUPADOS, desde=40))
+    assert r.status_code == 201
+    assert r.get_json()["id_reserva"] > 10
+
+
+def test_reserva_recien_creada_ocupa(app_sqlite, admin):
+    assert admin.post("/api/crear_reserva", json=_reserva(OCUPADOS, desde=40)).status_code == 201
+    # Sólo 1000 repite; cruza en un día con la anterior
+    r = admin.post("/api/crear_reserva", json=_reserva(["1000", "1020", "1030", "1040"], desde=43, lat="5"))
+    assert r.status_code == 409
+    assert list(r.get_json()["ocupados"]) == ["1000"]
+
+    rango = _reserva([], desde=41)
+    disponibilidad = admin.post("/api/usuarios/disponibilidad", json={
+        "documentos": ["1000", "1020"], "fechainicio": rango["fechainicio"], "fechafin": rango["fechafin"]})
+    assert disponibilidad.get_json()["libres"] == ["1020"]
+    assert list(disponibilidad.get_json()["ocupados"]) == ["1000"]
+
+
+def test_participante_inexistente_400(app_sqlite, admin):
+    r = admin.post("/api/crear_reserva", json=_reserva(["1000", "1001", "1002", "no-existe"], desde=40))
+    assert r.status_code == 400
+    assert r.get_json()["faltantes"] == ["no-existe"]
+
+
+def test_crear_reserva_requiere_admin(app_sqlite, cliente):
+    assert cliente.post("/api/crear_reserva", json=_reserva(OCUPADOS, desde=40)).status_code == 403
+    assert app_module.app.test_client().post("/api/crear_reserva", json={}).status_code == 401
@@ -0,0 +1,63 @@
+# tests/test_reservas_cercanas.py
+"""/api/reservas/cercanas e IndiceReservas."""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+TODO = {"bbox": "-90,-180,90,180"}
+
+
+@pytest.mark.parametrize("limite", ["-1", "0", "100000", "abc"])
+def test_limite_invalido(app_sqlite, cliente, limite):
+    r = cliente.get("/api/reservas/cercanas", query_string={**TODO, "limite": limite})
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("consulta", [
+    {"lat": "inf", "lng": "0"},
+    {"lat": "4.6", "lng": "nan"},
+    {"lat": "4.6", "lng": "-74", "radio_km": "nan"},
+    {"bbox": "-90,-inf,90,180"},
+    {"bbox": "nan,-180,90,180"},
+])
+def test_coordenadas_no_finitas(app_sqlite, cliente, consulta):
+    assert cliente.get("/api/reservas/cercanas", query_string=consulta).status_code == 400
+
+
+def test_limite(app_sqlite, cliente):
+    datos = cliente.get("/api/reservas/cercanas", query_string={**TODO, "limite": "2"}).get_json()
+    assert len(datos["reservas"]) == 2
+    assert datos["total"] == 10
+
+
+def test_refresco_ve_commits_fuera_de_orden(app_sqlite, ruta_db, cliente, monkeypatch):
+    assert cliente.get("/api/reservas/cercanas", query_string=TODO).get_json()["total"] == 10
+
+    # Otra transacción tomó un ID mayor y confirmó primero; la de ID menor llega después
+    ahora = datetime.now().replace(microsecond=0)
+    db = sqlite3.connect(ruta_db)
+    with db:
+        db.execute("INSERT INTO RESERVA_EVENTO VALUES (12, ?, ?, 'Meta', 3.0, -73.0, ?)",
+                   (ahora, ahora + timedelta(days=3), ahora))
+    monkeypatch.setattr(app_sqlite, "RESERVAS_INDICE_REFRESCO", 0)
+    ids = {r["id_reserva"] for r in cliente.get("/api/reservas/cercanas", query_string=TODO).get_json()["reservas"]}
+    assert 12 in ids
+
+    with db:
+        db.execute("INSERT INTO RESERVA_EVENTO VALUES (11, ?, ?, 'Meta', 3.1, -73.1, ?)",
+                   (ahora, ahora + timedelta(days=3), ahora - timedelta(seconds=5)))
+    db.close()
+    ids = {r["id_reserva"] for r in cliente.get("/api/reservas/cercanas", query_string=TODO).get_json()["reservas"]}
+    assert {11, 12} <= ids
+
+
+def test_reserva_nueva_no_se_solapa_consigo(app_sqlite, admin, monkeypatch):
+    monkeypatch.setattr(app_sqlite, "RESERVAS_INDICE_REFRESCO", 0)
+    r = admin.post("/api/crear_reservas", json={"reservas": [
+        {"fechainicio": "2031-01-01", "fechafin": "2031-01-05", "municipio": "Leticia",
+         "lat": "4.1", "lng": "-74.1", "participantes": ["1010", "1011", "1012", "1013"]},
+        {"fechainicio": "2031-02-01", "fechafin": "2031-02-05", "municipio": "Leticia",
+         "lat": "4.1", "lng": "-74.1", "participantes": ["1014", "1015", "1016", "1017"]}]})
+    assert r.status_code == 201
+    assert all(c["solapes"] == [] for c in r.get_json()["creadas"])
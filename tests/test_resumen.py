@@ -0,0 +1,207 @@
+# tests/test_resumen.py
+"""/api/reportes/resumen: fuente=resumen (RESUMEN_*) debe dar lo mismo que fuente=crudo."""
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from bench.fakes import BatchError
+
+HOY = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _dia(dias):
+    return (HOY + timedelta(days=dias)).strftime("%Y-%m-%d")
+
+
+def _redondear(valor):
+    if isinstance(valor, float):
+        return round(valor, 6)
+    if isinstance(valor, dict):
+        return {k: _redondear(v) for k, v in valor.items() if k != "fuente"}
+    if isinstance(valor, list):
+        return [_redondear(v) for v in valor]
+    return valor
+
+
+def _sembrar(ruta_db):
+    """Plantas (con tamaños y nombres nulos) y árboles en el borde de un día, con hora."""
+    db = sqlite3.connect(ruta_db)
+    with db:
+        db.executemany(
+            "INSERT INTO PLANTA (TAMANO, NOMBRE_COMUN, NSUBPARCELA, ID_RESERVA, NRO_DOCUMENTO_USUARIO,"
+            " ID_BRIGADA, FECHA_REGISTRO) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(None if i % 7 == 0 else 5 + (i * 37) % 250, None if i % 11 == 0 else f"especie{i % 4}",
+              f"Subparcela {1 + i % 4}", 1 + i % 3, "1000", 1 + i % 2,
+              HOY - timedelta(days=i % 40, hours=(i * 5) % 24, minutes=i % 60))
+             for i in range(120)])
+        # Árboles a media tarde del día que se usa como fechaFin
+        db.executemany(
+            "INSERT INTO ARBOL (ALTURA, DIAMETRO, DANO, FORMAFUSTE, NSUBPARCELA, NRO_DOCUMENTO,"
+            " ID_RESERVA, FECHA_REGISTRO) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(900 + i, None if i == 0 else 20 + i, "SD", "CIL", "2", "1000", 1,
+              HOY - timedelta(days=10) + timedelta(hours=15, minutes=i)) for i in range(3)])
+        # Registros viejos sin FECHA_REGISTRO
+        db.executemany(
+            "INSERT INTO ARBOL (ALTURA, DIAMETRO, DANO, FORMAFUSTE, NSUBPARCELA, NRO_DOCUMENTO,"
+            " ID_RESERVA, FECHA_REGISTRO) VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+            [(500 + i, 10 + i, "SD", "CIL", "1", "1000", 1 + i % 2) for i in range(NULOS)])
+        db.executemany(
+            "INSERT INTO PLANTA (TAMANO, NOMBRE_COMUN, NSUBPARCELA, ID_RESERVA, NRO_DOCUMENTO_USUARIO,"
+            " ID_BRIGADA, FECHA_REGISTRO) VALUES (?, ?, ?, ?, ?, ?, NULL)",
+            [(40 + i * 60, "especie0", "Subparcela 1", 1, "1000", 1) for i in range(NULOS)])
+    db.close()
+
+
+NULOS = 5
+
+
+RANGOS = [
+    {},
+    {"fechaInicio": _dia(-30), "fechaFin": _dia(-10)},
+    {"fechaInicio": _dia(-10), "fechaFin": _dia(-10)},
+    {"fechaFin": _dia(-200)},
+    {"fechaInicio": _dia(-5), "reserva": "1"},
+]
+
+
+@pytest.mark.parametrize("filtros", RANGOS)
+@pytest.mark.parametrize("tipo", ["Arbol", "Planta"])
+def test_resumen_igual_a_crudo(app_sqlite, ruta_db, admin, tipo, filtros):
+    _sembrar(ruta_db)
+    app_sqlite.actualizar_resumen(completo=True)
+
+    params = {"tipo": tipo, "desglose": "1", **filtros}
+    crudo = admin.get("/api/reportes/resumen", query_string={**params, "fuente": "crudo"})
+    resumen = admin.get("/api/reportes/resumen", query_string={**params, "fuente": "resumen"})
+
+    assert crudo.status_code == resumen.status_code == 200
+    assert _redondear(resumen.get_json()) == _redondear(crudo.get_json())
+
+
+def test_fecha_fin_incluye_el_dia_completo(app_sqlite, ruta_db, admin):
+    _sembrar(ruta_db)
+    app_sqlite.actualizar_resumen(completo=True)
+
+    params = {"tipo": "Arbol", "fechaInicio": _dia(-10), "fechaFin": _dia(-10), "reserva": "1"}
+    for fuente in ("crudo", "resumen"):
+        datos = admin.get("/api/reportes/resumen", query_string={**params, "fuente": fuente}).get_json()
+        # Los tres árboles sembrados a las 15:00 de ese día (más los de la siembra base)
+        assert datos["total"] >= 3, fuente
+
+
+@pytest.mark.parametrize("tipo", ["Arbol", "Planta"])
+def test_fechas_nulas_cuentan_igual(app_sqlite, ruta_db, admin, tipo):
+    _sembrar(ruta_db)
+    app_sqlite.actualizar_resumen(completo=True)
+
+    totales = {}
+    for filtros in ({}, {"fechaFin": _dia(0)}):
+        for fuente in ("crudo", "resumen"):
+            datos = admin.get("/api/reportes/resumen", query_string={
+                "tipo": tipo, "fuente": fuente, **filtros}).get_json()
+            totales[fuente, bool(filtros)] = datos["total"]
+    # Sin filtro de fecha entran las filas sin fecha; con cualquier filtro, no
+    assert totales["crudo", False] == totales["resumen", False]
+    assert totales["crudo", True] == totales["resumen", True] == totales["crudo", False] - NULOS
+
+
+def test_merge_por_registro_igual_a_crudo(app_sqlite, cliente, admin):
+    app_sqlite.actualizar_resumen(completo=True)
+    for i in range(5):
+        r = cliente.post("/registrar_arbol", headers={"Accept": "application/json"}, data={
+            "altura": str(1000 + i * 10), "dano": "DB" if i % 2 else "SD", "diametro": str(30 + i),
+            "formafuste": "CIL", "observaciones": "", "nsubparcela": str(1 + i % 2)})
+        assert r.status_code == 201
+
+    params = {"tipo": "Arbol", "desglose": "1", "fechaInicio": _dia(0), "fechaFin": _dia(0)}
+    crudo = admin.get("/api/reportes/resumen", query_string={**params, "fuente": "crudo"}).get_json()
+    resumen = admin.get("/api/reportes/resumen", query_string={**params, "fuente": "resumen"}).get_json()
+    assert crudo["total"] >= 5
+    assert _redondear(resumen) == _redondear(crudo)
+
+
+def test_sin_carga_inicial_usa_crudo(app_sqlite, ruta_db, admin):
+    _sembrar(ruta_db)
+    crudo = admin.get("/api/reportes/resumen", query_string={"tipo": "Arbol,Planta", "fuente": "crudo"})
+
+    antes = admin.get("/api/reportes/resumen", query_string={"tipo": "Arbol,Planta"})
+    assert antes.status_code == 200
+    assert antes.get_json()["fuente"] == "crudo"
+    assert _redondear(antes.get_json()) == _redondear(crudo.get_json())
+
+    app_sqlite.actualizar_resumen(completo=True)
+    despues = admin.get("/api/reportes/resumen", query_string={"tipo": "Arbol,Planta"}).get_json()
+    assert despues["fuente"] == "resumen"
+    assert despues["Planta"]["fuente"] == "resumen"
+    assert _redondear(despues) == _redondear(crudo.get_json())
+
+
+def test_fallo_al_sumar_queda_contado(app_sqlite, cliente, admin, monkeypatch):
+    app_sqlite.actualizar_resumen(completo=True)
+    antes = admin.get("/api/metricas/resumen").get_json()["fallos"]["arbol"]
+
+    def falla(*args, **kwargs):
+        raise RuntimeError("ORA-00054: resource busy")
+    monkeypatch.setattr(app_sqlite.sentencias, "ejecutar_muchos", falla)
+
+    r = cliente.post("/registrar_arbol", headers={"Accept": "application/json"}, data={
+        "altura": "1000", "dano": "SD", "diametro": "30", "formafuste": "CIL",
+        "observaciones": "", "nsubparcela": "1"})
+    assert r.status_code == 201
+
+    metricas = admin.get("/api/metricas/resumen").get_json()
+    assert metricas["fallos"]["arbol"] == antes + 1
+    assert "ORA-00054" in metricas["fallos"]["ultimo_error"]
+    assert set(metricas["marcas"]) == {"ARBOL", "PLANTA"}
+    assert cliente.get("/api/metricas/resumen").status_code == 403
+
+
+class _CursorLotes:
+    """Cursor que solo registra cada executemany y devuelve los errores guionados."""
+
+    def __init__(self, *errores):
+        self.llamadas, self._errores = [], list(errores)
+
+    def executemany(self, sql, filas, batcherrors=False):
+        assert batcherrors
+        self.llamadas.append(filas)
+        self._actual = self._errores.pop(0)
+
+    def getbatcherrors(self):
+        return self._actual
+
+
+def test_fallo_por_fila_cuenta_solo_esa_fila(app_sqlite):
+    filas = [{"id_reserva": 1, "nsubparcela": str(i), "dano": "SD", "formafuste": "CIL",
+              "altura": 100, "diametro": 10} for i in range(4)]
+    antes = dict(app_sqlite._fallos_resumen)
+    # Fila 1: otro MERGE insertó la llave en paralelo (se repite y pasa); fila 2: falla
+    cursor = _CursorLotes([BatchError(1, 1, "ORA-00001: unique constraint"),
+                           BatchError(2, 1438, "ORA-01438: value larger than precision")], [])
+
+    app_sqlite.sumar_a_resumen(cursor, "arbol", filas)
+
+    assert cursor.llamadas[1] == [cursor.llamadas[0][1]]
+    assert app_sqlite._fallos_resumen["arbol"] == antes["arbol"] + 1
+    assert app_sqlite._fallos_resumen["filas"] == antes["filas"] + 1
+    assert "ORA-01438" in app_sqlite._fallos_resumen["ultimo_error"]
+
+
+def test_duplicado_se_repite_sin_contar(app_sqlite):
+    antes = dict(app_sqlite._fallos_resumen)
+    cursor = _CursorLotes([BatchError(0, 1, "ORA-00001: unique constraint")], [])
+    app_sqlite.sumar_a_resumen(cursor, "planta", [{"id_reserva": 1, "tamano": 5}])
+    assert len(cursor.llamadas) == 2
+    assert app_sqlite._fallos_resumen == antes
+
+
+@pytest.mark.parametrize("tabla", ["ARBOL", "PLANTA"])
+def test_carga_inicial_sql_igual_a_recalculo(app_sqlite, tabla):
+    """sql/resumen.sql repite el INSERT de _SQL_RECALCULO con :desde = DATE '1900-01-01'."""
+    texto = (Path(__file__).parent.parent / "sql" / "resumen.sql").read_text(encoding="utf-8")
+    inicio = texto.index(f"INSERT INTO RESUMEN_{tabla} (")
+    carga = texto[inicio:texto.index(";", inicio)]
+    recalculo = app_sqlite._SQL_RECALCULO[tabla][1].replace(":desde", app_sqlite._SQL_FECHA_NULA)
+    assert " ".join(carga.split()) == " ".join(recalculo.split())
@@ -0,0 +1,55 @@
+# tests/test_sync.py
+"""/api/sync: reenviar el mismo lote no duplica registros."""
+import sqlite3
+
+LOTE = {
+    "arboles": [
+        {"id_cliente": "a-1", "altura": 1200, "dano": "SD", "diametro": 30, "formafuste": "CIL", "nsubparcela": "1"},
+        {"id_cliente": "a-2", "altura": 800, "dano": "DB", "diametro": 22, "formafuste": "FA", "nsubparcela": "2"},
+    ],
+    "plantas": [
+        {"id_cliente": "p-1", "tamano": 40, "nombre_comun": "helecho", "nsubparcela": "3"},
+    ],
+}
+
+
+def _contar(ruta_db):
+    db = sqlite3.connect(ruta_db)
+    try:
+        return tuple(db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                     for t in ("ARBOL", "PLANTA", "SYNC_REGISTRO"))
+    finally:
+        db.close()
+
+
+def test_reenvio_no_duplica(app_sqlite, ruta_db, cliente):
+    antes = _contar(ruta_db)
+
+    primero = cliente.post("/api/sync", json=LOTE).get_json()
+    assert primero["insertados"] == {"arboles": 2, "plantas": 1}
+    assert primero["duplicados"] == [] and primero["errores"] == []
+    despues = _contar(ruta_db)
+    assert despues == (antes[0] + 2, antes[1] + 1, antes[2] + 3)
+
+    segundo = cliente.post("/api/sync", json=LOTE).get_json()
+    assert segundo["insertados"] == {"arboles": 0, "plantas": 0}
+    assert sorted(segundo["duplicados"]) == ["a-1", "a-2", "p-1"]
+    assert _contar(ruta_db) == despues
+
+
+def test_repetido_en_el_mismo_lote(app_sqlite, ruta_db, cliente):
+    lote = {"arboles": LOTE["arboles"] + [LOTE["arboles"][0]]}
+    datos = cliente.post("/api/sync", json=lote).get_json()
+    assert datos["insertados"]["arboles"] == 2
+    assert datos["duplicados"] == ["a-1"]
+
+
+def test_reserva_ajena(app_sqlite, cliente):
+    lote = {"plantas": [dict(LOTE["plantas"][0], id_reserva=5)]}
+    datos = cliente.post("/api/sync", json=lote).get_json()
+    assert datos["insertados"]["plantas"] == 0
+    assert datos["errores"][0]["id_cliente"] == "p-1"
+
+
+def test_sync_requiere_sesion(app_sqlite):
+    assert app_sqlite.app.test_client().post("/api/sync", json=LOTE).status_code == 401